@@ -11,3 +11,87 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_PASS = os.getenv("REDIS_PASS")
 TEST_BOT_TOKEN = os.getenv("TEST_BOT_TOKEN")
 OWNER_ID = int(os.getenv("OWNER_ID"))
+
+# 0 keeps search history forever
+HISTORY_TTL_DAYS = int(os.getenv("HISTORY_TTL_DAYS", 0))
+
+# write-behind of users.search_count: flush every N ms or M buffered searches
+SEARCH_FLUSH_MS = int(os.getenv("SEARCH_FLUSH_MS", 2000))
+SEARCH_FLUSH_EVENTS = int(os.getenv("SEARCH_FLUSH_EVENTS", 500))
+
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", 6 * 3600))
+
+SEARCH_INDEX_REFRESH = int(os.getenv("SEARCH_INDEX_REFRESH", 300))
+# best-ranked matches a search (or an inline query) can page through
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 1000))
+
+# inline mode: Telegram-side cache (seconds) and our own query/result caches
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))
+INLINE_QUERY_CACHE = int(os.getenv("INLINE_QUERY_CACHE", 2048))
+INLINE_RESULT_CACHE = int(os.getenv("INLINE_RESULT_CACHE", 5000))
+INLINE_RESULT_TTL = int(os.getenv("INLINE_RESULT_TTL", 24 * 3600))
+INLINE_STATS_FLUSH = int(os.getenv("INLINE_STATS_FLUSH", 10))  # max seconds stats wait for a Redis call to ride on
+
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "temp/render")
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", 500))
+# eviction scans the directory off the event loop, after this many renders or seconds
+RENDER_CACHE_EVICT_EVERY = int(os.getenv("RENDER_CACHE_EVICT_EVERY", 50))
+RENDER_CACHE_EVICT_SECONDS = float(os.getenv("RENDER_CACHE_EVICT_SECONDS", 60))
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 4))
+IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", 8))
+IMAGE_MAX_PENDING = int(os.getenv("IMAGE_MAX_PENDING", 50))
+IMAGE_DEADLINE = float(os.getenv("IMAGE_DEADLINE", 8))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 5))
+IMAGE_HTTP_POOL = int(os.getenv("IMAGE_HTTP_POOL", 20))
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 1800))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_MB", 64)) * 1024 * 1024
+
+# neighbour prefetch during pagination: jobs at once (across all chats), updates in
+# flight above which it pauses, warmed pages kept per process, and how busy the
+# image pipeline may be for a prefetch render
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 2))
+PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PREFETCH_MAX_IN_FLIGHT", 4))
+PREFETCH_CACHE = int(os.getenv("PREFETCH_CACHE", 2000))
+PREFETCH_MAX_IMAGE_LOAD = int(os.getenv("PREFETCH_MAX_IMAGE_LOAD", 2))
+PREFETCH_STATS_FLUSH = int(os.getenv("PREFETCH_STATS_FLUSH", 10))  # seconds between stats writes
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 8))
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", 25))
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", 3))
+
+DAILY_PREFER_ANNIVERSARY = os.getenv("DAILY_PREFER_ANNIVERSARY", "0") == "1"
+# "0" keeps this deployment from posting the daily hero (e.g. benchmarks)
+DAILY_BROADCAST = os.getenv("DAILY_BROADCAST", "1") == "1"
+
+# "prod" uses BOT_TOKEN, "test" uses TEST_BOT_TOKEN
+BOT_ENV = os.getenv("BOT_ENV", "prod")
+# "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+WEBHOOK_DROP_PENDING = os.getenv("WEBHOOK_DROP_PENDING", "0") == "1"
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 10))
+
+# /metrics for polling and worker mode (webhook mode serves it on the webhook app);
+# worker N listens on METRICS_PORT + N, 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# Multi-worker mode ("ingress" / "worker" BOT_MODE)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+UPDATE_SHARDS = int(os.getenv("UPDATE_SHARDS", 16))
+UPDATE_STREAM_MAXLEN = int(os.getenv("UPDATE_STREAM_MAXLEN", 100000))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", 1))
+WORKER_INDEX = int(os.getenv("WORKER_INDEX")) if os.getenv("WORKER_INDEX") else None
+WORKER_BATCH = int(os.getenv("WORKER_BATCH", 100))
+# updates one worker handles at once (across all its chats) and the shard lease in seconds
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 16))
+SHARD_LEASE = float(os.getenv("SHARD_LEASE", 10))
+
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", 1000))
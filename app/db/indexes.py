@@ -0,0 +1,210 @@
+"""
+Index declarations for every collection, ensured at startup.
+
+    python -m app.db.indexes            # create / update indexes
+    python -m app.db.indexes --check    # explain() every handler query, fail on COLLSCAN
+    python -m app.db.indexes --check --seed 5000   # same, on seeded synthetic data
+    python -m app.db.indexes --backfill-history    # one-off: convert old string searched_at to dates
+
+Run --seed only against a local/dev database: it inserts and then removes
+documents marked with "_seed".
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from loguru import logger
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.db.mongo import db, heroes_collection, history_collection, users_collection, channels_collection
+from app.config.settings import HISTORY_TTL_DAYS
+
+# ---------------------
+# 🔹 DECLARED INDEXES
+# ---------------------
+INDEXES = [
+    (users_collection, [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        IndexModel([("search_count", DESCENDING)], name="search_count"),
+    ]),
+    (history_collection, [
+        IndexModel([("user_id", ASCENDING), ("searched_at", DESCENDING)], name="user_recent"),
+    ]),
+    (heroes_collection, [
+        IndexModel([("war", ASCENDING)], name="war"),
+        IndexModel([("bio_link", ASCENDING)], name="bio_link"),
+        IndexModel([("date.dead", ASCENDING)], name="date_dead"),
+        # browse order (app/utils/browse.py); heroes not numbered yet are left out
+        IndexModel([("ord", ASCENDING)], name="ord_unique", unique=True,
+                   partialFilterExpression={"ord": {"$exists": True}}),
+    ]),
+    (channels_collection, [
+        IndexModel([("channel_id", ASCENDING)], name="channel_id_unique", unique=True),
+        IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+    ]),
+]
+
+# TTL indexes must be single-field, so history expiry gets its own index
+HISTORY_TTL_INDEX = "searched_at_ttl"
+
+
+async def _ensure_history_ttl():
+    existing = await history_collection.index_information()
+    if not HISTORY_TTL_DAYS:
+        if HISTORY_TTL_INDEX in existing:
+            await history_collection.drop_index(HISTORY_TTL_INDEX)
+            logger.info("🗑 History TTL disabled")
+        return
+
+    seconds = HISTORY_TTL_DAYS * 24 * 3600
+    if HISTORY_TTL_INDEX not in existing:
+        await history_collection.create_index(
+            [("searched_at", ASCENDING)], name=HISTORY_TTL_INDEX, expireAfterSeconds=seconds
+        )
+    elif existing[HISTORY_TTL_INDEX].get("expireAfterSeconds") != seconds:
+        # changing the TTL of an existing index goes through collMod
+        await db.command(
+            "collMod", history_collection.name,
+            index={"name": HISTORY_TTL_INDEX, "expireAfterSeconds": seconds},
+        )
+
+
+async def backfill_history_dates() -> int:
+    """
+    Older museum searches stored searched_at as an ISO string, which the TTL
+    index never expires. A one-off migration (a scan of history): run it
+    once with --backfill-history, not at startup.
+    """
+    result = await history_collection.update_many(
+        {"searched_at": {"$type": "string"}},
+        [{"$set": {"searched_at": {"$dateFromString": {"dateString": "$searched_at", "onError": "$searched_at"}}}}],
+    )
+    if result.modified_count:
+        logger.info(f"🗓 History: {result.modified_count} searched_at strings converted to dates")
+    return result.modified_count
+
+
+async def ensure_indexes():
+    """Create missing indexes; a failing one (e.g. duplicates blocking a unique index) is logged, not fatal."""
+    for collection, models in INDEXES:
+        try:
+            await collection.create_indexes(models)
+        except OperationFailure as e:
+            logger.error(f"❌ Indexes on {collection.name} not created: {e}")
+    try:
+        await _ensure_history_ttl()
+    except OperationFailure as e:
+        logger.error(f"❌ History TTL index not updated: {e}")
+    logger.info("🗂 MongoDB indexes ensured")
+
+
+# ---------------------
+# 🔹 QUERY PLAN CHECK
+# ---------------------
+# (label, collection, filter, sort) for every handler query that filters or sorts.
+# Unfiltered reads of a whole collection (broadcast channel list, full index
+# loads) are scans by design and are not listed.
+HANDLER_QUERIES = [
+    ("start_cmd: user by id", users_collection, {"id": "1"}, None),
+    ("get_profile: user by id", users_collection, {"id": "1"}, None),
+    ("get_profile: recent history", history_collection, {"user_id": "1"}, [("searched_at", -1)]),
+    ("clear_history: history of user", history_collection, {"user_id": "1"}, None),
+    ("rebuild_leaderboards: users with searches", users_collection, {"search_count": {"$gt": 0}}, None),
+    ("rebuild_leaderboards: searches since", history_collection, {"searched_at": {"$gte": datetime(2020, 1, 1)}}, None),
+    ("weighted_war_hero: heroes of a war", heroes_collection, {"war": "war"}, None),
+    ("anniversary_hero: heroes by death day", heroes_collection, {"date.dead": {"$regex": "^01\\.01\\."}}, None),
+    ("ingest: hero by bio_link", heroes_collection, {"bio_link": "x"}, None),
+    ("ingest: hero by name and death date", heroes_collection, {"name": {"first": "a", "last": "b"}, "date.dead": "x"}, None),
+    ("hero_at: hero by browse ordinal", heroes_collection, {"ord": 1}, None),
+    ("last_ordinal: highest browse ordinal", heroes_collection, {"ord": {"$exists": True}}, [("ord", -1)]),
+    ("channels_list: channels of owner", channels_collection, {"owner_id": 1}, None),
+    ("channel_info: channel by id", channels_collection, {"channel_id": 1}, None),
+]
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def winning_stages(explain: dict) -> list[str]:
+    planner = explain.get("queryPlanner", {})
+    return [s for s in _stages(planner.get("winningPlan", {})) if s]
+
+
+async def _seed(count: int):
+    now = datetime.utcnow()
+    await users_collection.insert_many([
+        {"id": f"seed-{i}", "search_count": i % 50, "updated_at": now - timedelta(minutes=i), "_seed": True}
+        for i in range(count)
+    ])
+    await history_collection.insert_many([
+        {"user_id": f"seed-{i % 100}", "query": "q", "searched_at": now - timedelta(minutes=i), "_seed": True}
+        for i in range(count)
+    ])
+    await heroes_collection.insert_many([
+        {"name": {"first": "seed", "last": str(i)}, "war": f"war-{i % 5}", "bio_link": f"seed://{i}",
+         "date": {"dead": f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.2020"}, "_seed": True}
+        for i in range(count)
+    ])
+    await channels_collection.insert_many([
+        {"channel_id": -1000000000000 - i, "owner_id": i % 100, "_seed": True} for i in range(count)
+    ])
+
+
+async def _unseed():
+    for collection, _ in INDEXES:
+        await collection.delete_many({"_seed": True})
+
+
+async def check_query_plans() -> list[str]:
+    """explain() every handler query; returns the labels that fall back to a COLLSCAN."""
+    failures = []
+    for label, collection, query, sort in HANDLER_QUERIES:
+        cursor = collection.find(query).limit(10)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = winning_stages(await cursor.explain())
+        ok = "COLLSCAN" not in stages
+        print(f"{'✅' if ok else '❌'} {label}: {' <- '.join(stages)}")
+        if not ok:
+            failures.append(label)
+    return failures
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ensure MongoDB indexes / check handler query plans")
+    parser.add_argument("--check", action="store_true", help="fail if any handler query does a COLLSCAN")
+    parser.add_argument("--seed", type=int, default=0, help="insert N synthetic docs per collection for the check")
+    parser.add_argument("--backfill-history", action="store_true", help="convert string searched_at values to dates")
+    args = parser.parse_args()
+
+    await ensure_indexes()
+    if args.backfill_history:
+        converted = await backfill_history_dates()
+        print(f"🗓 {converted} history entries converted")
+    if not args.check:
+        return 0
+
+    if args.seed:
+        await _seed(args.seed)
+    try:
+        failures = await check_query_plans()
+    finally:
+        if args.seed:
+            await _unseed()
+
+    if failures:
+        print(f"\n{len(failures)} queries without an index: {', '.join(failures)}")
+        return 1
+    print("\nAll handler queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
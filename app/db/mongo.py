@@ -1,7 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.config.settings import MONGO_URI
+from app.utils.metrics import MongoCommandTimer
 
-mongo_client = AsyncIOMotorClient(MONGO_URI)
+mongo_client = AsyncIOMotorClient(MONGO_URI, event_listeners=[MongoCommandTimer()])
 db = mongo_client.get_default_database()
 heroes_collection = db["heroes"]
 history_collection = db["history"]
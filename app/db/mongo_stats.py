@@ -1,32 +1,135 @@
+import asyncio
+import time
 from datetime import datetime
+from loguru import logger
+from pymongo import UpdateOne
 from app.db.mongo import users_collection
+from app.config.settings import SEARCH_FLUSH_MS, SEARCH_FLUSH_EVENTS
+
+
+# ---------------------
+# 🔹 WRITE-BEHIND SEARCH COUNTERS
+# ---------------------
+class SearchCounterBuffer:
+    """
+    Buffers per-user search counters in memory and writes them as one
+    unordered bulk_write every SEARCH_FLUSH_MS or SEARCH_FLUSH_EVENTS events.
+    Events of the same user are coalesced: count delta, latest query and names.
+    """
+
+    def __init__(self, interval_ms: int = SEARCH_FLUSH_MS, max_events: int = SEARCH_FLUSH_EVENTS):
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self._pending = {}
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._early_flush = None
+        self.stats = {
+            "flushes": 0,
+            "written_users": 0,
+            "written_events": 0,
+            "failures": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    @property
+    def depth(self) -> dict:
+        return {"users": len(self._pending), "events": self._events}
+
+    def add(self, user, query: str):
+        """Record one search; never waits on Mongo."""
+        user_id = str(user.id)
+        entry = self._pending.get(user_id)
+        if entry is None:
+            entry = self._pending[user_id] = {"delta": 0, "first_seen": datetime.utcnow()}
+        entry["delta"] += 1
+        entry["first_name"] = user.first_name
+        entry["username"] = user.username
+        entry["last_query"] = query
+        entry["updated_at"] = datetime.utcnow()
+        self._events += 1
+
+        if self._events >= self.max_events and (self._early_flush is None or self._early_flush.done()):
+            self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def _merge_back(self, batch: dict, events: int):
+        """Put a failed batch back so its counts go out with the next flush."""
+        for user_id, entry in batch.items():
+            current = self._pending.get(user_id)
+            if current is None:
+                self._pending[user_id] = entry
+            else:
+                # newer fields win, deltas add up
+                current["delta"] += entry["delta"]
+                current["first_seen"] = entry["first_seen"]
+        self._events += events
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, events = self._pending, self._events
+            self._pending, self._events = {}, 0
+
+            ops = [
+                UpdateOne(
+                    {"id": user_id},
+                    {
+                        "$inc": {"search_count": entry["delta"]},
+                        "$set": {
+                            "first_name": entry["first_name"],
+                            "username": entry["username"],
+                            "last_query": entry["last_query"],
+                            "updated_at": entry["updated_at"],
+                        },
+                        "$setOnInsert": {"created_at": entry["first_seen"]},
+                    },
+                    upsert=True,
+                )
+                for user_id, entry in batch.items()
+            ]
+            started = time.perf_counter()
+            try:
+                await users_collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                self.stats["failures"] += 1
+                self._merge_back(batch, events)
+                logger.warning(f"⚠️ Search counters not flushed ({len(batch)} users kept for retry): {e}")
+                return
+
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self.stats["written_users"] += len(batch)
+            self.stats["written_events"] += events
+            self.stats["last_flush_ms"] = round(elapsed, 1)
+            self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed), 1)
+
+    async def run(self):
+        """Background flush loop."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Stop the loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"❌ {self._events} search events lost on shutdown")
+
+
+search_counters = SearchCounterBuffer()
+
+
+def increment_user_search(user, query: str):
+    """Increment user's search counter (buffered, written by search_counters)."""
+    search_counters.add(user, query)
 
-def increment_user_search(user: dict, query: str):
-    """Increment user's search counter."""
-    update = {
-        "$inc": {"search_count": 1},
-        "$set": {
-            "first_name": user.first_name,
-            "username": user.username,
-            "last_query": query,
-            "updated_at": datetime.utcnow()
-        },
-        "$setOnInsert": {"created_at": datetime.utcnow()}
-    }
-    users_collection.update_one({"id": str(user.id)}, update, upsert=True)
-    print("updated")
-
-
-async def get_user_stats(user_id: int):
-    """Return one user's stats."""
-    return await users_collection.find_one({"_id": user_id})
-
-
-async def get_global_stats():
-    """Return total users, total searches, and latest active user."""
-    total_users = await users_collection.count_documents({})
-    pipeline = [{"$group": {"_id": None, "total_searches": {"$sum": "$search_count"}}}]
-    agg = [a async for a in users_collection.aggregate(pipeline)]
-    total_searches = agg[0]["total_searches"] if agg else 0
-    last_user = await users_collection.find_one(sort=[("updated_at", -1)])
-    return total_users, total_searches, last_user
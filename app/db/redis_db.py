@@ -1,7 +1,8 @@
 from redis.asyncio import Redis
 from app.config.settings import REDIS_HOST, REDIS_PORT, REDIS_PASS
+from app.utils.metrics import instrument_redis
 
-cache: Redis = Redis(
+cache: Redis = instrument_redis(Redis(
     host=REDIS_HOST,
     port=REDIS_PORT,
     password=REDIS_PASS,
@@ -12,4 +13,4 @@ cache: Redis = Redis(
     retry_on_timeout=True,
     health_check_interval=30,
     max_connections=20,
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -1,5 +1,12 @@
 import os
-from app.db.mongo_stats import get_global_stats, users_collection
+from html import escape
+from datetime import datetime
+from app.db.mongo_stats import search_counters
+from app.utils.stats import read_global_stats, read_daily_series
+from app.utils.leaderboard import top
+from app.utils.inline_cache import hit_rates
+from app.utils import prefetch
+from app.utils import metrics
 from aiogram import types, F, Router
 
 ADMIN_ID = int(os.getenv("OWNER_ID"))
@@ -11,32 +18,77 @@ async def admin_stats(message: types.Message):
     if message.from_user.id != ADMIN_ID:
         return
 
-    total_users, total_searches, last_user = await get_global_stats()
+    stats = await read_global_stats()
+    last_user = stats["last_active"]
 
     text = (
         f"🇦🇲 <b>Հայկական Հերոսների Թանգարան — Վարչական Տվյալներ</b>\n\n"
-        f"👥 Օգտատերերի քանակ՝ <b>{total_users}</b>\n"
-        f"🔎 Ընդհանուր որոնումներ՝ <b>{total_searches}</b>\n"
+        f"👥 Օգտատերերի քանակ՝ <b>{stats['total_users']}</b>\n"
+        f"🔎 Ընդհանուր որոնումներ՝ <b>{stats['total_searches']}</b>\n"
+        f"🟢 Այսօրվա ակտիվ օգտատերեր՝ <b>{stats['dau']}</b>\n"
     )
 
     if last_user:
-        updated_at = last_user.get("updated_at")
-        updated_at_str = updated_at.strftime("%Y-%m-%d %H:%M:%S") if updated_at else "—"
-        print(last_user)
+        at = last_user.get("at")
+        updated_at_str = datetime.fromisoformat(at).strftime("%Y-%m-%d %H:%M:%S") if at else "—"
 
+        who = "@" + last_user["username"] if last_user["username"] else str(last_user["id"])
         text += (
-            f"🕰 Վերջին ակտիվ օգտագործող՝ {"@" + last_user["username"] if last_user["username"] else last_user["id"]}\n"
-            f"📱 Վերջին որոնումը՝ <code>{last_user.get('last_query', '—')}</code>\n"
+            f"🕰 Վերջին ակտիվ օգտագործող՝ {escape(who)}\n"
+            f"📱 Վերջին որոնումը՝ <code>{escape(last_user.get('query') or '—')}</code>\n"
             f"📅 Թարմացվել է՝ {updated_at_str}\n"
         )
 
-    top_users = users_collection.find().sort("search_count", -1).limit(5)
-    top = [u async for u in top_users]
-    if top:
-        text += "\n🏆 <b>Ամենաակտիվ հայրենասերներ</b>\n"
-        for i, u in enumerate(top, start=1):
-            print(u)
-            if "search_count" in u and u["search_count"] > 0:
-                text += f"{i}. {"@" + last_user["username"] if last_user["username"] else last_user["id"]} — {u.get('search_count', 0)} որոնում\n"
+    series = await read_daily_series(7)
+    text += "\n📈 <b>Վերջին 7 օրը</b> (որոնում / ակտիվ)\n"
+    for day, searches, actives in series:
+        text += f"<code>{day[5:]}</code> {searches} / {actives}\n"
+
+    boards = [
+        ("🏆 <b>Ամենաակտիվ հայրենասերներ</b>", "users", "որոնում"),
+        ("🇦🇲 <b>Ամենաորոնված հերոսներ</b>", "heroes", "որոնում"),
+        ("⚔️ <b>Ամենաորոնված պատերազմները</b>", "wars", "որոնում"),
+    ]
+    windows = [("all", "ընդհանուր"), ("week", "շաբաթ"), ("day", "այսօր")]
+    for title, board, unit in boards:
+        for window, window_title in windows:
+            rows = await top(board, window, 5 if window == "all" else 3)
+            if not rows:
+                continue
+            text += f"\n{title} ({window_title})\n"
+            for i, (_, name, score) in enumerate(rows, start=1):
+                text += f"{i}. {escape(name)} — {score} {unit}\n"
+
+    depth, flushes = search_counters.depth, search_counters.stats
+    text += (
+        f"\n⚙️ Բուֆեր՝ {depth['users']} օգտատեր / {depth['events']} որոնում, "
+        f"վերջին գրառումը՝ {flushes['last_flush_ms']} ms (max {flushes['max_flush_ms']} ms)\n"
+    )
+
+    inline = await hit_rates()
+    text += (
+        f"🔍 Inline՝ {inline['queries']} հարցում, "
+        f"cache {inline['query_exact']:.0%} + prefix {inline['query_prefix']:.0%}, "
+        f"արդյունքներ {inline['result_cached']:.0%}\n"
+    )
+
+    warmed = await prefetch.hit_rate()
+    text += (
+        f"⏭️ Prefetch՝ {warmed['lookups']} էջ, hit {warmed['hit_rate']:.0%}, "
+        f"{warmed['rendered']} նկար նախապես, {warmed['busy']} բաց թողնված\n"
+    )
+
+    rows = metrics.summary()
+    if rows:
+        text += "\n⏱ <b>Մշակիչներ</b> (այս պրոցեսը, ms)\n"
+        for row in rows:
+            text += (
+                f"<code>{row['handler']}</code> {row['count']}× "
+                f"≈{row['mean_ms']:.0f}, p50≤{row['p50_ms']:g}, p95≤{row['p95_ms']:g}"
+                f"{f', ❌ {row['errors']}' if row['errors'] else ''}\n"
+            )
+        for backend, (calls, mean_ms) in metrics.client_totals().items():
+            if calls:
+                text += f"{backend}: {calls} կանչ, միջինը {mean_ms:.1f} ms\n"
 
     await message.answer(text, parse_mode="HTML")
@@ -2,58 +2,27 @@ from aiogram import Router, types, F
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from bson import ObjectId, Regex
+from bson import ObjectId
 from loguru import logger
 from urllib.parse import quote, unquote
-from uuid import uuid4
-import re, html
+import re
 from datetime import datetime, timezone
-import os
 from app.db.mongo import heroes_collection, history_collection
-from app.utils.cache import get_cached_hero, set_cached_hero
 from app.db.redis_db import cache
+from app.utils.cache import queue_search
+from app.utils.sessions import queue_session, settle_session, get_session, prefetch_pages, neighbour_indexes, session_alive
 from app.db.mongo_stats import increment_user_search
-from app.utils.util import compose_hero_image
+from app.utils.captions import build_caption
+from app.utils.image_cache import get_hero_photo, queue_file_id, resolve_hero_photo, remember_file_id, forget_file_id
+from app.utils.search_index import search_index
+from app.utils.war_catalogue import war_catalogue
+from app.utils.browse import hero_browser
+from app.utils.prefetch import prefetcher
 
 router = Router()
 
 CB_PREFIX = "museum_page"
 ARMENIAN_FLAG_URL = "https://upload.wikimedia.org/wikipedia/commons/2/2f/Flag_of_Armenia.svg"
-MAX_CAPTION_LEN = 1024
-
-
-# ---------------------
-# 🔹 TEXT UTILITIES
-# ---------------------
-def sanitize_html(text: str) -> str:
-    if not text:
-        return ""
-    text = re.sub(r"<[^>]+>", "", text)
-    text = html.unescape(text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-def remove_duplicate_sentences(text: str) -> str:
-    sentences = re.split(r"[։\.]", text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    unique, seen = [], set()
-    for s in sentences:
-        if s not in seen:
-            seen.add(s)
-            unique.append(s)
-    return "։ ".join(unique).strip() + "։"
-
-
-def format_bio_text(bio: str) -> str:
-    bio = sanitize_html(bio)
-    bio = re.sub(r"(?<=\D)(?=\d)", " ", bio)
-    bio = re.sub(r"\s{2,}", " ", bio)
-    bio = remove_duplicate_sentences(bio)
-    paragraphs = re.split(r"[։\.]", bio)
-    paragraphs = [p.strip() for p in paragraphs if p.strip()]
-    formatted = [f"«{p}։»" for p in paragraphs]
-    return "\n\n".join(formatted[:10])
 
 
 # ---------------------
@@ -70,29 +39,54 @@ def make_callback(*parts, max_len=60):
 # ---------------------
 # 🔹 BUILD CAPTION + KEYBOARD
 # ---------------------
-def build_caption(hero, index, total):
-    bio = format_bio_text(hero.get("bio", ""))
-    name = f"{hero['name']['first']} {hero['name']['last']}"
-    birth = hero["date"].get("birth", "")
-    death = hero["date"].get("dead", "")
-    region = hero.get("region", "")
-    war = hero.get("war", "")
-
-    caption = (
-        f"֍ ՀԱՎԵՐԺ ՓԱՌՔ ֍\n"
-        f"🇦🇲 <b>{name}</b>\n"
-        f"📅 {birth} - {death}\n"
-        f"📍 {region}\n"
-        f"⚔️ {war}\n\n"
-        f"🕯️ {bio}\n\n"
-        f"<i>{index + 1}/{total}</i>"
-    )
+def session_page(hero, index, total):
+    """What a result session keeps for one prefetched page."""
+    return {"caption": build_caption(hero, index, total), "img_url": hero["img_url"]}
+
+
+def prefetch_scope(mode, key, total):
+    """
+    Warmed pages are shared per result session, war or browse order. Captions
+    carry the total, and war / browse scopes also carry the heroes:version
+    they were built from, so pages warmed before a re-ingest are never served.
+    """
+    if mode == "search":
+        return f"search:{key}"
+    version = war_catalogue.version if mode == "war" else hero_browser.version
+    return f"{mode}:{key or '_'}:{total}:{version}"
+
+
+async def browse_pages(index, total):
+    """Neighbouring pages of the "all heroes" order, by ordinal."""
+    pages = {}
+    for i in neighbour_indexes(index, total):
+        hero = await hero_browser.hero_at(i)
+        if hero:
+            pages[i] = session_page(hero, i, total)
+    return pages
+
+
+def prefetch_neighbours(mode, key, index, total, chat_id, ids=None):
+    """Warm the ⬅️/➡️ pages in the background."""
+    scope = prefetch_scope(mode, key, total)
+    if mode == "all":
+        fetch = lambda: browse_pages(index, total)
+    else:
+        fetch = lambda: prefetch_pages(ids, index, total, session_page)
+    alive = (lambda: session_alive(key)) if mode == "search" else None
+    prefetcher.schedule(scope, fetch=fetch, alive=alive, job=f"{scope}:{chat_id}")
 
-    if len(caption) > MAX_CAPTION_LEN:
-        cutoff = caption[:MAX_CAPTION_LEN - 3]
-        cutoff = re.sub(r"<[^>]*$", "", cutoff)
-        caption = cutoff.strip() + "..."
-    return caption
+
+async def send_hero_photo(message, img_url, photo, caption, kb):
+    """answer_photo and remember its file_id; a rejected stored file_id is dropped and the flag sent instead."""
+    try:
+        sent = await message.answer_photo(photo, caption=caption, parse_mode="HTML", reply_markup=kb)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not send photo ({img_url}): {e}")
+        await forget_file_id(img_url, photo)
+        await message.answer_photo(ARMENIAN_FLAG_URL, caption=caption, parse_mode="HTML", reply_markup=kb)
+        return
+    await remember_file_id(img_url, sent, photo)
 
 
 def build_keyboard(mode, index, total, key=None):
@@ -168,49 +162,46 @@ async def museum_searching(message: types.Message, state: FSMContext):
         await message.answer("❌ Մուտքագրեք անուն կամ ազգանուն։")
         return
 
-    parts = query.split()
-    if len(parts) >= 2:
-        first, last = parts[0], parts[1]
-        filt = {"$or": [
-            {"$and": [{"name.first": Regex(first, "i")}, {"name.last": Regex(last, "i")}]},
-            {"$and": [{"name.first": Regex(last, "i")}, {"name.last": Regex(first, "i")}]},
-        ]}
-    else:
-        filt = {"$or": [{"name.first": Regex(query, "i")}, {"name.last": Regex(query, "i")}]}
-
-    heroes = [h async for h in heroes_collection.find(filt)]
-    total = len(heroes)
-    if not heroes:
+    ids = search_index.search(query)
+    total = len(ids)
+    if not ids:
         await message.answer("❌ Հերոս չի գտնվել։ Փորձեք այլ անուն։")
         return
     
     increment_user_search(message.from_user, query)
 
-    cache_key = f"search:{uuid4().hex[:8]}"
-    set_cached_hero(cache_key, [str(h["_id"]) for h in heroes])
+    # the index can still hold a hero deleted since the last heroes:version refresh
+    hero = await heroes_collection.find_one({"_id": ids[0]})
+    if not hero:
+        logger.warning(f"⚠️ Indexed hero {ids[0]} is no longer stored")
+        await message.answer("❌ Հերոս չի գտնվել։ Փորձեք այլ անուն։")
+        return
 
-    hero = heroes[0]
-    caption = build_caption(hero, 0, total)
-    kb = build_keyboard("search", 0, total, cache_key)
-    img_path = await compose_hero_image(hero["img_url"])
-    image = await message.answer_photo(hero["img_url"], caption=caption, parse_mode="HTML", reply_markup=kb)
-    print("Exists:", os.path.exists(img_path))
-    print("Path:", img_path)
-    media = InputMediaPhoto(
-        media=types.FSInputFile(img_path),
-        caption=caption,
-        parse_mode="HTML"
-    )
-    await image.edit_media(media, reply_markup=kb)
+    pages = await prefetch_pages(ids, 0, total, session_page)
     await history_collection.insert_one({
         "user_id": str(message.from_user.id),
         "username": message.from_user.username,
         "query": query,
         "hero_id": str(hero["_id"]),
         "hero_name": f"{hero['name']['first']} {hero['name']['last']}",
-        "searched_at": message.date.isoformat()
+        "searched_at": message.date,
     })
-    cache.set("stats:last_search_time", datetime.now(timezone.utc).isoformat())
+    # result session, search counters and the photo's file_id in one round trip
+    async with cache.pipeline(transaction=True) as pipe:
+        cache_key, session_at = queue_session(pipe, ids, pages)
+        queue_search(
+            pipe, str(message.from_user.id), query, hero["name"]["last"], datetime.now(timezone.utc),
+            hero=hero, user=message.from_user,
+        )
+        file_id_at = queue_file_id(pipe, hero["img_url"])
+        replies = await pipe.execute()
+    await settle_session(cache_key, replies, session_at)
+
+    caption = build_caption(hero, 0, total)
+    kb = build_keyboard("search", 0, total, cache_key)
+    photo = await resolve_hero_photo(hero["img_url"], replies[file_id_at])
+    await send_hero_photo(message, hero["img_url"], photo, caption, kb)
+    prefetch_neighbours("search", cache_key, 0, total, message.chat.id, ids)
     await state.clear()
 
 
@@ -219,26 +210,18 @@ async def museum_searching(message: types.Message, state: FSMContext):
 # ---------------------
 @router.callback_query(lambda c: c.data == "museum_all")
 async def show_all_heroes(cb: types.CallbackQuery):
-    heroes = [h async for h in heroes_collection.find()]
-    total = len(heroes)
-    if not heroes:
+    # browse order: total from memory, the page by its ordinal — no result session
+    total = hero_browser.total
+    hero = await hero_browser.hero_at(0) if total else None
+    if not hero:
         await cb.message.answer("❌ Թանգարանում դեռ հերոսներ չկան։")
         return
 
-    cache_key = f"all:{uuid4().hex[:8]}"
-    set_cached_hero(cache_key, [str(h["_id"]) for h in heroes])
-
-    hero = heroes[0]
     caption = build_caption(hero, 0, total)
-    kb = build_keyboard("all", 0, total, cache_key)
-    img_path = await compose_hero_image(hero["img_url"])
-    image = await cb.message.answer_photo(hero["img_url"], caption=caption, parse_mode="HTML", reply_markup=kb)
-    media = InputMediaPhoto(
-        media=types.FSInputFile(img_path),
-        caption=caption,
-        parse_mode="HTML"
-    )
-    await image.edit_media(media, reply_markup=kb)
+    kb = build_keyboard("all", 0, total)
+    photo = await get_hero_photo(hero["img_url"])
+    await send_hero_photo(cb.message, hero["img_url"], photo, caption, kb)
+    prefetch_neighbours("all", None, 0, total, cb.message.chat.id)
     await cb.answer()
 
 
@@ -247,18 +230,15 @@ async def show_all_heroes(cb: types.CallbackQuery):
 # ---------------------
 @router.callback_query(lambda c: c.data == "museum_wars")
 async def show_wars_list(cb: types.CallbackQuery):
-    wars = await heroes_collection.distinct("war")
-    wars = [w for w in wars if w]
+    wars = war_catalogue.wars()
     if not wars:
         await cb.message.answer("❌ Դեռևս պատերազմներ չկան տվյալների բազայում։")
         return
 
-    keyboard = []
-    for w in wars:
-        key = f"war:{uuid4().hex[:8]}"
-        await cache.set(key, w, ex=3600)
-        keyboard.append([InlineKeyboardButton(text=f"⚔️ {w}", callback_data=make_callback("museum_war", key))])
-
+    keyboard = [
+        [InlineKeyboardButton(text=f"⚔️ {name} ({count})", callback_data=make_callback("museum_war", wid))]
+        for wid, name, count in wars
+    ]
     keyboard.append([InlineKeyboardButton(text="↩️ Վերադառնալ մենյու", callback_data="museum_menu")])
     kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -271,38 +251,19 @@ async def show_wars_list(cb: types.CallbackQuery):
 # ---------------------
 @router.callback_query(lambda c: c.data.startswith("museum_war|"))
 async def filter_by_war(cb: types.CallbackQuery):
-    try:
-        _, cache_key = cb.data.split("|", 1)
-        war = cache.get(cache_key)
-    except Exception as e:
-        logger.warning(f"Bad war key: {e}")
-        await cb.answer("⛔ Ժամկետանց հղում։", show_alert=True)
-        return
-
+    _, wid = cb.data.split("|", 1)
+    war = war_catalogue.get(wid)
     if not war:
         await cb.answer("⛔ Ժամկետանց հղում։", show_alert=True)
         return
 
-    heroes = [h async for h in heroes_collection.find({"war": war})]
-    total = len(heroes)
-    if not heroes:
-        await cb.message.answer(f"❌ {war} բաժնում հերոսներ չկան։")
-        return
-
-    cache_key2 = f"warlist:{uuid4().hex[:8]}"
-    set_cached_hero(cache_key2, [str(h["_id"]) for h in heroes])
-
-    hero = heroes[0]
-    caption = build_caption(hero, 0, total)
-    kb = build_keyboard("war", 0, total, cache_key2)
-    img_path = await compose_hero_image(hero["img_url"])
-    image = await cb.message.answer_photo(hero["img_url"], caption=caption, parse_mode="HTML", reply_markup=kb)
-    media = InputMediaPhoto(
-        media=types.FSInputFile(img_path),
-        caption=caption,
-        parse_mode="HTML"
-    )
-    await image.edit_media(media, reply_markup=kb)
+    # the first page is part of the catalogue, so opening a war needs no query
+    total = len(war["ids"])
+    page = war["first"]
+    kb = build_keyboard("war", 0, total, wid)
+    photo = await get_hero_photo(page["img_url"])
+    await send_hero_photo(cb.message, page["img_url"], photo, page["caption"], kb)
+    prefetch_neighbours("war", wid, 0, total, cb.message.chat.id, war["ids"])
     await cb.answer()
 
 
@@ -320,26 +281,52 @@ async def paginate_museum(cb: types.CallbackQuery):
         await cb.answer("Սխալ տվյալ։", show_alert=True)
         return
 
-    ids = get_cached_hero(key)
-    if not ids:
-        await cb.answer("⚠️ Տվյալներ չկան կամ ժամկետանց են։", show_alert=True)
-        return
-
-    total = len(ids)
-    hero = await heroes_collection.find_one({"_id": ObjectId(ids[index % total])})
-    caption = build_caption(hero, index, total)
+    # "all" pages are looked up by ordinal; war pages come from the catalogue;
+    # search results from their result session
+    if mode == "all":
+        total = hero_browser.total
+        index = index % total if total else 0
+        ids = None
+        page = prefetcher.take(prefetch_scope(mode, key, total), index) if total else None
+        if page is None:
+            hero = await hero_browser.hero_at(index) if total else None
+            if not hero:
+                await cb.answer("⚠️ Տվյալներ չկան կամ ժամկետանց են։", show_alert=True)
+                return
+            page = session_page(hero, index, total)
+    else:
+        if mode == "war":
+            war = war_catalogue.get(key)
+            session = {"ids": war["ids"], "pages": {"0": war["first"]}} if war else None
+        else:
+            session = await get_session(key)
+        if not session:
+            await cb.answer("⚠️ Տվյալներ չկան կամ ժամկետանց են։", show_alert=True)
+            return
+
+        ids = session["ids"]
+        total = len(ids)
+        index %= total
+        page = prefetcher.take(prefetch_scope(mode, key, total), index, stored=session["pages"])
+        if page is None:
+            hero = await heroes_collection.find_one({"_id": ObjectId(ids[index])})
+            if not hero:
+                await cb.answer("⚠️ Տվյալներ չկան կամ ժամկետանց են։", show_alert=True)
+                return
+            page = session_page(hero, index, total)
+
+    caption = page["caption"]
     kb = build_keyboard(mode, index, total, key)
 
+    photo = None
     try:
-        img_path = await compose_hero_image(hero["img_url"])
-        media = InputMediaPhoto(media=hero["img_url"], caption=caption, parse_mode="HTML")
-        media = InputMediaPhoto(
-            media=types.FSInputFile(img_path),
-            caption=caption,
-            parse_mode="HTML"
-        )
-        await cb.message.edit_media(media=media, reply_markup=kb)
+        photo = await get_hero_photo(page["img_url"])
+        media = InputMediaPhoto(media=photo, caption=caption, parse_mode="HTML")
+        sent = await cb.message.edit_media(media=media, reply_markup=kb)
+        await remember_file_id(page["img_url"], sent, photo)
     except Exception:
+        await forget_file_id(page["img_url"], photo)
         await cb.message.edit_caption(caption=caption, parse_mode="HTML", reply_markup=kb)
 
+    prefetch_neighbours(mode, key, index, total, cb.message.chat.id, ids)
     await cb.answer()
@@ -1,53 +1,31 @@
 from aiogram import Router, types
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from app.db.redis_db import cache
+from app.utils.cache import get_profile_data, clear_user_history
 from app.db.mongo import users_collection, history_collection
 from app.utils.util import format_armenian_datetime
 
 router = Router()
 
 
-# --- 🧩 Helper: Get user info ---
-async def get_user_data(user_id: str):
-    """Get user info from Redis, fallback to Mongo."""
+# --- 🧩 Helper: Get profile data ---
+async def get_profile(user_id: str):
+    """Get user info, last 10 searches and stats from Redis in one round trip, fallback to Mongo."""
     user_id = str(user_id)
-    user = cache.hgetall(f"user:{user_id}")
-    if not user:
-        user = await users_collection.find_one({"id": user_id}) or {}
-    return user
+    data = await get_profile_data(user_id)
 
+    if not data["user"]:
+        data["user"] = await users_collection.find_one({"id": user_id}) or {}
 
-# --- 🧩 Helper: Get user search history ---
-async def get_user_history(user_id: str):
-    """Get last 10 searches from Redis, fallback to Mongo."""
-    user_id = str(user_id)
-    history = cache.lrange(f"history:{user_id}", 0, 9)
-    if not history:
+    if not data["history"]:
         cursor = (
             history_collection.find({"user_id": user_id})
             .sort("searched_at", -1)
             .limit(10)
         )
-        history = [doc.get("query", "—") async for doc in cursor]
-    return history
-
-
-# --- 🧩 Helper: Get global statistics ---
-async def get_stats():
-    """Fetch bot statistics from Redis (fallback-safe)."""
-    total_users = cache.scard("stats:users") or 0
-    unique_search_users = cache.scard("stats:users") or 0
-    total_searches = int(cache.get("stats:searches:total") or 0)
-    unique_heroes = cache.scard("stats:heroes") or 0
-    last_search = cache.get("stats:last_search_time") or "Չկա"
+        data["history"] = [doc.get("query", "—") async for doc in cursor]
 
-    return {
-        "total_users": total_users,
-        "unique_search_users": unique_search_users,
-        "total_searches": total_searches,
-        "unique_heroes": unique_heroes,
-        "last_search": last_search,
-    }
+    data["last_search"] = data["last_search"] or "Չկա"
+    return data
 
 
 # --- 📈 Profile command (User stats & history) ---
@@ -56,9 +34,8 @@ async def show_profile(cb: types.CallbackQuery):
     user_id = str(cb.from_user.id)
 
     # Load user data & stats
-    user = await get_user_data(user_id)
-    history = await get_user_history(user_id)
-    stats = await get_stats()
+    stats = await get_profile(user_id)
+    user, history = stats["user"], stats["history"]
 
     # --- Compose Profile Message ---
     text = (
@@ -92,7 +69,7 @@ async def show_profile(cb: types.CallbackQuery):
 @router.callback_query(lambda c: c.data == "clear_history")
 async def clear_history(cb: types.CallbackQuery):
     user_id = str(cb.from_user.id)
-    cache.delete(f"history:{user_id}")
+    await clear_user_history(user_id)
     await history_collection.delete_many({"user_id": user_id})
     await cb.message.answer("✅ Ձեր որոնումների պատմությունը մաքրվեց։")
     await cb.answer()
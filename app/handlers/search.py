@@ -6,94 +6,45 @@ from aiogram.types import (
     WebAppInfo,
 )
 from loguru import logger
-from bson.regex import Regex
 from app.db.mongo import heroes_collection, history_collection, users_collection
 from app.db.redis_db import cache
-from app.utils.cache import get_cached_hero, set_cached_hero
-import re
-import html
+from app.utils.cache import queue_search
+from app.utils.sessions import queue_session, settle_session, get_session, prefetch_pages, session_alive
+from bson import ObjectId
 from app.db.mongo_stats import increment_user_search
-from app.utils.util import compose_hero_image
+from app.utils.captions import build_caption
+from app.utils.image_cache import get_hero_photo, queue_file_id, resolve_hero_photo, remember_file_id, forget_file_id
+from app.utils.search_index import search_index
+from app.utils.prefetch import prefetcher
 
 router = Router()
 
 PAGE_SIZE = 1
 CB_PREFIX = "hero_page"
 ARMENIAN_FLAG_URL = "https://upload.wikimedia.org/wikipedia/commons/2/2f/Flag_of_Armenia.svg"
-MAX_CAPTION_LEN = 1024
 
 
-# --- Clean and format text ---
-def sanitize_html(text: str) -> str:
-    """Remove all HTML tags and leave plain readable text."""
-    if not text:
-        return ""
-    text = re.sub(r"<[^>]+>", "", text)
-    text = html.unescape(text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+# --- Result session page ---
+def session_page(hero, index, total):
+    return {
+        "caption": build_caption(hero, index, total),
+        "img_url": hero["img_url"],
+        "bio_link": hero.get("bio_link", ""),
+    }
 
 
-def remove_duplicate_sentences(text: str) -> str:
-    """Remove repeating sentences often duplicated in Zinapah."""
-    sentences = re.split(r"[։\.]", text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    unique, seen = [], set()
-    for s in sentences:
-        if s not in seen:
-            seen.add(s)
-            unique.append(s)
-    return "։ ".join(unique).strip() + "։"
-
-
-def format_bio_text(bio: str) -> str:
-    """Format biography text in patriotic Armenian tone."""
-    bio = sanitize_html(bio)
-    bio = re.sub(r"(?<=\D)(?=\d)", " ", bio)  # insert missing spaces before digits
-    bio = re.sub(r"\s{2,}", " ", bio)
-    bio = remove_duplicate_sentences(bio)
-
-    paragraphs = re.split(r"[։\.]", bio)
-    paragraphs = [p.strip() for p in paragraphs if p.strip()]
-
-    formatted = []
-    for p in paragraphs:
-        formatted.append(f"«{p}։»")
-
-    return "\n\n".join(formatted[:10])
-
-
-# --- Build caption ---
-def build_caption(hero, index, total):
-    bio = format_bio_text(hero.get("bio", ""))
-    name = f"{hero['name']['first']} {hero['name']['last']}"
-    birth = hero["date"].get("birth", "")
-    death = hero["date"].get("dead", "")
-    region = hero.get("region", "")
-    war = hero.get("war", "")
-
-    caption = (
-        f"֍ ՀԱՎԵՐԺ ՓԱՌՔ ֍\n"
-        f"🇦🇲 <b>{name}</b> ֍ \n"
-        f"📅 {birth} - {death}\n"
-        f"📍 {region}\n"
-        f"⚔️ {war}\n\n"
-        f"🕯️ {bio}\n\n"
-        f"֍ ՀԱՎԵՐԺ ՓԱՌՔ ֍\n\n"
-        f"<i>{index + 1}/{total}</i>"
+# --- Warm the ⬅️/➡️ pages in the background ---
+def prefetch_neighbours(token, ids, index, total, pages=None):
+    prefetcher.schedule(
+        f"hero:{token}",
+        fetch=lambda: prefetch_pages(ids, index, total, session_page),
+        pages=pages,
+        alive=lambda: session_alive(token),
     )
 
-    if len(caption) > MAX_CAPTION_LEN:
-        cutoff = caption[: MAX_CAPTION_LEN - 3]
-        cutoff = re.sub(r"<[^>]*$", "", cutoff)
-        cutoff = re.sub(r"\s+\S*$", "", cutoff)
-        caption = cutoff.strip() + "..."
-
-    return caption
-
 
 # --- Build inline keyboard ---
-def build_keyboard(query, index, total, more_url):
+def build_keyboard(token, index, total, more_url):
     prev_i = (index - 1) % total
     next_i = (index + 1) % total
 
@@ -101,12 +52,12 @@ def build_keyboard(query, index, total, more_url):
         [
             InlineKeyboardButton(
                 text="⬅️ Նախորդ",
-                callback_data=f"{CB_PREFIX}|{query}|{prev_i}",
+                callback_data=f"{CB_PREFIX}|{token}|{prev_i}",
             ),
             InlineKeyboardButton(text=f"{index + 1}/{total}", callback_data="noop"),
             InlineKeyboardButton(
                 text="Հաջորդ ➡️",
-                callback_data=f"{CB_PREFIX}|{query}|{next_i}",
+                callback_data=f"{CB_PREFIX}|{token}|{next_i}",
             ),
         ],
     ]
@@ -132,54 +83,27 @@ async def search_hero(message: types.Message):
     increment_user_search(message.from_user, query)
     print("r")
 
-    # Split query into words for flexible searching
-    parts = query.split()
-    filt = {}
-
-    if len(parts) >= 2:
-        # Searching by both first + last name in any order
-        first, last = parts[0], parts[1]
-        filt = {
-            "$or": [
-                {"$and": [
-                    {"name.first": Regex(first, "i")},
-                    {"name.last": Regex(last, "i")},
-                ]},
-                {"$and": [
-                    {"name.first": Regex(last, "i")},
-                    {"name.last": Regex(first, "i")},
-                ]},
-            ]
-        }
-    else:
-        # Single word → match first name or last name
-        filt = {
-            "$or": [
-                {"name.first": Regex(query, "i")},
-                {"name.last": Regex(query, "i")},
-            ]
-        }
+    ids = search_index.search(query)
+    total = len(ids)
 
-    heroes = [h async for h in heroes_collection.find(filt)]
-    total = len(heroes)
+    if not ids:
+        await message.answer("❌ Հերոս չի գտնվել։ Փորձեք այլ անուն կամ ազգանուն։")
+        return
 
-    if not heroes:
+    # the index can still hold a hero deleted since the last heroes:version refresh
+    hero = await heroes_collection.find_one({"_id": ids[0]})
+    if not hero:
+        logger.warning(f"⚠️ Indexed hero {ids[0]} is no longer stored")
         await message.answer("❌ Հերոս չի գտնվել։ Փորձեք այլ անուն կամ ազգանուն։")
         return
 
-    set_cached_hero(query, [str(h["_id"]) for h in heroes])
-    hero = heroes[0]
+    pages = await prefetch_pages(ids, 0, total, session_page)
     caption = build_caption(hero, 0, total)
-    kb = build_keyboard(query, 0, total, hero.get("bio_link", ""))
 
     # --- 📜 Save search history (Redis + Mongo) ---
     user_id = str(message.from_user.id)
     query_text = query
 
-    # Redis cache: keep last 10 searches
-    cache.lpush(f"history:{user_id}", query_text)
-    cache.ltrim(f"history:{user_id}", 0, 9)
-
     # MongoDB permanent log
     await history_collection.insert_one(
         {
@@ -191,82 +115,81 @@ async def search_hero(message: types.Message):
         }
     )
 
-    cache.incr("stats:searches:total")
-    cache.sadd("stats:users", user_id)
-    cache.sadd("stats:heroes", hero["name"]["last"])
-    await cache.set("stats:last_search_time", message.date.isoformat())
+    # Redis: result session, last 10 searches + counters and the photo's file_id, one round trip
+    async with cache.pipeline(transaction=True) as pipe:
+        token, session_at = queue_session(pipe, ids, pages)
+        queue_search(
+            pipe, user_id, query_text, hero["name"]["last"], message.date,
+            hero=hero, user=message.from_user,
+        )
+        file_id_at = queue_file_id(pipe, hero["img_url"])
+        replies = await pipe.execute()
+    await settle_session(token, replies, session_at)
+    kb = build_keyboard(token, 0, total, hero.get("bio_link", ""))
 
-    img_path = await compose_hero_image(hero["img_url"])
+    photo = await resolve_hero_photo(hero["img_url"], replies[file_id_at])
     try:
-        await message.answer_photo(
-            types.FSInputFile(img_path),
+        sent = await message.answer_photo(
+            photo,
             caption=caption,
             parse_mode="HTML",
             reply_markup=kb,
         )
+        await remember_file_id(hero["img_url"], sent, photo)
     except Exception as e:
         logger.warning(f"⚠️ Could not send photo ({hero.get('img_url')}): {e}")
+        await forget_file_id(hero["img_url"], photo)
         await message.answer_photo(
             ARMENIAN_FLAG_URL,
             caption=caption,
             parse_mode="HTML",
             reply_markup=kb,
         )
+    prefetch_neighbours(token, ids, 0, total, pages)
 
 @router.callback_query(F.data.startswith(CB_PREFIX))
 async def paginate_hero(cb: types.CallbackQuery):
     try:
-        _, query, idx = cb.data.split("|")
+        _, token, idx = cb.data.split("|")
         index = int(idx)
     except Exception as e:
         logger.warning(f"⚠️ Invalid callback data: {cb.data} ({e})")
         await cb.answer("Սխալ տվյալ։", show_alert=True)
         return
 
-    
-    parts = query.split()
-    if len(parts) >= 2:
-        first, last = parts[0], parts[1]
-        filt = {
-            "$or": [
-                {"$and": [
-                    {"name.first": Regex(first, "i")},
-                    {"name.last": Regex(last, "i")},
-                ]},
-                {"$and": [
-                    {"name.first": Regex(last, "i")},
-                    {"name.last": Regex(first, "i")},
-                ]},
-            ]
-        }
-    else:
-        filt = {
-            "$or": [
-                {"name.first": Regex(query, "i")},
-                {"name.last": Regex(query, "i")},
-            ]
-        }
-
-    heroes = [h async for h in heroes_collection.find(filt)]
-    total = len(heroes)
-    if not heroes:
+    # One cache read serves the click; Mongo only for pages not prefetched
+    session = await get_session(token)
+    if not session:
         await cb.answer("Արդյունքներ չկան։", show_alert=True)
         return
 
-    hero = heroes[index % total]
-    caption = build_caption(hero, index, total)
-    kb = build_keyboard(query, index, total, hero.get("bio_link", ""))
-
+    ids = session["ids"]
+    total = len(ids)
+    index %= total
+    page = prefetcher.take(f"hero:{token}", index, stored=session["pages"])
+    if page is None:
+        hero = await heroes_collection.find_one({"_id": ObjectId(ids[index])})
+        if not hero:
+            await cb.answer("Արդյունքներ չկան։", show_alert=True)
+            return
+        page = session_page(hero, index, total)
+
+    caption = page["caption"]
+    kb = build_keyboard(token, index, total, page["bio_link"])
+
+    photo = None
     try:
-        img_path = await compose_hero_image(hero["img_url"])
+        photo = await get_hero_photo(page["img_url"])
         media = InputMediaPhoto(
-            media=types.FSInputFile(img_path),
+            media=photo,
             caption=caption,
             parse_mode="HTML",
         )
-        await cb.message.edit_media(media=media, reply_markup=kb)
+        sent = await cb.message.edit_media(media=media, reply_markup=kb)
+        await remember_file_id(page["img_url"], sent, photo)
     except Exception as e:
         logger.warning(f"⚠️ edit_media failed: {e}")
+        await forget_file_id(page["img_url"], photo)
         try:
             flag_media = InputMediaPhoto(
                 media=ARMENIAN_FLAG_URL, caption=caption, parse_mode="HTML"
@@ -278,4 +201,5 @@ async def paginate_hero(cb: types.CallbackQuery):
                 caption=caption, parse_mode="HTML", reply_markup=kb
             )
 
+    prefetch_neighbours(token, ids, index, total)
     await cb.answer()
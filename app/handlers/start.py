@@ -10,13 +10,12 @@ from bson import ObjectId
 from urllib.parse import unquote
 from loguru import logger
 import re
-import os
 
-from app.db.redis_db import cache
 from app.db.mongo import users_collection, heroes_collection
-from app.utils.cache import set_cached_hero
-from app.handlers.museum_search import build_caption, build_keyboard
-from app.utils.util import compose_hero_image
+from app.utils.cache import remember_user
+from app.handlers.museum_search import build_caption, build_keyboard, prefetch_neighbours
+from app.utils.browse import hero_browser
+from app.utils.image_cache import get_hero_photo, remember_file_id, forget_file_id
 
 router = Router()
 
@@ -37,31 +36,31 @@ async def start_cmd(message: types.Message):
     first_name = message.from_user.first_name or ""
     last_name = message.from_user.last_name or ""
 
-    # --- Redis fast cache (async!) ---
-    user_key = f"user:{user_id}"
-    await cache.hset(
-        user_key,
-        mapping={
+    # --- Redis fast cache (one round trip) ---
+    await remember_user(
+        user_id,
+        {
             "id": user_id,
             "username": username,
             "first_name": first_name,
             "last_name": last_name,
         },
     )
-    await cache.sadd("users:set", user_id)
 
-    # --- Mongo persistent storage ---
-    existing = await users_collection.find_one({"id": user_id})
-    if not existing:
-        await users_collection.insert_one(
-            {
+    # --- Mongo persistent storage (one upsert on the unique users.id index) ---
+    await users_collection.update_one(
+        {"id": user_id},
+        {
+            "$setOnInsert": {
                 "id": user_id,
                 "username": username,
                 "first_name": first_name,
                 "last_name": last_name,
                 "joined_at": message.date,
             }
-        )
+        },
+        upsert=True,
+    )
 
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -108,36 +107,30 @@ async def start_cmd(message: types.Message):
         await wait_msg.edit_text("❌ Այդ հղումով հերոս չի գտնվել։")
         return
 
-    # ✅ Better than loading all heroes docs:
-    # Get only ids (still O(N) but much lighter than full docs)
-    hero_ids = await heroes_collection.find({}, {"_id": 1}).to_list(length=None)
-    all_ids = [str(h["_id"]) for h in hero_ids]
-    total = len(all_ids)
-    current_index = all_ids.index(hero_id) if hero_id in all_ids else 0
-
-    cache_key = f"hero:{hero_id}"
-    set_cached_hero(cache_key, all_ids)
+    # the hero's place in the "all heroes" order is stored on it; the total is in memory
+    current_index = await hero_browser.position_of(hero)
+    total = max(hero_browser.total, current_index + 1)
 
     caption = fix_unclosed_tags(build_caption(hero, current_index, total))
-    keyboard = build_keyboard("all", current_index, total, cache_key)
+    keyboard = build_keyboard("all", current_index, total)
 
-    img_path = None
+    img_url = hero.get("img_url")
+    photo = None
     try:
         try:
             await wait_msg.delete()
         except Exception:
             pass
 
-        img_url = hero.get("img_url")
         if img_url:
-            img_path = await compose_hero_image(img_url)
-            photo = types.FSInputFile(img_path)
-            await message.answer_photo(
+            photo = await get_hero_photo(img_url)
+            sent = await message.answer_photo(
                 photo,
                 caption=caption,
                 parse_mode="HTML",
                 reply_markup=keyboard,
             )
+            await remember_file_id(img_url, sent, photo)
         else:
             await message.answer(
                 caption,
@@ -146,18 +139,13 @@ async def start_cmd(message: types.Message):
             )
     except Exception as e:
         logger.warning(f"⚠️ Failed to send composed image: {e}")
+        await forget_file_id(img_url, photo)
         await message.answer(
             caption,
             parse_mode="HTML",
             reply_markup=keyboard,
         )
-    finally:
-        # clean temp file if compose_hero_image creates a temp local file
-        if img_path and os.path.exists(img_path):
-            try:
-                os.remove(img_path)
-            except Exception:
-                pass
+    prefetch_neighbours("all", None, current_index, total, message.chat.id)
 
 
 @router.callback_query(F.data == "connect_info")
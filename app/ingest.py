@@ -0,0 +1,209 @@
+"""
+Load scraper output into heroes_collection.
+
+    python -m app.ingest [files...] [--dry-run]
+
+Without arguments reads data/heroes.json (legacy array) and every
+data/heroes*.ndjson, oldest rotation first. Only new or changed heroes are
+written; an unchanged dataset costs one projection scan and no writes.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+from loguru import logger
+from pymongo import UpdateOne
+from app.db.mongo import heroes_collection
+from app.utils.cache import bump_heroes_version
+from app.utils.captions import prepare_caption
+from app.utils.image_cache import forget_hero_photo
+from app.utils.search_index import search_keys
+from app.utils.war_catalogue import war_catalogue
+from app.utils.browse import hero_browser
+from app.config.settings import INGEST_BATCH
+
+SOURCE_FIELDS = ("name", "date", "region", "war", "img_url", "bio_link", "bio")
+
+
+# ---------------------
+# 🔹 READING
+# ---------------------
+def default_sources() -> list[str]:
+    sources = ["data/heroes.json"] if os.path.exists("data/heroes.json") else []
+    # rotated files (heroes.<timestamp>.ndjson) sort before the live heroes.ndjson
+    return sources + sorted(glob.glob("data/heroes*.ndjson"))
+
+
+def iter_records(paths: list[str]):
+    """Yield scraped heroes from NDJSON files (or legacy JSON arrays), skipping broken lines."""
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                yield from json.load(f)
+            continue
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ Skipping malformed line {path}:{number}")
+
+
+# ---------------------
+# 🔹 CHANGE DETECTION
+# ---------------------
+def hero_key(hero: dict) -> str:
+    """Identity of a hero across crawls: the bio page, else name + death date."""
+    if hero.get("bio_link"):
+        return hero["bio_link"]
+    name = hero.get("name") or {}
+    return f"{name.get('first', '')}|{name.get('last', '')}|{(hero.get('date') or {}).get('dead', '')}"
+
+
+def source_hash(hero: dict) -> str:
+    payload = json.dumps({f: hero.get(f) for f in SOURCE_FIELDS}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def build_document(hero: dict, digest: str) -> dict:
+    """Scraped fields plus everything derived from them."""
+    doc = {f: hero.get(f, "") for f in SOURCE_FIELDS}
+    doc["name"] = doc["name"] or {"first": "", "last": ""}
+    doc["date"] = doc["date"] or {"birth": "", "dead": ""}
+    doc["search"] = search_keys(doc["name"])
+    doc["caption"] = prepare_caption(doc)
+    doc["source_hash"] = digest
+    return doc
+
+
+async def load_known() -> dict:
+    """key -> (_id, source_hash, img_url) of every stored hero, without bios."""
+    known = {}
+    projection = {"name": 1, "date.dead": 1, "bio_link": 1, "img_url": 1, "source_hash": 1}
+    async for hero in heroes_collection.find({}, projection):
+        known[hero_key(hero)] = (hero["_id"], hero.get("source_hash"), hero.get("img_url"))
+    return known
+
+
+# ---------------------
+# 🔹 INGEST
+# ---------------------
+class Ingester:
+    """
+    Incremental ingest: `add` heroes one by one (they are written `batch_size`
+    at a time), then `finish` once. Used by `ingest` for scraper files and by
+    the crawler's MongoSink, so both store the same documents.
+    """
+
+    def __init__(self, dry_run: bool = False, batch_size: int = INGEST_BATCH):
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.summary = {"read": 0, "new": 0, "changed": 0, "unchanged": 0, "invalid": 0, "bios_kept": 0, "images_invalidated": 0}
+        self._known = None
+        self._stale_images = set()
+        self._batch = []
+        self._started = time.perf_counter()
+
+    async def add(self, hero: dict):
+        if self._known is None:
+            self._known = await load_known()
+        self.summary["read"] += 1
+        if not isinstance(hero, dict) or not (hero.get("name") or {}).get("first"):
+            self.summary["invalid"] += 1
+            return
+
+        key = hero_key(hero)
+        digest = source_hash(hero)
+        stored = self._known.get(key)
+        if stored and stored[1] == digest:
+            self.summary["unchanged"] += 1
+            return
+
+        doc = build_document(hero, digest)
+        hero_id = stored[0] if stored else None
+        if hero_id:
+            selector = {"_id": hero_id}
+        else:
+            selector = {"bio_link": key} if doc["bio_link"] else {"name": doc["name"], "date.dead": doc["date"]["dead"]}
+        if stored and not doc["bio"]:
+            # an empty bio is a failed fetch, not a removed one: keep (and caption) the stored bio
+            bio = await self.stored_bio(selector)
+            if bio:
+                doc = build_document({**hero, "bio": bio}, digest)
+                self.summary["bios_kept"] += 1
+        self.summary["changed" if stored else "new"] += 1
+        self._batch.append(UpdateOne(selector, {"$set": doc}, upsert=not hero_id))
+        if hero_id and stored[2] and stored[2] != doc["img_url"]:
+            self._stale_images.add(stored[2])
+        # later records of the same hero (re-crawls) compare against this one
+        self._known[key] = (hero_id, digest, doc["img_url"])
+
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def stored_bio(self, selector: dict) -> str:
+        await self.flush()   # the hero may still be in this run's pending batch
+        stored = await heroes_collection.find_one(selector, {"bio": 1})
+        return (stored or {}).get("bio") or ""
+
+    async def flush(self):
+        if self._batch and not self.dry_run:
+            await heroes_collection.bulk_write(self._batch, ordered=False)
+        self._batch.clear()
+
+    async def finish(self) -> dict:
+        await self.flush()
+        if not self.dry_run:
+            for img_url in self._stale_images:
+                await forget_hero_photo(img_url)
+            self.summary["images_invalidated"] = len(self._stale_images)
+            if self.summary["new"] or self.summary["changed"]:
+                # running bots reload their search index and war catalogue on the next refresh tick
+                await bump_heroes_version()
+                await war_catalogue.rebuild()
+                await hero_browser.rebuild()
+
+        self.summary["seconds"] = round(time.perf_counter() - self._started, 2)
+        return self.summary
+
+
+async def ingest(paths: list[str], dry_run: bool = False, batch_size: int = INGEST_BATCH) -> dict:
+    ingester = Ingester(dry_run, batch_size)
+    for hero in iter_records(paths):
+        await ingester.add(hero)
+    return await ingester.finish()
+
+
+def print_summary(summary: dict, dry_run: bool):
+    title = "Ingest (dry run)" if dry_run else "Ingest"
+    print(f"📥 {title}: {summary['read']} records read in {summary['seconds']}s")
+    print(f"   🆕 new: {summary['new']}")
+    print(f"   ✏️ changed: {summary['changed']}")
+    print(f"   ✅ unchanged: {summary['unchanged']}")
+    print(f"   ⚠️ invalid: {summary['invalid']}")
+    print(f"   📝 stored bios kept over empty ones: {summary['bios_kept']}")
+    print(f"   🖼 image renders invalidated: {summary['images_invalidated']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load scraper output into MongoDB")
+    parser.add_argument("files", nargs="*", help="NDJSON or legacy JSON files (default: data/heroes*)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    paths = args.files or default_sources()
+    if not paths:
+        print("No scraper output found in data/.")
+        return
+    summary = await ingest(paths, dry_run=args.dry_run)
+    print_summary(summary, args.dry_run)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,16 @@
+import asyncio
 from aiogram import Bot, types
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from random import choice
+from redis.exceptions import LockError
 from loguru import logger
 from bson import ObjectId
+from datetime import datetime
 from app.db.mongo import heroes_collection, channels_collection
-from app.handlers.museum_search import build_caption
+from app.db.redis_db import cache
+from app.utils.broadcast import PhotoBroadcast, RUN_TTL
+from app.utils.captions import build_caption
+from app.utils.selection import pick_hero
+from app.config.settings import DAILY_PREFER_ANNIVERSARY
 
 # ---------------------
 # ⚙️ SCHEDULER CONFIG
@@ -12,6 +18,15 @@ from app.handlers.museum_search import build_caption
 scheduler = AsyncIOScheduler()
 CB_PREFIX = "daily_post"
 BOT_USERNAME = "armenian_heroes_bot"  # 🧩 replace with your bot username
+DAILY_HOUR, DAILY_MINUTE = 10, 0  # ⏰ change time here (server time)
+DAILY_LOCK_KEY = "lock:daily_hero"
+# short, and renewed while sending: a crashed sender frees it soon enough to resume
+DAILY_LOCK_TIMEOUT = 300
+DAILY_LOCK_RENEW = DAILY_LOCK_TIMEOUT / 3
+
+
+def finished_key(run_id: str) -> str:
+    return f"broadcast:{run_id}:finished"
 
 
 # ---------------------
@@ -19,17 +34,26 @@ BOT_USERNAME = "armenian_heroes_bot"  # 🧩 replace with your bot username
 # ---------------------
 async def send_daily_hero(bot: Bot):
     """
-    Pick one random hero from MongoDB and send
+    Pick the next hero of the no-repeat rotation and send
     their info to all connected channels.
-    Also checks channel access and cleans invalid ones.
+    A run is keyed by date, so a restarted run resumes with the same hero
+    and skips channels that already got the post.
     """
-    # --- Get heroes ---
-    heroes = [h async for h in heroes_collection.find()]
-    if not heroes:
-        logger.warning("⚠️ No heroes found in database.")
-        return
+    run_id = datetime.now().strftime("%Y-%m-%d")
+    hero_key = f"broadcast:{run_id}:hero"
+
+    # --- Get hero (reuse today's pick when resuming) ---
+    hero = None
+    hero_id = await cache.get(hero_key)
+    if hero_id:
+        hero = await heroes_collection.find_one({"_id": ObjectId(hero_id)})
+    if not hero:
+        hero = await pick_hero("daily", anniversary=DAILY_PREFER_ANNIVERSARY)
+        if not hero:
+            logger.warning("⚠️ No heroes found in database.")
+            return
+        await cache.set(hero_key, str(hero["_id"]), ex=RUN_TTL)
 
-    hero = choice(heroes)
     caption = build_caption(hero, 0, 1)
 
     # --- Add footer ---
@@ -53,9 +77,10 @@ async def send_daily_hero(bot: Bot):
     )
 
     # --- Get connected channels ---
-    channels = [ch async for ch in channels_collection.find()]
+    channels = [ch async for ch in channels_collection.find({}, {"channel_id": 1, "title": 1})]
     if not channels:
         logger.info("ℹ️ No connected channels yet.")
+        await cache.set(finished_key(run_id), "1", ex=RUN_TTL)
         return
 
     logger.info(
@@ -63,51 +88,94 @@ async def send_daily_hero(bot: Bot):
         f"to {len(channels)} channels."
     )
 
-    # --- Send hero to each channel ---
-    for ch in channels:
-        channel_id = ch.get("channel_id")
-        title = ch.get("title", "Unknown")
+    # --- Broadcast: one upload, then file_id reuse under rate limits ---
+    broadcast = PhotoBroadcast(bot, run_id, hero["img_url"], caption_with_footer, inline_kb)
+    await broadcast.run(channels)
+    await cache.set(finished_key(run_id), "1", ex=RUN_TTL)
+
 
+# ---------------------
+# 🔹 SCHEDULER SETUP
+# ---------------------
+async def _renew_lock(lock):
+    """Keep the lock's TTL topped up; returns only once the lock is lost."""
+    while True:
+        await asyncio.sleep(DAILY_LOCK_RENEW)
         try:
-            # ✅ Check if bot can access the channel
-            chat = await bot.get_chat(channel_id)
-
-            if not chat or chat.type != "channel":
-                raise Exception("Invalid chat type or inaccessible channel.")
-
-            # ✅ Send hero
-            await bot.send_photo(
-                chat_id=channel_id,
-                photo=hero["img_url"],
-                caption=caption_with_footer,
-                parse_mode="HTML",
-                reply_markup=inline_kb,
-            )
-            logger.info(f"✅ Sent hero to {title} ({channel_id})")
+            await lock.reacquire()
+        except LockError as e:
+            logger.error(f"❌ Daily hero lock lost: {e}")
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Daily hero lock not renewed, retrying: {e}")
 
+
+async def send_daily_hero_once(bot: Bot) -> bool:
+    """
+    Every process runs the scheduler; the Redis lock lets only one of them
+    post, and is renewed for as long as the broadcast runs. The date-keyed
+    run makes a second, later holder a no-op anyway. Returns False if
+    another process holds the lock.
+    """
+    lock = cache.lock(DAILY_LOCK_KEY, timeout=DAILY_LOCK_TIMEOUT, blocking=False)
+    if not await lock.acquire():
+        logger.info("⏭ Daily hero already being sent by another worker.")
+        return False
+    sending = asyncio.create_task(send_daily_hero(bot))
+    renewing = asyncio.create_task(_renew_lock(lock))
+    try:
+        await asyncio.wait({sending, renewing}, return_when=asyncio.FIRST_COMPLETED)
+        if sending.done():
+            sending.result()
+        else:
+            # another process may take over now; stop rather than post alongside it
+            sending.cancel()
+            await asyncio.gather(sending, return_exceptions=True)
+    finally:
+        sending.cancel()
+        renewing.cancel()
+        try:
+            await lock.release()
         except Exception as e:
-            # --- Remove invalid channels ---
-            if "chat not found" in str(e).lower() or "forbidden" in str(e).lower():
-                await channels_collection.delete_one({"channel_id": channel_id})
-                logger.warning(f"🧹 Removed invalid channel: {title} ({channel_id})")
-            else:
-                logger.error(f"❌ Failed to send to {title} ({channel_id}): {e}")
+            logger.warning(f"⚠️ Daily hero lock not released: {e}")
+    return True
+
+
+async def resume_daily_hero(bot: Bot):
+    """
+    Startup: if today's post is due but its run is not finished (a crash
+    cut it short, or nothing was running at the scheduled time), send it
+    now. Channels already in the run's done set are skipped. While a dead
+    sender's lock runs out, keep checking until the run finishes or the day ends.
+    """
+    now = datetime.now()
+    run_id = now.strftime("%Y-%m-%d")
+    if (now.hour, now.minute) < (DAILY_HOUR, DAILY_MINUTE):
+        return
+    while datetime.now().strftime("%Y-%m-%d") == run_id and not await cache.exists(finished_key(run_id)):
+        logger.info(f"🔁 Daily hero for {run_id} not finished, resuming.")
+        if await send_daily_hero_once(bot):
+            return
+        await asyncio.sleep(DAILY_LOCK_RENEW)
 
 
-# ---------------------
-# 🔹 SCHEDULER SETUP
-# ---------------------
 def setup_daily_scheduler(bot: Bot):
     """
-    Create and start APScheduler for daily hero posting.
-    Runs once every day at a fixed hour.
+    Create and start APScheduler for daily hero posting: every day at
+    DAILY_HOUR:DAILY_MINUTE, plus a resume of today's run right away.
     """
     scheduler.add_job(
-        send_daily_hero,
+        send_daily_hero_once,
         trigger="cron",
-        hour=10,  # ⏰ change time here (server time)
-        minute=0,
+        hour=DAILY_HOUR,
+        minute=DAILY_MINUTE,
         args=[bot],
     )
+    scheduler.add_job(resume_daily_hero, args=[bot])
     scheduler.start()
-    logger.info("🕒 Daily hero scheduler started — runs every day at 10:00.")
+    logger.info(f"🕒 Daily hero scheduler started — runs every day at {DAILY_HOUR:02d}:{DAILY_MINUTE:02d}.")
+
+
+def stop_daily_scheduler():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from loguru import logger
+from app.db.redis_db import cache
+from app.db.mongo import channels_collection
+from app.config.settings import (
+    BROADCAST_CONCURRENCY,
+    BROADCAST_GLOBAL_RATE,
+    BROADCAST_CHAT_INTERVAL,
+)
+
+RUN_TTL = 2 * 24 * 3600
+MAX_RETRIES = 3
+
+
+# ---------------------
+# 🔹 RATE LIMITING
+# ---------------------
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatLanes:
+    """Per-chat pacing; a RetryAfter pauses only the chat that got it."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = {}
+
+    async def wait(self, chat_id):
+        delay = self._next.get(chat_id, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next[chat_id] = time.monotonic() + self.interval
+
+    def pause(self, chat_id, seconds: float):
+        self._next[chat_id] = time.monotonic() + seconds
+
+
+# ---------------------
+# 🔹 BROADCAST
+# ---------------------
+def _is_gone(e: Exception) -> bool:
+    text = str(e).lower()
+    return isinstance(e, TelegramForbiddenError) or "chat not found" in text or "forbidden" in text
+
+
+class PhotoBroadcast:
+    """
+    Send one photo post to many channels:
+    upload once and reuse the file_id, bounded concurrency under a global
+    token bucket and per-chat lanes, progress saved in Redis so a crashed
+    run resumes without double-posting.
+    """
+
+    def __init__(self, bot: Bot, run_id: str, photo, caption: str, reply_markup=None):
+        self.bot = bot
+        self.run_id = run_id
+        self.photo = photo
+        self.caption = caption
+        self.reply_markup = reply_markup
+        self.bucket = TokenBucket(BROADCAST_GLOBAL_RATE)
+        self.lanes = ChatLanes(BROADCAST_CHAT_INTERVAL)
+        self.stats = {"sent": 0, "skipped": 0, "removed": 0, "failed": 0}
+
+    @property
+    def _done_key(self):
+        return f"broadcast:{self.run_id}:done"
+
+    @property
+    def _file_id_key(self):
+        return f"broadcast:{self.run_id}:file_id"
+
+    async def _send(self, channel_id):
+        """Send to one channel, waiting out flood limits on its own lane only."""
+        for _ in range(MAX_RETRIES):
+            await self.lanes.wait(channel_id)
+            await self.bucket.acquire()
+            try:
+                return await self.bot.send_photo(
+                    chat_id=channel_id,
+                    photo=self.photo,
+                    caption=self.caption,
+                    parse_mode="HTML",
+                    reply_markup=self.reply_markup,
+                )
+            except TelegramRetryAfter as e:
+                logger.warning(f"⏳ Flood wait {e.retry_after}s for {channel_id}")
+                self.lanes.pause(channel_id, e.retry_after)
+        raise RuntimeError(f"gave up after {MAX_RETRIES} flood waits")
+
+    async def _deliver(self, channel: dict):
+        channel_id = channel.get("channel_id")
+        title = channel.get("title", "Unknown")
+        try:
+            sent = await self._send(channel_id)
+        except (TelegramForbiddenError, TelegramBadRequest, RuntimeError) as e:
+            if _is_gone(e):
+                await channels_collection.delete_one({"channel_id": channel_id})
+                self.stats["removed"] += 1
+                logger.warning(f"🧹 Removed invalid channel: {title} ({channel_id})")
+            else:
+                self.stats["failed"] += 1
+                logger.error(f"❌ Failed to send to {title} ({channel_id}): {e}")
+            return None
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"❌ Failed to send to {title} ({channel_id}): {e}")
+            return None
+
+        async with cache.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._done_key, str(channel_id))
+            pipe.expire(self._done_key, RUN_TTL)
+            await pipe.execute()
+        self.stats["sent"] += 1
+        logger.info(f"✅ Sent hero to {title} ({channel_id})")
+        return sent
+
+    async def _adopt_file_id(self, sent):
+        if isinstance(sent, types.Message) and sent.photo:
+            self.photo = sent.photo[-1].file_id
+            await cache.set(self._file_id_key, self.photo, ex=RUN_TTL)
+
+    async def run(self, channels: list[dict]) -> dict:
+        async with cache.pipeline(transaction=False) as pipe:
+            pipe.smembers(self._done_key)
+            pipe.get(self._file_id_key)
+            done, file_id = await pipe.execute()
+
+        if file_id:
+            self.photo = file_id
+        pending = [ch for ch in channels if str(ch.get("channel_id")) not in done]
+        self.stats["skipped"] = len(channels) - len(pending)
+
+        # Upload once: send serially until one channel accepts, then reuse its file_id
+        while pending and not file_id:
+            sent = await self._deliver(pending.pop(0))
+            if sent is not None:
+                await self._adopt_file_id(sent)
+                break
+
+        slots = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+        async def worker(channel):
+            async with slots:
+                await self._deliver(channel)
+
+        await asyncio.gather(*(worker(ch) for ch in pending))
+        logger.info(f"📢 Broadcast {self.run_id} finished: {self.stats}")
+        return self.stats
@@ -0,0 +1,154 @@
+"""
+"All heroes" browse order: a dense ordinal on every hero (heroes.ord, unique
+index), assigned in _id order, plus the total kept in Redis (heroes:meta)
+and in process memory. Ordinals only move when heroes are deleted: the next
+rebuild shifts the ones after a hole down to close it.
+
+    python -m app.utils.browse --backfill    # number heroes that have no ordinal yet
+    python -m app.utils.browse --renumber    # close gaps left by deletions now
+
+A page is then one find_one({"ord": i}) on the index, whatever the collection size.
+"""
+import asyncio
+import json
+import sys
+from loguru import logger
+from pymongo import UpdateOne
+from app.db.mongo import heroes_collection
+from app.db.redis_db import cache
+from app.utils.cache import get_heroes_version
+from app.config.settings import SEARCH_INDEX_REFRESH, INGEST_BATCH
+
+ORD_FIELD = "ord"
+META_KEY = "heroes:meta"
+ORDINALS_LOCK = "lock:hero_ordinals"
+
+
+# ---------------------
+# 🔹 HERO BROWSER
+# ---------------------
+class HeroBrowser:
+    """Total and positional lookups of the browse order."""
+
+    def __init__(self):
+        self.total = 0
+        self._version = None
+
+    @property
+    def version(self):
+        """heroes:version the ordinals and total were built from."""
+        return self._version
+
+    async def hero_at(self, index: int):
+        return await heroes_collection.find_one({ORD_FIELD: index})
+
+    async def position_of(self, hero: dict) -> int:
+        """Browse index of a hero; one not numbered yet is placed by its _id."""
+        if hero.get(ORD_FIELD) is not None:
+            return hero[ORD_FIELD]
+        return await heroes_collection.count_documents({"_id": {"$lt": hero["_id"]}})
+
+    async def last_ordinal(self) -> int:
+        """Highest ordinal in use, -1 if none."""
+        last = await heroes_collection.find_one(
+            {ORD_FIELD: {"$exists": True}}, {ORD_FIELD: 1}, sort=[(ORD_FIELD, -1)]
+        )
+        return last[ORD_FIELD] if last else -1
+
+    async def assign_ordinals(self, batch_size: int = INGEST_BATCH) -> int:
+        """Number heroes without an ordinal, continuing after the highest one."""
+        next_ord = await self.last_ordinal() + 1
+        assigned, batch = 0, []
+        async for hero in heroes_collection.find({ORD_FIELD: {"$exists": False}}, {"_id": 1}).sort("_id", 1):
+            batch.append(UpdateOne({"_id": hero["_id"], ORD_FIELD: {"$exists": False}}, {"$set": {ORD_FIELD: next_ord}}))
+            next_ord += 1
+            if len(batch) >= batch_size:
+                await heroes_collection.bulk_write(batch, ordered=False)
+                assigned += len(batch)
+                batch = []
+        if batch:
+            await heroes_collection.bulk_write(batch, ordered=False)
+            assigned += len(batch)
+        return assigned
+
+    async def close_gaps(self, batch_size: int = INGEST_BATCH) -> int:
+        """Shift ordinals down over the holes deleted heroes left; returns how many heroes moved."""
+        moved, batch, expected = 0, [], 0
+        async for hero in heroes_collection.find({ORD_FIELD: {"$exists": True}}, {ORD_FIELD: 1}).sort(ORD_FIELD, 1):
+            if hero[ORD_FIELD] != expected:
+                batch.append(UpdateOne({"_id": hero["_id"]}, {"$set": {ORD_FIELD: expected}}))
+            expected += 1
+            if len(batch) >= batch_size:
+                # ordered: every lower ordinal is settled, so each target is free when its update runs
+                await heroes_collection.bulk_write(batch, ordered=True)
+                moved += len(batch)
+                batch = []
+        if batch:
+            await heroes_collection.bulk_write(batch, ordered=True)
+            moved += len(batch)
+        return moved
+
+    async def rebuild(self):
+        """Number new heroes, close gaps (one replica at a time) and publish the total."""
+        version = await get_heroes_version()
+        moved = 0
+        async with cache.lock(ORDINALS_LOCK, timeout=600, blocking_timeout=600):
+            assigned = await self.assign_ordinals()
+            total = await self.last_ordinal() + 1
+            if await heroes_collection.count_documents({}) < total:
+                moved = await self.close_gaps()
+                total = await self.last_ordinal() + 1
+        data = {"version": version, "total": total}
+        await cache.set(META_KEY, json.dumps(data))
+        self._install(data)
+        logger.info(f"🏅 Browse order: {total} heroes ({assigned} newly numbered, {moved} moved into gaps)")
+
+    def _install(self, data: dict):
+        self.total = data["total"]
+        self._version = data["version"]
+
+    async def load(self):
+        """Use the shared metadata if it is current, else rebuild it."""
+        version = await get_heroes_version()
+        raw = await cache.get(META_KEY)
+        if raw:
+            data = json.loads(raw)
+            if data.get("version") == version:
+                self._install(data)
+                return
+        await self.rebuild()
+
+    async def refresh_if_changed(self):
+        if await get_heroes_version() != self._version:
+            await self.load()
+        elif await heroes_collection.estimated_document_count() != self.total:
+            # heroes deleted or added outside app.ingest: close the gaps / number the new ones
+            await self.rebuild()
+
+    async def run_refresh_loop(self, interval: int = SEARCH_INDEX_REFRESH):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.warning(f"⚠️ Browse order refresh failed: {e}")
+
+    async def renumber(self):
+        """Close gaps now; open "all heroes" messages past a deletion shift by a page."""
+        async with cache.lock(ORDINALS_LOCK, timeout=600, blocking_timeout=600):
+            await self.close_gaps()
+        await cache.delete(META_KEY)
+        await self.rebuild()
+
+
+hero_browser = HeroBrowser()
+
+
+if __name__ == "__main__":
+    if "--renumber" in sys.argv:
+        asyncio.run(hero_browser.renumber())
+    elif "--backfill" in sys.argv:
+        asyncio.run(hero_browser.rebuild())
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -1,7 +1,26 @@
 from app.db.redis_db import cache
+from app.utils.stats import add_search, USERS_KEY
+from app.utils import leaderboard
+from app.utils.leaderboard import user_label
 import json
+from datetime import datetime
+from typing import TypedDict
 from bson import ObjectId
 
+HERO_TTL = 3600
+HISTORY_LEN = 10
+# bumped whenever heroes_collection content changes (see app/ingest.py)
+HEROES_VERSION_KEY = "heroes:version"
+
+
+class ProfileData(TypedDict):
+    user: dict
+    history: list[str]
+    total_users: int
+    total_searches: int
+    unique_heroes: int
+    last_search: str | None
+
 
 def bson_to_json(data):
     """Recursively convert MongoDB BSON types (ObjectId, etc.) to JSON-serializable types."""
@@ -14,16 +33,80 @@ def bson_to_json(data):
     return data
 
 
-def get_cached_hero(name: str):
+# ---------------------
+# 🔹 HERO / RESULT LISTS
+# ---------------------
+async def get_cached_hero(name: str):
     """Retrieve hero data from Redis by name."""
-    cached = cache.get(f"hero:{name}")
+    cached = await cache.get(f"hero:{name}")
     return json.loads(cached) if cached else None
 
 
-def set_cached_hero(name: str, hero: dict):
+async def set_cached_hero(name: str, hero) -> None:
     """Store hero data in Redis cache for 1 hour."""
     try:
         hero_json = json.dumps(bson_to_json(hero), ensure_ascii=False)
-        cache.setex(f"hero:{name}", 3600, hero_json)
+        await cache.setex(f"hero:{name}", HERO_TTL, hero_json)
     except Exception as e:
         print(f"❌ Redis cache error for hero {name}: {e}")
+
+
+async def get_heroes_version() -> str:
+    return await cache.get(HEROES_VERSION_KEY) or "0"
+
+
+async def bump_heroes_version() -> int:
+    return await cache.incr(HEROES_VERSION_KEY)
+
+
+# ---------------------
+# 🔹 USERS / SEARCH STATS
+# ---------------------
+async def remember_user(user_id: str, profile: dict) -> None:
+    """Save the user's profile hash and register them, in one round trip."""
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.hset(f"user:{user_id}", mapping=profile)
+        pipe.sadd(USERS_KEY, user_id)
+        await pipe.execute()
+
+
+def queue_search(pipe, user_id: str, query: str, hero_key: str, searched_at: datetime,
+                 hero: dict = None, user=None) -> None:
+    """Queue history push/trim, counters, stats series and leaderboards for one search onto a pipeline."""
+    history_key = f"history:{user_id}"
+    hero_id = str(hero["_id"]) if hero else None
+    hero_name = f"{hero['name']['first']} {hero['name']['last']}" if hero else None
+    pipe.lpush(history_key, query)
+    pipe.ltrim(history_key, 0, HISTORY_LEN - 1)
+    pipe.sadd("stats:heroes", hero_key)
+    pipe.set("stats:last_search_time", searched_at.isoformat())
+    add_search(pipe, user_id, searched_at, query, username=user.username if user else None)
+    leaderboard.add_search(
+        pipe, searched_at, user_id, user_label(user) if user else None,
+        hero_id=hero_id, hero_name=hero_name, war=hero.get("war") if hero else None,
+    )
+
+
+async def get_profile_data(user_id: str) -> ProfileData:
+    """User hash, recent history and global counters for the profile screen, in one round trip."""
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.hgetall(f"user:{user_id}")
+        pipe.lrange(f"history:{user_id}", 0, HISTORY_LEN - 1)
+        pipe.scard(USERS_KEY)
+        pipe.get("stats:searches:total")
+        pipe.scard("stats:heroes")
+        pipe.get("stats:last_search_time")
+        user, history, total_users, total_searches, unique_heroes, last_search = await pipe.execute()
+
+    return {
+        "user": user or {},
+        "history": history or [],
+        "total_users": total_users or 0,
+        "total_searches": int(total_searches or 0),
+        "unique_heroes": unique_heroes or 0,
+        "last_search": last_search,
+    }
+
+
+async def clear_user_history(user_id: str) -> None:
+    await cache.delete(f"history:{user_id}")
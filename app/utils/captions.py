@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import html
+import re
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.db.mongo import heroes_collection
+
+MAX_CAPTION_LEN = 1024
+INLINE_BIO_LEN = 350
+# room kept free for the "\n\n<i>index/total</i>" footer added at render time
+FOOTER_RESERVE = len("\n\n<i>999999/999999</i>")
+MEMO_SIZE = 4096
+# Bump when the caption layout changes, so backfill_captions re-renders stored captions
+CAPTION_VERSION = "2"
+
+_memo = OrderedDict()
+
+
+# ---------------------
+# 🔹 TEXT UTILITIES
+# ---------------------
+def sanitize_html(text: str) -> str:
+    """Remove all HTML tags and leave plain readable text."""
+    if not text:
+        return ""
+    text = re.sub(r"<[^>]+>", "", text)
+    text = html.unescape(text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def remove_duplicate_sentences(text: str) -> str:
+    """Remove repeating sentences often duplicated in Zinapah."""
+    sentences = re.split(r"[։\.]", text)
+    sentences = [s.strip() for s in sentences if s.strip()]
+    unique, seen = [], set()
+    for s in sentences:
+        if s not in seen:
+            seen.add(s)
+            unique.append(s)
+    return "։ ".join(unique).strip() + "։"
+
+
+def format_bio_text(bio: str) -> str:
+    """Format biography text in patriotic Armenian tone."""
+    bio = sanitize_html(bio)
+    bio = re.sub(r"(?<=\D)(?=\d)", " ", bio)  # insert missing spaces before digits
+    bio = re.sub(r"\s{2,}", " ", bio)
+    bio = remove_duplicate_sentences(bio)
+    paragraphs = re.split(r"[։\.]", bio)
+    paragraphs = [p.strip() for p in paragraphs if p.strip()]
+    formatted = [f"«{p}։»" for p in paragraphs]
+    return "\n\n".join(formatted[:10])
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    cutoff = text[:limit - 3]
+    cutoff = re.sub(r"<[^>]*$", "", cutoff)
+    cutoff = re.sub(r"\s+\S*$", "", cutoff)  # don't end on half a word
+    return cutoff.strip() + "..."
+
+
+# ---------------------
+# 🔹 PRECOMPUTED CAPTION FIELDS
+# ---------------------
+def content_hash(hero: dict) -> str:
+    """Hash of every hero field the caption depends on."""
+    name = hero.get("name") or {}
+    date = hero.get("date") or {}
+    parts = (
+        CAPTION_VERSION,
+        name.get("first", ""), name.get("last", ""),
+        date.get("birth", ""), date.get("dead", ""),
+        hero.get("region", ""), hero.get("war", ""), hero.get("bio", ""),
+    )
+    return hashlib.sha1("\x1f".join(parts).encode()).hexdigest()
+
+
+def render_caption(hero: dict) -> dict:
+    """All the regex work for one hero's captions."""
+    name = f"{hero['name']['first']} {hero['name']['last']}"
+    date = hero.get("date") or {}
+    region = hero.get("region", "")
+    war = hero.get("war", "")
+    bio = format_bio_text(hero.get("bio", ""))
+
+    body = (
+        f"֍ ՀԱՎԵՐԺ ՓԱՌՔ ֍\n"
+        f"🇦🇲 <b>{name}</b>\n"
+        f"📅 {date.get('birth', '')} - {date.get('dead', '')}\n"
+        f"📍 {region}\n"
+        f"⚔️ {war}\n\n"
+        f"🕯️ {bio}"
+    )
+
+    plain_bio = sanitize_html(hero.get("bio", ""))
+    bio_short = plain_bio[:INLINE_BIO_LEN] + "..." if len(plain_bio) > INLINE_BIO_LEN else plain_bio
+    inline = (
+        f"֍ ՀԱՎԵՐԺ ՓԱՌՔ ֍\n"
+        f"🇦🇲 <b>{name}</b>\n"
+        f"⚔️ {war}\n"
+        f"📍 {region}\n\n"
+        f"🕯️ {bio_short}"
+    )
+
+    return {
+        "name": name,
+        "bio": bio,
+        "body": _truncate(body, MAX_CAPTION_LEN - FOOTER_RESERVE),
+        "inline": inline,
+    }
+
+
+def prepare_caption(hero: dict, digest: str = None) -> dict:
+    """Captions plus the content hash they were made from; stored as hero["caption"] by app.ingest."""
+    return {"hash": digest or content_hash(hero), **render_caption(hero)}
+
+
+def caption_fields(hero: dict) -> dict:
+    """
+    Caption fields for a hero: the copy stored at ingest, else (a document
+    not re-ingested since captions were stored) rendered in memory and
+    memoized by _id. Never writes; run backfill_captions to store the rest.
+    """
+    stored = hero.get("caption")
+    if stored:
+        return stored
+
+    if hero.get("_id") is None:
+        return render_caption(hero)
+    key = str(hero["_id"])
+    fields = _memo.get(key)
+    if fields is not None:
+        _memo.move_to_end(key)
+        return fields
+
+    fields = render_caption(hero)
+    _memo[key] = fields
+    if len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+    return fields
+
+
+# ---------------------
+# 🔹 RENDER-TIME HELPERS
+# ---------------------
+def build_caption(hero, index, total):
+    """Precomputed body + the only per-view part, the index/total footer."""
+    return f"{caption_fields(hero)['body']}\n\n<i>{index + 1}/{total}</i>"
+
+
+def make_caption(hero):
+    """Short caption used for inline results."""
+    return caption_fields(hero)["inline"]
+
+
+# ---------------------
+# 🔹 BACKFILL
+# ---------------------
+async def backfill_captions(batch_size: int = 500):
+    """Precompute and store captions for every hero whose stored copy is missing or stale."""
+    from pymongo import UpdateOne
+
+    started = time.perf_counter()
+    seen, updates, written = 0, [], 0
+    async for hero in heroes_collection.find({}, {"name": 1, "date": 1, "region": 1, "war": 1, "bio": 1, "caption.hash": 1}):
+        seen += 1
+        digest = content_hash(hero)
+        if (hero.get("caption") or {}).get("hash") == digest:
+            continue
+        updates.append(UpdateOne({"_id": hero["_id"]}, {"$set": {"caption": prepare_caption(hero, digest)}}))
+        if len(updates) >= batch_size:
+            await heroes_collection.bulk_write(updates, ordered=False)
+            written += len(updates)
+            updates = []
+    if updates:
+        await heroes_collection.bulk_write(updates, ordered=False)
+        written += len(updates)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"🕯️ Captions: {seen} heroes checked, {written} rebuilt in {elapsed:.1f}s")
+    return seen, written
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_captions())
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+import time
+from aiogram import types
+from loguru import logger
+from app.db.redis_db import cache
+from app.config.settings import (
+    RENDER_CACHE_DIR,
+    RENDER_CACHE_MAX_MB,
+    RENDER_CACHE_EVICT_EVERY,
+    RENDER_CACHE_EVICT_SECONDS,
+    PREFETCH_MAX_IMAGE_LOAD,
+)
+from app.utils.util import compose_hero_image, compose_pending, TEMP_PATH
+from app.utils.metrics import registry, CallbackCounter
+
+# Bump when the composition changes, so old renders and file_ids are not reused
+RENDER_VERSION = "2"
+FILE_ID_KEY = "render:file_id"
+STATS_KEY = "stats:render"
+STALE_TEMP_SECONDS = 3600
+
+# Process-local counters (Redis STATS_KEY keeps the totals across replicas)
+render_stats = {"file_id": 0, "disk": 0, "miss": 0}
+registry.add(CallbackCounter("render_cache_lookups_total", "Hero photo lookups by tier", "tier", lambda: render_stats))
+# tier counts not yet in STATS_KEY; they ride along with the next file_id lookup
+_unsaved_stats = {}
+
+
+def render_key(img_url: str) -> str:
+    """Content address of one composed hero image."""
+    return hashlib.sha1(f"{RENDER_VERSION}:{img_url}".encode()).hexdigest()
+
+
+def render_path(key: str) -> str:
+    return os.path.join(RENDER_CACHE_DIR, f"{key}.png")
+
+
+def _count(kind: str):
+    render_stats[kind] += 1
+    _unsaved_stats[kind] = _unsaved_stats.get(kind, 0) + 1
+
+
+def _touch(path: str) -> bool:
+    """Mark a render as recently used (for eviction); False if it is not on disk."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# ---------------------
+# 🔹 LOOKUP / RENDER
+# ---------------------
+def queue_file_id(pipe, img_url: str) -> int:
+    """Queue the file_id lookup of img_url (and the unsaved tier counts) onto a pipeline; returns its reply index."""
+    at = len(pipe)
+    pipe.hget(FILE_ID_KEY, render_key(img_url))
+    for kind, n in _unsaved_stats.items():
+        pipe.hincrby(STATS_KEY, kind, n)
+    _unsaved_stats.clear()
+    return at
+
+
+async def get_hero_photo(img_url: str):
+    """
+    Return the cheapest photo for a hero, in order:
+    Telegram file_id → cached render on disk → fresh render → raw img_url.
+    """
+    if not img_url:
+        return img_url
+
+    try:
+        async with cache.pipeline(transaction=False) as pipe:
+            at = queue_file_id(pipe, img_url)
+            file_id = (await pipe.execute())[at]
+    except Exception as e:
+        logger.warning(f"⚠️ file_id lookup failed: {e}")
+        file_id = None
+    return await resolve_hero_photo(img_url, file_id)
+
+
+async def resolve_hero_photo(img_url: str, file_id: str = None):
+    """get_hero_photo once the file_id lookup (queued with queue_file_id) has come back."""
+    if not img_url:
+        return img_url
+    if file_id:
+        _count("file_id")
+        return file_id
+
+    key = render_key(img_url)
+    path = render_path(key)
+    if await asyncio.to_thread(_touch, path):
+        _count("disk")
+        return types.FSInputFile(path)
+
+    _count("miss")
+    result = await compose_hero_image(img_url, out_path=path)
+    if result == path:
+        schedule_eviction()
+    if result == img_url:
+        return img_url
+    return types.FSInputFile(result)
+
+
+async def warm_hero_photo(img_url: str) -> str:
+    """
+    Make sure a later get_hero_photo() is a file_id or disk hit, without
+    counting as a lookup. Renders only while the image pipeline is nearly
+    idle. Returns "cached", "rendered" or "skipped".
+    """
+    if not img_url:
+        return "skipped"
+    key = render_key(img_url)
+    path = render_path(key)
+    if await asyncio.to_thread(os.path.exists, path) or await cache.hexists(FILE_ID_KEY, key):
+        return "cached"
+    if compose_pending() >= PREFETCH_MAX_IMAGE_LOAD:
+        return "skipped"
+    if await compose_hero_image(img_url, out_path=path) != path:
+        return "skipped"
+    schedule_eviction()
+    return "rendered"
+
+
+async def remember_file_id(img_url: str, sent, sent_with):
+    """Store the file_id Telegram assigned to a composed render (`sent_with` is what was sent)."""
+    if not img_url or not isinstance(sent, types.Message) or not sent.photo:
+        return
+    if not isinstance(sent_with, types.FSInputFile):
+        return  # a stored file_id or the raw img_url fallback: nothing to remember
+    try:
+        await cache.hset(FILE_ID_KEY, render_key(img_url), sent.photo[-1].file_id)
+    except Exception as e:
+        logger.warning(f"⚠️ file_id not saved: {e}")
+
+
+async def forget_file_id(img_url: str, sent_with):
+    """Drop a stored file_id Telegram rejected (`sent_with` is what was sent); the disk render stays."""
+    if not img_url or not isinstance(sent_with, str) or sent_with == img_url:
+        return  # not sent by a stored file_id
+    try:
+        await cache.hdel(FILE_ID_KEY, render_key(img_url))
+    except Exception as e:
+        logger.warning(f"⚠️ file_id not dropped: {e}")
+
+
+async def forget_hero_photo(img_url: str):
+    """Drop the file_id and disk render of one hero (e.g. after its image changed)."""
+    key = render_key(img_url)
+    await cache.hdel(FILE_ID_KEY, key)
+    path = render_path(key)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# ---------------------
+# 🔹 DISK EVICTION
+# ---------------------
+_eviction = {"renders": 0, "at": time.monotonic(), "task": None}
+
+
+def schedule_eviction():
+    """
+    Count a new render; every RENDER_CACHE_EVICT_EVERY renders or
+    RENDER_CACHE_EVICT_SECONDS, run evict_disk_cache in a thread (one at a time).
+    """
+    _eviction["renders"] += 1
+    running = _eviction["task"]
+    if running is not None and not running.done():
+        return
+    if _eviction["renders"] < RENDER_CACHE_EVICT_EVERY and time.monotonic() - _eviction["at"] < RENDER_CACHE_EVICT_SECONDS:
+        return
+    _eviction.update(renders=0, at=time.monotonic())
+    task = asyncio.create_task(asyncio.to_thread(evict_disk_cache))
+    task.add_done_callback(_eviction_done)
+    _eviction["task"] = task
+
+
+def _eviction_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"⚠️ Render cache eviction failed: {task.exception()}")
+
+
+def evict_disk_cache(max_bytes: int = RENDER_CACHE_MAX_MB * 1024 * 1024):
+    """Least-recently-used eviction of the render directory, plus stale one-off temp files."""
+    now = time.time()
+    if os.path.isdir(TEMP_PATH):
+        for entry in os.scandir(TEMP_PATH):
+            if entry.is_file() and entry.name.startswith("hero_") and now - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+                os.remove(entry.path)
+
+    if not os.path.isdir(RENDER_CACHE_DIR):
+        return
+    files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(RENDER_CACHE_DIR) if e.is_file()]
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return
+
+    files.sort()
+    removed = 0
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    logger.info(f"🧹 Render cache evicted {removed} files")
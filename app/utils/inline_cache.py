@@ -0,0 +1,217 @@
+import json
+import time
+from collections import OrderedDict
+from aiogram import types
+from loguru import logger
+from app.db.mongo import heroes_collection
+from app.db.redis_db import cache
+from app.utils.captions import make_caption
+from app.utils.search_index import search_index, query_key
+from app.utils.metrics import registry, CallbackCounter
+from app.config.settings import (
+    INLINE_QUERY_CACHE,
+    INLINE_RESULT_CACHE,
+    INLINE_RESULT_TTL,
+    INLINE_STATS_FLUSH,
+    SEARCH_MAX_RESULTS,
+)
+
+INLINE_PAGE = 50   # Telegram's limit per answerInlineQuery
+STATS_KEY = "stats:inline"
+DEFAULT_THUMB = "https://upload.wikimedia.org/wikipedia/commons/2/2f/Flag_of_Armenia.svg"
+
+# Process-local counters (Redis STATS_KEY keeps the totals across replicas)
+inline_stats = {
+    "query_exact": 0, "query_prefix": 0, "query_miss": 0,
+    "result_memory": 0, "result_redis": 0, "result_built": 0,
+}
+registry.add(CallbackCounter("inline_cache_lookups_total", "Inline query/result lookups by tier", "tier", lambda: inline_stats))
+
+
+def results_key(version) -> str:
+    """Serialized results of one catalogue version: hash hero_id -> JSON."""
+    return f"inline:results:{version or 0}"
+
+
+def build_result(hero) -> types.InlineQueryResultArticle:
+    return types.InlineQueryResultArticle(
+        id=str(hero["_id"]),
+        title=f"{hero['name']['first']} {hero['name']['last']}",
+        description=hero.get("war", "Հայ հերոս"),
+        thumbnail_url=hero.get("img_url") or DEFAULT_THUMB,
+        input_message_content=types.InputTextMessageContent(
+            message_text=make_caption(hero),
+            parse_mode="HTML",
+        ),
+        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text="🏛️ Դիտել թանգարանում", url=f"https://t.me/erablurbot?start={hero['_id']}")]
+        ]),
+    )
+
+
+# ---------------------
+# 🔹 INLINE CACHE
+# ---------------------
+class InlineCache:
+    """
+    Two layers, both independent of who is asking:
+    query key -> strict and ranked index positions (LRU, per process; a query
+    missing here is filtered from the strict matches of its longest cached
+    prefix, then ranked), and
+    hero -> serialized InlineQueryResultArticle (LRU in front of a Redis hash).
+    Everything is dropped when the search index is rebuilt. Lookup counts
+    ride along with the next Redis lookup, or are written on their own at
+    most every INLINE_STATS_FLUSH seconds.
+    """
+
+    def __init__(self, max_queries: int = INLINE_QUERY_CACHE, max_results: int = INLINE_RESULT_CACHE):
+        self.max_queries = max_queries
+        self.max_results = max_results
+        self._queries = OrderedDict()
+        self._results = OrderedDict()
+        self._generation = None
+        self._unsaved = {}   # counts not yet added to STATS_KEY
+        self._saved_at = time.monotonic()
+
+    def _check_generation(self):
+        if self._generation != search_index.generation:
+            self._queries.clear()
+            self._results.clear()
+            self._generation = search_index.generation
+
+    @staticmethod
+    def _remember(lru: OrderedDict, key, value, limit: int):
+        lru[key] = value
+        lru.move_to_end(key)
+        while len(lru) > limit:
+            lru.popitem(last=False)
+
+    def _prefix_hit(self, q: str):
+        for end in range(len(q) - 1, 0, -1):
+            prefix = q[:end]
+            if prefix[-1] != " " and prefix in self._queries:
+                return self._queries[prefix][0]
+        return None
+
+    def resolve(self, text: str, counts: dict):
+        """Index positions of every hero matching the query, best first."""
+        self._check_generation()
+        q = query_key(text)
+        entry = self._queries.get(q)
+        if entry is not None:
+            self._queries.move_to_end(q)
+            counts["query_exact"] = 1
+            return entry[1]
+
+        within = self._prefix_hit(q)
+        counts["query_prefix" if within is not None else "query_miss"] = 1
+        strict = search_index.positions(q, within=within)
+        ranked = search_index.rank(q, strict=strict, limit=SEARCH_MAX_RESULTS)
+        self._remember(self._queries, q, (strict, ranked), self.max_queries)
+        return ranked
+
+    async def results(self, ids: list, counts: dict) -> list:
+        """Results for hero ids, in order: process LRU → Redis → built from Mongo."""
+        self._check_generation()
+        found, missing = {}, []
+        for hero_id in ids:
+            result = self._results.get(hero_id)
+            if result is not None:
+                self._results.move_to_end(hero_id)
+                found[hero_id] = result
+            else:
+                missing.append(hero_id)
+        counts["result_memory"] = len(found)
+
+        key = results_key(search_index.version)
+        if missing:
+            try:
+                async with cache.pipeline(transaction=False) as pipe:
+                    pipe.hmget(key, [str(i) for i in missing])
+                    self._queue_counts(pipe)
+                    raw = (await pipe.execute())[0]
+            except Exception as e:
+                logger.warning(f"⚠️ Inline results lookup failed: {e}")
+                raw = [None] * len(missing)
+            still_missing = []
+            for hero_id, data in zip(missing, raw):
+                if data:
+                    found[hero_id] = types.InlineQueryResultArticle.model_validate(json.loads(data))
+                else:
+                    still_missing.append(hero_id)
+            counts["result_redis"] = len(missing) - len(still_missing)
+            missing = still_missing
+
+        if missing:
+            built = {}
+            async for hero in heroes_collection.find({"_id": {"$in": missing}}):
+                built[hero["_id"]] = found[hero["_id"]] = build_result(hero)
+            counts["result_built"] = len(built)
+            if built:
+                try:
+                    async with cache.pipeline(transaction=False) as pipe:
+                        pipe.hset(key, mapping={
+                            str(i): json.dumps(r.model_dump(mode="json", exclude_unset=True), ensure_ascii=False)
+                            for i, r in built.items()
+                        })
+                        pipe.expire(key, INLINE_RESULT_TTL)
+                        await pipe.execute()
+                except Exception as e:
+                    logger.warning(f"⚠️ Inline results not cached: {e}")
+
+        for hero_id, result in found.items():
+            self._remember(self._results, hero_id, result, self.max_results)
+        return [found[i] for i in ids if i in found]
+
+    async def page(self, text: str, offset: int = 0, size: int = INLINE_PAGE):
+        """(results, next_offset) for one inline answer."""
+        counts = {}
+        positions = self.resolve(text, counts)
+        ids = search_index.ids_at(positions[offset:offset + size])
+        results = await self.results(ids, counts)
+        self._count(counts)
+        if self._unsaved and time.monotonic() - self._saved_at >= INLINE_STATS_FLUSH:
+            await self.save_counts()
+        next_offset = str(offset + size) if offset + size < len(positions) else ""
+        return results, next_offset
+
+    def _count(self, counts: dict):
+        for kind, n in counts.items():
+            if n:
+                inline_stats[kind] += n
+                self._unsaved[kind] = self._unsaved.get(kind, 0) + n
+
+    def _queue_counts(self, pipe):
+        """Queue the unsaved counts onto a pipeline that is about to run anyway."""
+        for kind, n in self._unsaved.items():
+            pipe.hincrby(STATS_KEY, kind, n)
+        self._unsaved = {}
+        self._saved_at = time.monotonic()
+
+    async def save_counts(self):
+        if not self._unsaved:
+            return
+        try:
+            async with cache.pipeline(transaction=False) as pipe:
+                self._queue_counts(pipe)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Inline stats not saved: {e}")
+
+
+async def hit_rates() -> dict:
+    """Query-level and result-level hit rates (0..1) across all replicas."""
+    await inline_cache.save_counts()
+    totals = {k: int(v) for k, v in (await cache.hgetall(STATS_KEY)).items()}
+    queries = sum(totals.get(k, 0) for k in ("query_exact", "query_prefix", "query_miss"))
+    results = sum(totals.get(k, 0) for k in ("result_memory", "result_redis", "result_built"))
+    return {
+        "queries": queries,
+        "query_exact": totals.get("query_exact", 0) / queries if queries else 0.0,
+        "query_prefix": totals.get("query_prefix", 0) / queries if queries else 0.0,
+        "results": results,
+        "result_cached": (results - totals.get("result_built", 0)) / results if results else 0.0,
+    }
+
+
+inline_cache = InlineCache()
@@ -0,0 +1,178 @@
+"""
+Leaderboards of users, heroes and wars in Redis sorted sets.
+
+    python -m app.utils.leaderboard --rebuild    # rebuild every board from Mongo
+
+Keys: lb:<board>:all, lb:<board>:week:<YYYY-Www>, lb:<board>:day:<YYYY-MM-DD>
+(board = users | heroes | wars) and lb:names:<board> for display names.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from loguru import logger
+from app.db.mongo import users_collection, history_collection, heroes_collection
+from app.db.redis_db import cache
+
+BOARDS = ("users", "heroes", "wars")
+WINDOWS = ("all", "week", "day")
+DAY_TTL = 3 * 24 * 3600
+WEEK_TTL = 15 * 24 * 3600
+REBUILD_CHUNK = 10000
+
+
+# ---------------------
+# 🔹 KEYS
+# ---------------------
+def _window_suffix(window: str, at: datetime) -> str:
+    if window == "day":
+        return f"day:{at.strftime('%Y-%m-%d')}"
+    if window == "week":
+        year, week, _ = at.isocalendar()
+        return f"week:{year}-W{week:02d}"
+    return "all"
+
+
+def board_key(board: str, window: str = "all", at: datetime = None) -> str:
+    return f"lb:{board}:{_window_suffix(window, at or datetime.now(timezone.utc))}"
+
+
+def names_key(board: str) -> str:
+    return f"lb:names:{board}"
+
+
+def user_label(user) -> str:
+    """How a user is shown on the board: @username, else first name, else id."""
+    if getattr(user, "username", None):
+        return f"@{user.username}"
+    return getattr(user, "first_name", None) or str(user.id)
+
+
+# ---------------------
+# 🔹 WRITE PATH
+# ---------------------
+def add_search(pipe, at: datetime, user_id: str, user_name: str = None,
+               hero_id: str = None, hero_name: str = None, war: str = None):
+    """Queue ZINCRBYs for every board and window one search counts towards."""
+    at = at.astimezone(timezone.utc)
+    members = {"users": (user_id, user_name), "heroes": (hero_id, hero_name), "wars": (war, None)}
+    for board, (member, label) in members.items():
+        if not member:
+            continue
+        for window in WINDOWS:
+            key = board_key(board, window, at)
+            pipe.zincrby(key, 1, member)
+            if window != "all":
+                pipe.expire(key, DAY_TTL if window == "day" else WEEK_TTL)
+        if label:
+            pipe.hset(names_key(board), member, label)
+
+
+# ---------------------
+# 🔹 READ PATH
+# ---------------------
+async def top(board: str, window: str = "all", limit: int = 5) -> list[tuple[str, str, int]]:
+    """(member, display name, score) of the top `limit` entries — ZREVRANGE is O(log n + k)."""
+    rows = await cache.zrevrange(board_key(board, window), 0, limit - 1, withscores=True)
+    if not rows:
+        return []
+    members = [member for member, _ in rows]
+    labels = await cache.hmget(names_key(board), members) if board != "wars" else members
+    return [(member, label or member, int(score)) for (member, score), label in zip(rows, labels)]
+
+
+# ---------------------
+# 🔹 REBUILD FROM MONGO
+# ---------------------
+async def _hero_wars(hero_ids: set) -> dict:
+    wars = {}
+    ids = [ObjectId(h) for h in hero_ids if ObjectId.is_valid(h)]
+    for i in range(0, len(ids), 1000):
+        async for hero in heroes_collection.find({"_id": {"$in": ids[i:i + 1000]}}, {"war": 1}):
+            wars[str(hero["_id"])] = hero.get("war")
+    return wars
+
+
+async def _swap_in(scores: dict, labels: dict):
+    """Write each rebuilt board to a temp key and RENAME it over the live one."""
+    async with cache.pipeline(transaction=True) as pipe:
+        for key, members in scores.items():
+            if not members:
+                pipe.delete(key)
+                continue
+            tmp = f"{key}:rebuild"
+            pipe.delete(tmp)
+            items = list(members.items())
+            for i in range(0, len(items), REBUILD_CHUNK):
+                pipe.zadd(tmp, dict(items[i:i + REBUILD_CHUNK]))
+            pipe.rename(tmp, key)
+            if ":day:" in key:
+                pipe.expire(key, DAY_TTL)
+            elif ":week:" in key:
+                pipe.expire(key, WEEK_TTL)
+        for board, mapping in labels.items():
+            if mapping:
+                pipe.hset(names_key(board), mapping=mapping)
+        await pipe.execute()
+
+
+async def rebuild():
+    """
+    Users all-time from users.search_count (the authoritative counter);
+    heroes and wars, and the weekly/daily user windows, from the history log,
+    grouped by Mongo ($group) so the log itself is never held in memory.
+    """
+    now = datetime.now(timezone.utc)
+    day_key = {b: board_key(b, "day", now) for b in BOARDS}
+    week_key = {b: board_key(b, "week", now) for b in BOARDS}
+    all_key = {b: board_key(b, "all", now) for b in BOARDS}
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = day_start - timedelta(days=now.weekday())
+
+    scores = {k: {} for keys in (all_key, week_key, day_key) for k in keys.values()}
+    labels = {"users": {}, "heroes": {}}
+
+    def bump(key, member, n):
+        if member:
+            scores[key][member] = scores[key].get(member, 0) + n
+
+    async for user in users_collection.find({"search_count": {"$gt": 0}}, {"id": 1, "search_count": 1, "username": 1, "first_name": 1}):
+        user_id = str(user.get("id"))
+        scores[all_key["users"]][user_id] = user["search_count"]
+        labels["users"][user_id] = f"@{user['username']}" if user.get("username") else user.get("first_name") or user_id
+
+    by_hero = history_collection.aggregate([
+        {"$match": {"hero_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$hero_id", "n": {"$sum": 1}, "name": {"$first": "$hero_name"}}},
+    ])
+    async for row in by_hero:
+        scores[all_key["heroes"]][row["_id"]] = row["n"]
+        labels["heroes"][row["_id"]] = row.get("name") or row["_id"]
+
+    wars = await _hero_wars(set(scores[all_key["heroes"]]))
+    for hero_id, n in scores[all_key["heroes"]].items():
+        bump(all_key["wars"], wars.get(hero_id), n)
+
+    for keys, since in ((week_key, week_start), (day_key, day_start)):
+        recent = history_collection.aggregate([
+            {"$match": {"searched_at": {"$gte": since}}},
+            {"$group": {"_id": {"user": "$user_id", "hero": "$hero_id"}, "n": {"$sum": 1}}},
+        ])
+        async for row in recent:
+            user_id, hero_id = row["_id"].get("user"), row["_id"].get("hero")
+            bump(keys["users"], user_id, row["n"])
+            bump(keys["heroes"], hero_id, row["n"])
+            bump(keys["wars"], wars.get(hero_id), row["n"])
+
+    await _swap_in(scores, labels)
+    logger.info(
+        f"🏆 Leaderboards rebuilt: {len(scores[all_key['users']])} users, "
+        f"{len(scores[all_key['heroes']])} heroes, {len(scores[all_key['wars']])} wars"
+    )
+
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(rebuild())
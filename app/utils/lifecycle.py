@@ -0,0 +1,54 @@
+import asyncio
+from loguru import logger
+from app.db.mongo import mongo_client
+from app.db.mongo_stats import search_counters
+from app.db.redis_db import cache
+from app.utils.metrics import registry, CallbackGauge
+from app.utils.util import close_image_pipeline
+
+
+# ---------------------
+# 🔹 IN-FLIGHT UPDATES
+# ---------------------
+class InFlightTracker:
+    """Outer update middleware counting handlers in progress, so shutdown can wait for them."""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(self, handler, event, data):
+        self.count += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.count -= 1
+            if not self.count:
+                self._idle.set()
+
+    async def drain(self, timeout: float):
+        """Wait until no update is being handled (or timeout)."""
+        if self.count:
+            logger.info(f"⏳ Waiting for {self.count} in-flight updates…")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Shutdown with {self.count} updates still running")
+
+
+in_flight = InFlightTracker()
+registry.add(CallbackGauge("bot_updates_in_flight", "Updates being handled right now", lambda: in_flight.count))
+
+
+# ---------------------
+# 🔹 SHUTDOWN
+# ---------------------
+async def close_resources():
+    """Flush buffered writes, then close the image HTTP/render pools, Redis and Motor."""
+    await search_counters.close()
+    await close_image_pipeline()
+    await cache.aclose()
+    mongo_client.close()
+    logger.info("🔌 Connections closed")
@@ -0,0 +1,359 @@
+"""
+Process-local metrics in the Prometheus text format.
+
+    GET /metrics   (webhook app, or METRICS_PORT in polling / worker mode)
+
+Updates are timed by an outer Dispatcher middleware and labelled by a tiny
+inner one (which knows the handler); Mongo is timed through a pymongo
+CommandListener, Redis by wrapping execute_command, the Bot API by a
+session middleware and image composition by a decorator. Nothing here
+imports app.db, so the clients can import it.
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from pymongo import monitoring
+
+# seconds; le="+Inf" is implied
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ---------------------
+# 🔹 PRIMITIVES
+# ---------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+        self._lock = threading.Lock()   # Mongo events arrive on Motor's worker threads
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in list(self.values.items()):
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: tuple, value: float):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += seconds
+
+    def count(self, labels: tuple) -> int:
+        row = self.values.get(labels)
+        return sum(row[:-1]) if row else 0
+
+    def total(self, labels: tuple) -> float:
+        row = self.values.get(labels)
+        return row[-1] if row else 0.0
+
+    def quantile(self, labels: tuple, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bucket)."""
+        row = self.values.get(labels)
+        if not row:
+            return 0.0
+        rank, seen = q * sum(row[:-1]), 0
+        for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labels, row in list(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", labels + (("le", le),), cumulative
+            yield f"{self.name}_sum", labels, row[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackCounter:
+    """Exposes an existing dict of counters (e.g. image_cache.render_stats) under one label."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: str, source):
+        self.name, self.help, self.label, self.source = name, help, label, source
+
+    def samples(self):
+        for key, value in list(self.source().items()):
+            yield self.name, ((self.label, key),), value
+
+
+class CallbackGauge:
+    """A single gauge read at scrape time from state kept elsewhere (e.g. lifecycle.in_flight)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, source):
+        self.name, self.help, self.source = name, help, source
+
+    def samples(self):
+        yield self.name, (), self.source()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=()):
+        return self.add(Histogram(name, help, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            names = getattr(metric, "labels", ())
+            for name, labels, value in metric.samples():
+                pairs = [p if isinstance(p, tuple) else (names[i], p) for i, p in enumerate(labels)]
+                label_text = ",".join(f'{k}="{v}"' for k, v in pairs)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+update_seconds = registry.histogram("bot_update_seconds", "Update handling time", ("router", "handler"))
+update_errors = registry.counter("bot_update_errors_total", "Updates whose handler raised", ("router", "handler"))
+mongo_seconds = registry.histogram("mongo_command_seconds", "MongoDB command time", ("collection", "command"))
+mongo_errors = registry.counter("mongo_command_errors_total", "Failed MongoDB commands", ("collection", "command"))
+redis_seconds = registry.histogram("redis_command_seconds", "Redis command time", ("command",))
+redis_errors = registry.counter("redis_command_errors_total", "Failed Redis commands", ("command",))
+telegram_seconds = registry.histogram("telegram_api_seconds", "Bot API call time", ("method",))
+telegram_errors = registry.counter("telegram_api_errors_total", "Failed Bot API calls", ("method",))
+image_seconds = registry.histogram("image_compose_seconds", "Hero image composition time", ("step",))
+
+
+# ---------------------
+# 🔹 UPDATES
+# ---------------------
+UNHANDLED = ("-", "unhandled")
+
+
+class UpdateMetrics:
+    """
+    Outer update middleware: latency and errors per handler (the in-flight
+    gauge reads lifecycle.in_flight). The handler is only known after
+    routing, so `label_handler` (an inner middleware on every event
+    observer) writes it into a slot this one owns.
+    """
+
+    async def __call__(self, handler, event, data):
+        slot = data["metrics_handler"] = [UNHANDLED]
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            update_errors.inc(slot[0])
+            raise
+        finally:
+            update_seconds.observe(slot[0], time.perf_counter() - started)
+
+
+_handler_labels = {}
+
+
+def _handler_label(callback) -> tuple:
+    label = _handler_labels.get(callback)
+    if label is None:
+        module = getattr(callback, "__module__", "") or ""
+        label = _handler_labels[callback] = (module.rsplit(".", 1)[-1], getattr(callback, "__name__", "?"))
+    return label
+
+
+async def label_handler(handler, event, data):
+    slot = data.get("metrics_handler")
+    if slot is not None:
+        slot[0] = _handler_label(data["handler"].callback)
+    return await handler(event, data)
+
+
+update_metrics = UpdateMetrics()
+
+
+def instrument_dispatcher(dp):
+    dp.update.outer_middleware(update_metrics)
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(label_handler)
+
+
+# ---------------------
+# 🔹 CLIENTS
+# ---------------------
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo command listener; covers find/getMore cursors as well as single calls."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        # getMore carries the cursor id under its own name and the collection apart
+        target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._collections[event.request_id] = target if isinstance(target, str) else "-"
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "-")
+        mongo_seconds.observe((collection, event.command_name), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "-")
+        mongo_seconds.observe((collection, event.command_name), event.duration_micros / 1e6)
+        mongo_errors.inc((collection, event.command_name))
+
+
+def instrument_redis(client):
+    """Time every command and pipeline of one redis.asyncio client."""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    @wraps(execute_command)
+    async def timed_command(*args, **options):
+        labels = (str(args[0]).upper(),)
+        started = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            redis_errors.inc(labels)
+            raise
+        finally:
+            redis_seconds.observe(labels, time.perf_counter() - started)
+
+    @wraps(pipeline)
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+        labels = ("MULTI" if pipe.is_transaction else "PIPELINE",)
+
+        async def timed_execute(*a, **kw):
+            started = time.perf_counter()
+            try:
+                return await execute(*a, **kw)
+            except Exception:
+                redis_errors.inc(labels)
+                raise
+            finally:
+                redis_seconds.observe(labels, time.perf_counter() - started)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_command
+    client.pipeline = timed_pipeline
+    return client
+
+
+class TelegramApiTimer(BaseRequestMiddleware):
+    """Bot session middleware timing every API method (answer_photo, edit_media, …)."""
+
+    async def __call__(self, make_request, bot, method):
+        labels = (type(method).__name__,)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            telegram_errors.inc(labels)
+            raise
+        finally:
+            telegram_seconds.observe(labels, time.perf_counter() - started)
+
+
+def timed(histogram: Histogram, labels: tuple):
+    """Decorator timing an async function into a histogram."""
+    def decorate(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(labels, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+# ---------------------
+# 🔹 EXPOSITION
+# ---------------------
+async def metrics_view(request: web.Request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+def add_metrics_route(app: web.Application):
+    app.router.add_get("/metrics", metrics_view)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    add_metrics_route(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
+
+
+def summary(limit: int = 8) -> list[dict]:
+    """Busiest handlers with p50/p95 (bucket bounds, ms), mean and errors — for /admin."""
+    rows = []
+    for labels in list(update_seconds.values):
+        count = update_seconds.count(labels)
+        rows.append({
+            "handler": f"{labels[0]}.{labels[1]}",
+            "count": count,
+            "mean_ms": update_seconds.total(labels) / count * 1000 if count else 0.0,
+            "p50_ms": update_seconds.quantile(labels, 0.5) * 1000,
+            "p95_ms": update_seconds.quantile(labels, 0.95) * 1000,
+            "errors": update_errors.values.get(labels, 0),
+        })
+    rows.sort(key=lambda r: r["count"], reverse=True)
+    return rows[:limit]
+
+
+def client_totals() -> dict:
+    """(calls, mean ms) per backend across all labels."""
+    totals = {}
+    for name, histogram in (("mongo", mongo_seconds), ("redis", redis_seconds), ("telegram", telegram_seconds), ("image", image_seconds)):
+        labels = list(histogram.values)
+        calls = sum(histogram.count(l) for l in labels)
+        seconds = sum(histogram.total(l) for l in labels)
+        totals[name] = (calls, seconds / calls * 1000 if calls else 0.0)
+    return totals
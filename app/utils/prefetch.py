@@ -0,0 +1,180 @@
+"""
+Speculative prefetch of the ⬅️/➡️ neighbours of a shown page.
+
+After a page is shown, the handler schedules a background job for its
+scope (a result session, a war or the "all heroes" order). The job builds
+the neighbouring pages (caption + img_url) and warms their photos (file_id
+or a render on disk). The next click then takes its page from here instead
+of Mongo, and its photo from the render cache.
+
+Pages live in process memory: a chat's updates always reach the same
+process (one bot in polling/webhook mode, a chat-sharded queue worker
+otherwise). Prefetch yields to real requests: no job starts while more
+than PREFETCH_MAX_IN_FLIGHT updates are being handled or
+PREFETCH_CONCURRENCY jobs are running (it is dropped, not queued),
+renders wait for an idle image pipeline, and a newer click on the same
+scope cancels the older job. A job whose session has expired stops and
+drops that scope's pages. Counters go to Redis from run_flush_loop, not
+per job.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.db.redis_db import cache
+from app.utils.image_cache import warm_hero_photo
+from app.utils.lifecycle import in_flight
+from app.utils.metrics import registry, CallbackCounter
+from app.config.settings import (
+    PREFETCH_CONCURRENCY,
+    PREFETCH_MAX_IN_FLIGHT,
+    PREFETCH_CACHE,
+    PREFETCH_STATS_FLUSH,
+    SESSION_TTL,
+)
+
+STATS_KEY = "stats:prefetch"
+
+# Process-local counters (Redis STATS_KEY keeps the totals across replicas)
+prefetch_stats = {
+    "hit": 0, "miss": 0,                        # page lookups on click
+    "pages": 0, "rendered": 0, "cached": 0,     # work done by jobs
+    "skipped": 0,                               # photos left alone (pipeline busy)
+    "busy": 0, "cancelled": 0, "expired": 0,    # jobs not started / cut short
+}
+registry.add(CallbackCounter("prefetch_events_total", "Neighbour prefetch lookups and jobs", "event", lambda: prefetch_stats))
+
+
+# ---------------------
+# 🔹 PREFETCHER
+# ---------------------
+class Prefetcher:
+    """Warmed neighbour pages per (scope, index), and at most one warming job per scope."""
+
+    def __init__(self, max_pages: int = PREFETCH_CACHE, concurrency: int = PREFETCH_CONCURRENCY, ttl: int = SESSION_TTL):
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self._pages = OrderedDict()   # (scope, index) -> (stored_at, page)
+        self._jobs = {}               # job key -> running task
+        self._unsaved = {}            # counts not yet added to STATS_KEY
+
+    def _count(self, kind: str, n: int = 1):
+        prefetch_stats[kind] += n
+        self._unsaved[kind] = self._unsaved.get(kind, 0) + n
+
+    def take(self, scope: str, index: int, stored: dict = None):
+        """
+        A warmed page for this click, or None (counted as a prefetch hit /
+        miss): from `stored` (pages a result session was created with,
+        keyed by str(index)) first, else from this process's cache.
+        """
+        page = stored.get(str(index)) if stored else None
+        if page is None:
+            entry = self._pages.get((scope, index))
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._pages.move_to_end((scope, index))
+                page = entry[1]
+        self._count("miss" if page is None else "hit")
+        return page
+
+    def schedule(self, scope: str, fetch=None, pages: dict = None, alive=None, job: str = None):
+        """
+        Warm pages in the background: `pages` ({index: page}) when the caller
+        already has them, else whatever `await fetch()` returns. `alive` is
+        an async check that the scope (e.g. its result session) still exists.
+        A job replaces the running one with the same key: the scope itself,
+        or `job` (e.g. scope + chat) when several chats page through one scope.
+        """
+        job = job or scope
+        previous = self._jobs.pop(job, None)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self._count("cancelled")
+        if len(self._jobs) >= self.concurrency or in_flight.count > PREFETCH_MAX_IN_FLIGHT:
+            self._count("busy")
+            return None
+        task = asyncio.create_task(self._run(scope, fetch, pages, alive))
+        self._jobs[job] = task
+        task.add_done_callback(lambda t: self._forget(job, t))
+        return task
+
+    def _forget(self, job: str, task: asyncio.Task):
+        if self._jobs.get(job) is task:
+            del self._jobs[job]
+
+    async def _run(self, scope, fetch, pages, alive):
+        try:
+            if alive is not None and not await alive():
+                self._expire(scope)
+                return
+            if pages is None:
+                pages = await fetch()
+            for index, page in pages.items():
+                self._store(scope, int(index), page)
+            self._count("pages", len(pages))
+
+            for page in pages.values():
+                if alive is not None and not await alive():
+                    self._expire(scope)
+                    return
+                self._count(await warm_hero_photo(page.get("img_url")))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Prefetch failed ({scope}): {e}")
+
+    def _store(self, scope: str, index: int, page: dict):
+        self._pages[(scope, index)] = (time.monotonic(), page)
+        self._pages.move_to_end((scope, index))
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _expire(self, scope: str):
+        """The scope is gone (session expired): drop its pages."""
+        for key in [k for k in self._pages if k[0] == scope]:
+            del self._pages[key]
+        self._count("expired")
+
+    async def save_counts(self):
+        """Add the counts since the last save to STATS_KEY (one pipeline)."""
+        counts, self._unsaved = self._unsaved, {}
+        if not counts:
+            return
+        try:
+            async with cache.pipeline(transaction=False) as pipe:
+                for kind, n in counts.items():
+                    pipe.hincrby(STATS_KEY, kind, n)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Prefetch stats not saved: {e}")
+
+    async def run_flush_loop(self, interval: int = PREFETCH_STATS_FLUSH):
+        while True:
+            await asyncio.sleep(interval)
+            await self.save_counts()
+
+    async def wait(self):
+        """Let the running jobs finish (benchmarks)."""
+        while self._jobs:
+            await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+
+    def cancel_all(self):
+        for task in list(self._jobs.values()):
+            task.cancel()
+        self._jobs.clear()
+
+
+async def hit_rate() -> dict:
+    """Share of pagination clicks served from prefetched pages, across all replicas."""
+    totals = {k: int(v) for k, v in (await cache.hgetall(STATS_KEY)).items()}
+    lookups = totals.get("hit", 0) + totals.get("miss", 0)
+    return {
+        "lookups": lookups,
+        "hit_rate": totals.get("hit", 0) / lookups if lookups else 0.0,
+        "rendered": totals.get("rendered", 0),
+        "busy": totals.get("busy", 0),
+    }
+
+
+prefetcher = Prefetcher()
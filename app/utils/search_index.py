@@ -0,0 +1,508 @@
+import asyncio
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import compress, filterfalse, islice, repeat
+from operator import itemgetter
+from loguru import logger
+from app.db.mongo import heroes_collection
+from app.db.redis_db import cache
+from app.utils.cache import get_heroes_version
+from app.utils.leaderboard import board_key
+from app.config.settings import SEARCH_INDEX_REFRESH, SEARCH_MAX_RESULTS
+
+# ---------------------
+# ⚙️ RANKING
+# ---------------------
+# score = tier + popularity boost (< 1, so it only reorders within a tier)
+EXACT, PREFIX, SUBSTRING = 4.0, 3.0, 2.0     # fuzzy matches score 0..1
+POPULARITY_WEIGHT = 0.5
+RANK_LIMIT = 1000        # matches scored one by one; the rest follow in collection order
+POPULAR_CANDIDATES = 200 # most searched heroes always scored, however many matches
+FUZZY_BELOW = 20         # look for fuzzy matches only when strict matches are this few
+FUZZY_MIN_LEN = 4
+FUZZY_CANDIDATES = 48
+
+
+# ---------------------
+# 🔹 NORMALIZATION
+# ---------------------
+_PUNCT = re.compile(r"[\u055a-\u055f\u0589\u058a«»\-.,'\"’`()]")
+
+
+def normalize(text: str) -> str:
+    """NFC, lowercase, fold «և», drop Armenian and Latin punctuation, collapse whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text).lower().replace("և", "եվ")
+    text = _PUNCT.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def search_keys(name: dict) -> dict:
+    """Normalized name keys; stored on each hero as hero["search"] by app.ingest."""
+    first = normalize((name or {}).get("first", ""))
+    last = normalize((name or {}).get("last", ""))
+    return {"first": first, "last": last, "full": f"{first} {last}".strip()}
+
+
+# ---------------------
+# 🔹 TRANSLITERATION
+# ---------------------
+# Latin and Cyrillic spellings of Armenian names → Armenian letters.
+# Longest chunk wins, so "sh" → շ before "s" → ս.
+LATIN = {
+    "tch": "ճ", "sh": "շ", "ch": "չ", "zh": "ժ", "kh": "խ", "gh": "ղ", "ts": "ց", "dz": "ձ",
+    "ph": "փ", "th": "թ", "dj": "ջ", "ou": "ու", "yu": "յու", "ya": "յա",
+    "a": "ա", "b": "բ", "c": "ց", "d": "դ", "e": "ե", "f": "ֆ", "g": "գ", "h": "հ", "i": "ի",
+    "j": "ջ", "k": "կ", "l": "լ", "m": "մ", "n": "ն", "o": "ո", "p": "պ", "q": "ք", "r": "ր",
+    "s": "ս", "t": "տ", "u": "ու", "v": "վ", "w": "վ", "x": "խ", "y": "յ", "z": "զ",
+}
+CYRILLIC = {
+    "дж": "ջ", "дз": "ձ", "тс": "ց", "кх": "խ", "гх": "ղ",
+    "а": "ա", "б": "բ", "в": "վ", "г": "գ", "д": "դ", "е": "ե", "ё": "յո", "ж": "ժ", "з": "զ",
+    "и": "ի", "й": "յ", "к": "կ", "л": "լ", "м": "մ", "н": "ն", "о": "ո", "п": "պ", "р": "ր",
+    "с": "ս", "т": "տ", "у": "ու", "ф": "ֆ", "х": "խ", "ц": "ց", "ч": "չ", "ш": "շ", "щ": "շ",
+    "ъ": "", "ы": "ը", "ь": "", "э": "է", "ю": "յու", "я": "յա",
+}
+_TRANSLIT = {**LATIN, **CYRILLIC}
+_FOREIGN = re.compile(r"[a-zа-яё]", re.IGNORECASE)
+
+
+def transliterate(text: str) -> str:
+    """Armenian letters for any Latin/Cyrillic ones; Armenian text is returned as is."""
+    if not text or not _FOREIGN.search(text):
+        return text
+    text, out, i = text.lower(), [], 0
+    while i < len(text):
+        for n in (3, 2, 1):
+            chunk = text[i:i + n]
+            if chunk in _TRANSLIT:
+                out.append(_TRANSLIT[chunk])
+                i += n
+                break
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+# Letters a transliteration cannot tell apart (ռ/ր, թ/տ, է/ե, …) share one key;
+# word-initial "ye"/"vo" are how ե/ո are spelled in Latin and Cyrillic.
+_FOLD = str.maketrans({"ռ": "ր", "թ": "տ", "փ": "պ", "ք": "կ", "ճ": "չ", "ծ": "ց", "օ": "ո", "է": "ե"})
+_INITIAL = re.compile(r"(^| )(?:յե|վո)")
+
+
+def fold(text: str) -> str:
+    return _INITIAL.sub(lambda m: m.group(1) + m.group(0)[-1], text.translate(_FOLD))
+
+
+def query_key(text: str) -> str:
+    """What the index compares: transliterated, normalized and folded."""
+    return fold(normalize(transliterate(text)))
+
+
+def _grams(text: str):
+    """1- to 3-grams of a normalized string."""
+    grams = set()
+    for n in (1, 2, 3):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+def edit_distance(a: str, b: str, bound: int) -> int:
+    """Levenshtein distance, or bound + 1 once it must exceed bound (only the diagonal band is computed)."""
+    far = bound + 1
+    if abs(len(a) - len(b)) > bound:
+        return far
+    if a == b:
+        return 0
+    previous = [j if j <= bound else far for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - bound), min(len(b), i + bound)
+        current = [far] * (len(b) + 1)
+        if i <= bound:
+            current[0] = i
+        best = current[lo - 1]
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > bound:
+            return far
+        previous = current
+    return min(previous[-1], far)
+
+
+# ---------------------
+# 🔹 IN-MEMORY HERO INDEX
+# ---------------------
+class HeroSearchIndex:
+    """
+    Process-local name index over heroes_collection, shared by every search path.
+    Keeps folded first/last/full names, n-gram postings (substring candidates),
+    a sorted word list (prefix lookups) and trigrams of the distinct words
+    (typo correction), so queries resolve and rank without touching Mongo.
+    """
+
+    def __init__(self):
+        self._ids = []
+        self._first = []
+        self._last = []
+        self._full = []
+        self._postings = {}
+        self._words = []              # sorted name words …
+        self._word_pos = array("I")   # … and the position each belongs to
+        self._popularity = {}         # position -> boost, from the heroes leaderboard
+        self._popular = []            # the POPULAR_CANDIDATES most boosted positions
+        self._id_positions = None     # str(_id) -> position, built on first use
+        self._vocab = []              # distinct name words
+        self._vocab_grams = {}        # trigram -> indexes into _vocab
+        self._signature = None
+        self.generation = 0   # bumped on every build; positions are only valid within one
+
+    def __len__(self):
+        return len(self._ids)
+
+    def build(self, heroes):
+        """Rebuild the index from an iterable of hero documents (in collection order)."""
+        ids, first, last, full, postings, words = [], [], [], [], {}, []
+        for hero in heroes:
+            keys = hero.get("search") or search_keys(hero.get("name"))
+            f, l = fold(normalize(keys["first"])), fold(normalize(keys["last"]))
+            pos = len(ids)
+            ids.append(hero["_id"])
+            first.append(f)
+            last.append(l)
+            full.append(f"{f} {l}".strip())
+            for gram in _grams(full[pos]):
+                postings.setdefault(gram, array("I")).append(pos)
+            for word in set(full[pos].split()):
+                words.append((word, pos))
+
+        words.sort()
+        # swap in one go so concurrent readers never see a half-built index
+        self._ids, self._first, self._last, self._full, self._postings = ids, first, last, full, postings
+        self._words = [w for w, _ in words]
+        self._word_pos = array("I", (p for _, p in words))
+        self._vocab = list(dict.fromkeys(self._words))
+        self._vocab_grams = {}
+        for i, word in enumerate(self._vocab):
+            for gram in {word[j:j + 3] for j in range(len(word) - 2)}:
+                self._vocab_grams.setdefault(gram, array("I")).append(i)
+        self._popularity = {}
+        self._popular = []
+        self._id_positions = None
+        self.generation += 1
+
+    @property
+    def version(self):
+        """heroes:version the index was last loaded at."""
+        return self._signature[2] if self._signature else None
+
+    # ---------------------
+    # 🔹 STRICT MATCHES
+    # ---------------------
+    def _candidates(self, terms):
+        """Positions holding the rarest gram of every term (all terms must occur in a match)."""
+        rarest = []
+        for term in terms:
+            best = None
+            for gram in _grams(term):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    return ()
+                if best is None or len(posting) < len(best):
+                    best = posting
+            if best is not None:
+                rarest.append(best)
+        if not rarest:
+            return range(len(self._ids))
+        rarest.sort(key=len)
+        result = rarest[0]
+        for posting in rarest[1:]:
+            result = array("I", filter(set(posting).__contains__, result))
+        return result
+
+    def positions(self, query: str, within=None, limit: int = None) -> array:
+        """
+        Index positions matching the query strictly, in collection order:
+        the whole query inside the full name, or the first two words inside
+        first/last name in either order (the old regex semantics, on folded names).
+        `within` restricts the scan to known candidates, e.g. the positions
+        of a prefix of this query (a longer query only ever matches fewer heroes).
+        """
+        q = query_key(query)
+        if not q:
+            return array("I")
+
+        if within is None and len(q) <= 3 and " " not in q:
+            # the posting of a short one-word query is exactly its match set
+            posting = self._postings.get(q, array("I"))
+            return posting[:limit] if limit else posting[:]
+
+        parts = q.split(" ")
+        pair = parts[:2] if len(parts) >= 2 else None
+        first, last, full = self._first, self._last, self._full
+        candidates = within if within is not None else self._candidates(pair or [q])
+
+        if pair is None:
+            # one word: a substring test per name, looped in C
+            hits = compress(candidates, map(str.__contains__, map(full.__getitem__, candidates), repeat(q)))
+            return array("I", islice(hits, limit) if limit else hits)
+
+        result = array("I")
+        for pos in candidates:
+            if q in full[pos] or (
+                (pair[0] in first[pos] and pair[1] in last[pos])
+                or (pair[1] in first[pos] and pair[0] in last[pos])
+            ):
+                result.append(pos)
+                if limit and len(result) >= limit:
+                    break
+        return result
+
+    def _word_prefix(self, prefix: str, cap: int = None):
+        """Positions of names with a word starting with prefix (binary search on the word list)."""
+        lo, _, hi = self._prefix_range(prefix)
+        return self._word_pos[lo:min(hi, lo + cap) if cap else hi]
+
+    # ---------------------
+    # 🔹 FUZZY MATCHES
+    # ---------------------
+    def _close_words(self, part: str, bound: int):
+        """(distance, word) for vocabulary words within bound of part, or of its length-prefix."""
+        grams = {part[i:i + 3] for i in range(len(part) - 2)}
+        counts = Counter()
+        for gram in grams:
+            posting = self._vocab_grams.get(gram)
+            if posting is not None:
+                counts.update(posting)
+        # one edit breaks at most three trigrams
+        need = max(1, len(grams) - 3 * bound)
+        close = []
+        for i, n in counts.most_common(FUZZY_CANDIDATES):
+            if n < need:
+                break
+            word = self._vocab[i]
+            if word.startswith(part):
+                continue              # already a prefix match
+            d = edit_distance(part, word, bound)
+            if len(word) > len(part):
+                d = min(d, edit_distance(part, word[:len(part)], bound))
+            if d <= bound:
+                close.append((d, word))
+        close.sort()
+        return close
+
+    def _fuzzy_matches(self, parts: list, bound: int) -> dict:
+        """
+        position -> summed word distance, for heroes having every query word
+        as a word prefix or within a few edits of one of their words.
+        """
+        groups = []   # per query word: [(distance, positions), ...], closest first
+        for part in parts:
+            if len(part) < 2:
+                continue              # an initial narrows nothing
+            words = [(0, self._word_prefix(part))]
+            if len(part) >= FUZZY_MIN_LEN:
+                for d, word in self._close_words(part, min(bound, 1 if len(part) <= 6 else 2)):
+                    lo = bisect_left(self._words, word)
+                    words.append((d, self._word_pos[lo:bisect_right(self._words, word, lo)]))
+            groups.append(words)
+        if not groups:
+            return {}
+
+        # start from the rarest query word, then keep only heroes the others also match
+        groups.sort(key=lambda words: sum(len(p) for _, p in words))
+        total = {}
+        for d, positions in groups[0]:
+            closer, total = total, dict.fromkeys(positions, d)
+            total.update(closer)      # keep the smaller distance
+        for words in groups[1:]:
+            matched = {}
+            for d, positions in words:
+                for pos in filter(total.__contains__, positions):
+                    if pos not in matched:
+                        matched[pos] = total[pos] + d
+            total = matched
+            if not total:
+                return {}
+        return {pos: d for pos, d in total.items() if d <= bound}
+
+    # ---------------------
+    # 🔹 RANKING
+    # ---------------------
+    def _score(self, q: str, parts: list, pos: int):
+        """Tier plus popularity for a strict match, None otherwise."""
+        first, last, full = self._first[pos], self._last[pos], self._full[pos]
+        if len(parts) == 1:
+            if q == first or q == last or q == full:
+                tier = EXACT
+            elif full.startswith(q) or f" {q}" in full:     # some name word starts with q
+                tier = PREFIX
+            elif q in full:
+                tier = SUBSTRING
+            else:
+                return None
+        else:
+            a, b = parts[0], parts[1]
+            if q == full or (len(parts) == 2 and ((a == first and b == last) or (a == last and b == first))):
+                tier = EXACT
+            elif full.startswith(q) or (len(parts) == 2 and (
+                (first.startswith(a) and last.startswith(b)) or (first.startswith(b) and last.startswith(a))
+            )):
+                tier = PREFIX
+            elif q in full or (a in first and b in last) or (b in first and a in last):
+                tier = SUBSTRING
+            else:
+                return None
+        return tier + self._popularity.get(pos, 0.0)
+
+    def _prefix_range(self, word: str):
+        """(lo, mid, hi) in the word list: [lo, mid) is word itself, [mid, hi) longer words starting with it."""
+        lo = bisect_left(self._words, word)
+        mid = bisect_right(self._words, word, lo)
+        return lo, mid, bisect_left(self._words, word + "\uffff", mid)
+
+    def _prefix_scored(self, word: str) -> list:
+        """(-score, position) of up to RANK_LIMIT word-prefix matches: EXACT on a whole word, else PREFIX."""
+        popularity = self._popularity
+        lo, mid, hi = self._prefix_range(word)
+        mid, hi = min(mid, lo + RANK_LIMIT), min(hi, lo + RANK_LIMIT)
+        scored = [(-(EXACT + popularity.get(pos, 0.0)), pos) for pos in self._word_pos[lo:mid]]
+        scored.extend((-(PREFIX + popularity.get(pos, 0.0)), pos) for pos in self._word_pos[mid:hi])
+        return scored
+
+    def _scored(self, q: str, parts: list, positions) -> list:
+        scored = []
+        for pos in positions:
+            score = self._score(q, parts, pos)
+            if score is not None:
+                scored.append((-score, pos))
+        return scored
+
+    @staticmethod
+    def _ordered(scored: list) -> array:
+        scored.sort()
+        # a name with two matching words (or a popular prefix match) is scored twice
+        return array("I", dict.fromkeys(pos for _, pos in scored))
+
+    def rank(self, query: str, strict=None, limit: int = None) -> array:
+        """
+        Positions for a query, best first: exact > prefix > substring > fuzzy,
+        each tier ordered by popularity. `strict` may pass in positions() of
+        this query when the caller already has them.
+        """
+        q = query_key(query)
+        if not q:
+            return array("I")
+        parts = q.split(" ")
+
+        if strict is None and len(parts) == 1 and limit:
+            lo, _, hi = self._prefix_range(q)
+            if hi - lo >= limit:
+                # word-prefix matches alone fill the limit and outrank every substring match
+                scored = self._prefix_scored(q) + self._scored(q, parts, self._popular)
+                return self._ordered(scored)[:limit]
+        if strict is None:
+            strict = self.positions(q)
+
+        if len(strict) <= RANK_LIMIT:
+            scored = self._scored(q, parts, strict)
+        elif len(parts) == 1:
+            # too many to score one by one: the word-prefix matches and the most
+            # searched heroes are ranked, the rest follow in collection order
+            scored = self._prefix_scored(q) + self._scored(q, parts, self._popular)
+        else:
+            scored = self._scored(q, parts, self._word_prefix(parts[0], RANK_LIMIT).tolist() + self._popular)
+
+        if len(strict) < FUZZY_BELOW and len(q.replace(" ", "")) >= FUZZY_MIN_LEN:
+            bound = 1 if len(q) <= 6 else 2
+            matched = set(strict)
+            for pos, d in self._fuzzy_matches(parts, bound).items():
+                if pos not in matched:
+                    scored.append((-(1 - d / (bound + 1) + self._popularity.get(pos, 0.0)), pos))
+
+        result = self._ordered(scored)
+        if len(strict) > RANK_LIMIT and (limit is None or len(result) < limit):
+            seen = bytearray(len(self._ids))
+            for pos in result:
+                seen[pos] = 1
+            rest = filterfalse(seen.__getitem__, strict)
+            result.extend(islice(rest, limit - len(result)) if limit else rest)
+        return result[:limit] if limit else result
+
+    def ids_at(self, positions):
+        if len(positions) <= 1:
+            return [self._ids[pos] for pos in positions]
+        return list(itemgetter(*positions)(self._ids))
+
+    def search(self, query: str, limit: int = SEARCH_MAX_RESULTS):
+        """Return matching hero _ids, best first (at most `limit`)."""
+        return self.ids_at(self.rank(query, limit=limit))
+
+    # ---------------------
+    # 🔹 LOADING / FRESHNESS
+    # ---------------------
+    async def _current_signature(self):
+        count = await heroes_collection.estimated_document_count()
+        newest = await heroes_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        # the version catches in-place edits (renames) that keep count and newest _id
+        return count, newest["_id"] if newest else None, await get_heroes_version()
+
+    async def load(self):
+        """Load all hero names from Mongo (names only, no bios)."""
+        signature = await self._current_signature()
+        cursor = heroes_collection.find({}, {"name": 1, "search": 1}).sort("_id", 1)
+        heroes = [h async for h in cursor]
+        self.build(heroes)
+        self._signature = signature
+        await self.load_popularity()
+        logger.info(f"🔎 Hero search index loaded: {len(self)} heroes, {len(self._postings)} grams")
+
+    async def load_popularity(self):
+        """Boosts from the all-time heroes leaderboard."""
+        self.set_popularity(await cache.zrange(board_key("heroes"), 0, -1, withscores=True))
+
+    def set_popularity(self, rows):
+        """(hero id, searches) rows -> boosts, log-scaled to 0..POPULARITY_WEIGHT."""
+        if not rows:
+            return
+        if self._id_positions is None:
+            self._id_positions = {str(hero_id): pos for pos, hero_id in enumerate(self._ids)}
+        top = math.log1p(max(score for _, score in rows)) or 1.0
+        self._popularity = {
+            self._id_positions[member]: POPULARITY_WEIGHT * math.log1p(score) / top
+            for member, score in rows
+            if member in self._id_positions and score > 0
+        }
+        self._popular = sorted(self._popularity, key=self._popularity.get, reverse=True)[:POPULAR_CANDIDATES]
+
+    async def refresh_if_changed(self):
+        """Reload only when the collection looks different from the last load."""
+        if await self._current_signature() != self._signature:
+            await self.load()
+        else:
+            await self.load_popularity()
+
+    async def run_refresh_loop(self, interval: int = SEARCH_INDEX_REFRESH):
+        """Background task keeping the index fresh."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.warning(f"⚠️ Search index refresh failed: {e}")
+
+
+search_index = HeroSearchIndex()
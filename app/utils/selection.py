@@ -0,0 +1,109 @@
+import hashlib
+import random
+from datetime import datetime
+from loguru import logger
+from app.db.mongo import heroes_collection
+from app.db.redis_db import cache
+from app.utils.browse import hero_browser, ORD_FIELD
+
+ROUNDS = 4
+
+
+# ---------------------
+# 🔹 O(1)-STATE SHUFFLE
+# ---------------------
+def _feistel(value: int, half_bits: int, seed: str) -> int:
+    """Keyed bijection on [0, 2**(2*half_bits))."""
+    mask = (1 << half_bits) - 1
+    left, right = value >> half_bits, value & mask
+    for r in range(ROUNDS):
+        digest = hashlib.sha256(f"{seed}:{r}:{right}".encode()).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:8], "big") & mask)
+    return (left << half_bits) | right
+
+
+def permuted_index(step: int, n: int, seed: str) -> int:
+    """
+    The step-th element of a pseudo-random permutation of range(n).
+    Cycle-walks a Feistel network, so no list of n items is ever built.
+    """
+    half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+    value = step
+    while True:
+        value = _feistel(value, half_bits, seed)
+        if value < n:
+            return value
+
+
+# ---------------------
+# 🔹 HERO LOOKUPS
+# ---------------------
+async def sample_hero(match: dict = None):
+    """One uniformly random hero via $sample."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$sample": {"size": 1}})
+    async for hero in heroes_collection.aggregate(pipeline):
+        return hero
+    return None
+
+
+async def anniversary_hero(today: datetime = None):
+    """A hero whose death date (DD.MM.YYYY) falls on today's day and month, if any."""
+    today = today or datetime.now()
+    return await sample_hero({"date.dead": {"$regex": f"^{today.day:02d}\\.{today.month:02d}\\."}})
+
+
+async def weighted_war_hero(war_weights: dict[str, float]):
+    """Pick a war by weight, then a random hero from it."""
+    wars = [w for w, weight in war_weights.items() if weight > 0]
+    if not wars:
+        return None
+    war = random.choices(wars, weights=[war_weights[w] for w in wars])[0]
+    return await sample_hero({"war": war})
+
+
+# ---------------------
+# 🔹 NO-REPEAT ROTATION
+# ---------------------
+async def next_in_rotation(scope: str):
+    """
+    Next hero of a per-scope rotation (e.g. "daily" or "channel:<id>"):
+    every hero comes once before any repeats. The permutation runs over the
+    stable browse ordinals (heroes.ord), so each pick is one indexed
+    find_one. State is {n, seed, step} in Redis; when the number of
+    ordinals changes (heroes added, or a renumber) a new cycle starts.
+    """
+    key = f"rotation:{scope}"
+    state = await cache.hgetall(key)
+    n = await hero_browser.last_ordinal() + 1
+    if not n:
+        return None
+    step = int(state.get("step", 0))
+    seed = state.get("seed")
+
+    if int(state.get("n", 0)) != n or step >= n:
+        seed, step = f"{random.getrandbits(64):x}", 0
+
+    hero = None
+    while hero is None and step < n:
+        hero = await heroes_collection.find_one({ORD_FIELD: permuted_index(step, n, seed)})
+        step += 1  # ordinals of deleted heroes are skipped
+
+    await cache.hset(key, mapping={"n": n, "seed": seed, "step": step})
+    return hero
+
+
+async def pick_hero(scope: str, war_weights: dict[str, float] = None, anniversary: bool = False):
+    """Hero selection for scheduled posts: anniversary → war weighting → rotation → $sample."""
+    hero = None
+    if anniversary:
+        hero = await anniversary_hero()
+    if hero is None and war_weights:
+        hero = await weighted_war_hero(war_weights)
+    if hero is None:
+        hero = await next_in_rotation(scope)
+    if hero is None:
+        hero = await sample_hero()
+    if hero is not None:
+        logger.info(f"🎲 Picked hero {hero['_id']} for {scope}")
+    return hero
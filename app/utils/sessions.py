@@ -0,0 +1,147 @@
+import json
+import time
+from uuid import uuid4
+from bson import ObjectId
+from app.db.redis_db import cache
+from app.db.mongo import heroes_collection
+from app.config.settings import SESSION_TTL, SESSION_MAX_BYTES
+
+# ---------------------
+# ⚙️ RESULT SESSIONS
+# ---------------------
+# rs:<token>   → {"ids": "<24-hex><24-hex>...", "pages": {"<index>": {...}}}
+# rs:lru       → token → last access time (eviction order)
+# rs:size      → token → payload bytes
+# rs:bytes     → total payload bytes of live sessions
+#
+# Ids are packed as fixed-width ObjectId hex: every hero _id is an ObjectId
+# (Mongo assigns it; the scraper and ingest never set their own).
+# A token's rs:lru score moves with its TTL, so a score older than
+# SESSION_TTL means the payload has expired; such tokens are reaped from the
+# bookkeeping on the next create_session. Whoever removes a token from
+# rs:lru (ZPOPMIN / ZREM) owns it and is the only one to subtract its bytes.
+SESSION_PREFIX = "rs:"
+LRU_KEY = "rs:lru"
+SIZE_KEY = "rs:size"
+BYTES_KEY = "rs:bytes"
+ID_LEN = 24
+REAP_BATCH = 256
+REAP_GRACE = 60  # seconds past the TTL before a token counts as expired
+
+
+def neighbour_indexes(index: int, total: int) -> list[int]:
+    """Pages reachable with one ⬅️/➡️ click from index."""
+    return sorted({(index - 1) % total, (index + 1) % total} - {index % total})
+
+
+async def prefetch_pages(ids: list, index: int, total: int, render) -> dict:
+    """Load the neighbouring heroes once and keep render(hero, i, total) for each page."""
+    wanted = {ObjectId(str(ids[i])): i for i in neighbour_indexes(index, total)}
+    if not wanted:
+        return {}
+    pages = {}
+    async for hero in heroes_collection.find({"_id": {"$in": list(wanted)}}):
+        i = wanted[hero["_id"]]
+        pages[str(i)] = render(hero, i, total)
+    return pages
+
+
+def queue_session(pipe, ids: list, pages: dict = None) -> tuple[str, int]:
+    """
+    Queue a new session onto a caller's MULTI pipeline; returns its token
+    and the index of its first reply, for settle_session once it has run.
+    """
+    flat = "".join(str(i) for i in ids)
+    if len(flat) != ID_LEN * len(ids):
+        raise ValueError("session ids must be ObjectIds (24 hex characters each)")
+    token = uuid4().hex[:10]
+    payload = json.dumps({"ids": flat, "pages": pages or {}}, ensure_ascii=False)
+    size = len(payload.encode())
+    now = time.time()
+
+    at = len(pipe)
+    pipe.set(f"{SESSION_PREFIX}{token}", payload, ex=SESSION_TTL)
+    pipe.zadd(LRU_KEY, {token: now})
+    pipe.hset(SIZE_KEY, token, size)
+    pipe.incrby(BYTES_KEY, size)
+    pipe.zrangebyscore(LRU_KEY, "-inf", now - SESSION_TTL - REAP_GRACE, start=0, num=REAP_BATCH)
+    return token, at
+
+
+async def settle_session(token: str, replies: list, at: int) -> str:
+    """Reap expired sessions and evict over SESSION_MAX_BYTES after queue_session's pipeline ran."""
+    total_bytes, expired = replies[at + 3], replies[at + 4]
+    if expired:
+        total_bytes -= await _release(await _claim(expired))
+    if total_bytes > SESSION_MAX_BYTES:
+        await _evict(total_bytes - SESSION_MAX_BYTES, keep=token)
+    return token
+
+
+async def create_session(ids: list, pages: dict = None) -> str:
+    """Store an ordered hero id list (+ prefetched pages) under a short token."""
+    async with cache.pipeline(transaction=True) as pipe:
+        token, at = queue_session(pipe, ids, pages)
+        replies = await pipe.execute()
+    return await settle_session(token, replies, at)
+
+
+async def get_session(token: str):
+    """Read a session and renew its TTL, in one round trip."""
+    key = f"{SESSION_PREFIX}{token}"
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.get(key)
+        pipe.expire(key, SESSION_TTL)
+        pipe.zadd(LRU_KEY, {token: time.time()}, xx=True)
+        raw, _, _ = await pipe.execute()
+
+    if not raw:
+        # expired before the reaper saw it: drop its bookkeeping now
+        await _release(await _claim([token]))
+        return None
+    data = json.loads(raw)
+    flat = data["ids"]
+    data["ids"] = [flat[i:i + ID_LEN] for i in range(0, len(flat), ID_LEN)]
+    return data
+
+
+async def session_alive(token: str) -> bool:
+    return bool(await cache.exists(f"{SESSION_PREFIX}{token}"))
+
+
+async def _claim(tokens: list) -> list:
+    """Remove tokens from rs:lru; returns the ones this call removed (and so owns)."""
+    async with cache.pipeline(transaction=False) as pipe:
+        for t in tokens:
+            pipe.zrem(LRU_KEY, t)
+        removed = await pipe.execute()
+    return [t for t, n in zip(tokens, removed) if n]
+
+
+async def _release(tokens: list) -> int:
+    """Delete owned sessions and subtract their bytes; returns the bytes freed."""
+    if not tokens:
+        return 0
+    sizes = await cache.hmget(SIZE_KEY, tokens)
+    size = sum(int(s or 0) for s in sizes)
+    async with cache.pipeline(transaction=True) as pipe:
+        pipe.delete(*[f"{SESSION_PREFIX}{t}" for t in tokens])
+        pipe.hdel(SIZE_KEY, *tokens)
+        pipe.decrby(BYTES_KEY, size)
+        await pipe.execute()
+    return size
+
+
+async def _evict(excess: int, keep: str):
+    """Drop least-recently-used sessions until excess bytes are freed."""
+    freed = 0
+    while freed < excess:
+        oldest = await cache.zpopmin(LRU_KEY, 16)
+        if not oldest:
+            break
+        tokens = [t for t, _ in oldest if t != keep]
+        if keep in (t for t, _ in oldest):
+            await cache.zadd(LRU_KEY, {keep: time.time()})
+        if not tokens:
+            break
+        freed += await _release(tokens)
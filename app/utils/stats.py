@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from app.db.mongo import users_collection
+from app.db.redis_db import cache
+from app.config.settings import STATS_RECONCILE_INTERVAL
+
+# ---------------------
+# ⚙️ KEYS
+# ---------------------
+# Running totals, updated on the write path (queue_search / remember_user);
+# per-user/hero/war rankings live in app/utils/leaderboard.py
+USERS_KEY = "users:set"                      # every known user id; SCARD = total users
+LEGACY_USERS_KEY = "stats:users"             # the profile screen's old user set, folded into USERS_KEY
+SEARCHES_KEY = "stats:searches:total"
+LAST_ACTIVE_KEY = "stats:last_active"        # hash: id, username, query, at
+DAILY_SERIES_KEY = "stats:series:day"        # hash YYYY-MM-DD -> searches
+RECONCILED_KEY = "stats:reconciled_at"
+RECONCILE_LOCK = "lock:stats_reconcile"
+
+HOURLY_TTL = 8 * 24 * 3600
+DAU_TTL = 40 * 24 * 3600
+
+
+def dau_key(day: str) -> str:
+    """HyperLogLog of users active on one day."""
+    return f"stats:dau:{day}"
+
+
+def hourly_key(day: str) -> str:
+    """hash HH -> searches for one day."""
+    return f"stats:series:hour:{day}"
+
+
+# ---------------------
+# 🔹 WRITE PATH
+# ---------------------
+def add_search(pipe, user_id: str, searched_at: datetime, query: str, username: str = None):
+    """Queue every counter one search touches onto an existing pipeline."""
+    at = searched_at.astimezone(timezone.utc)
+    day, hour = at.strftime("%Y-%m-%d"), at.strftime("%H")
+
+    pipe.sadd(USERS_KEY, user_id)
+    pipe.incr(SEARCHES_KEY)
+    pipe.pfadd(dau_key(day), user_id)
+    pipe.expire(dau_key(day), DAU_TTL)
+    pipe.hincrby(hourly_key(day), hour, 1)
+    pipe.expire(hourly_key(day), HOURLY_TTL)
+    pipe.hincrby(DAILY_SERIES_KEY, day, 1)
+    pipe.hset(LAST_ACTIVE_KEY, mapping={
+        "id": user_id,
+        "username": username or "",
+        "query": query,
+        "at": at.isoformat(),
+    })
+
+
+# ---------------------
+# 🔹 READ PATH
+# ---------------------
+async def read_global_stats() -> dict:
+    """Totals for /admin, all O(1) reads in one round trip."""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.scard(USERS_KEY)
+        pipe.get(SEARCHES_KEY)
+        pipe.pfcount(dau_key(today))
+        pipe.hgetall(LAST_ACTIVE_KEY)
+        pipe.get(RECONCILED_KEY)
+        total_users, total_searches, dau, last_active, reconciled_at = await pipe.execute()
+
+    return {
+        "total_users": total_users or 0,
+        "total_searches": int(total_searches or 0),
+        "dau": dau or 0,
+        "last_active": last_active or {},
+        "reconciled_at": reconciled_at,
+    }
+
+
+async def read_daily_series(days: int = 7) -> list[tuple[str, int, int]]:
+    """(day, searches, active users) for the last `days` days, oldest first."""
+    today = datetime.now(timezone.utc).date()
+    day_list = [(today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.hmget(DAILY_SERIES_KEY, day_list)
+        for day in day_list:
+            pipe.pfcount(dau_key(day))
+        searches, *actives = await pipe.execute()
+    return [(day, int(s or 0), a or 0) for day, s, a in zip(day_list, searches, actives)]
+
+
+async def read_hourly_series(day: str = None) -> list[int]:
+    """Searches per hour (UTC) of one day."""
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    counts = await cache.hgetall(hourly_key(day))
+    return [int(counts.get(f"{h:02d}", 0)) for h in range(24)]
+
+
+# ---------------------
+# 🔹 RECONCILIATION
+# ---------------------
+async def reconcile(batch_size: int = 1000):
+    """
+    Bring the running totals in line with Mongo: add users that only exist
+    there (e.g. from before the counters) and never let the search total
+    fall below the sum of users.search_count.
+    """
+    if await cache.exists(LEGACY_USERS_KEY):
+        async with cache.pipeline(transaction=True) as pipe:
+            pipe.sunionstore(USERS_KEY, [USERS_KEY, LEGACY_USERS_KEY])
+            pipe.delete(LEGACY_USERS_KEY)
+            await pipe.execute()
+        logger.info(f"📊 Folded {LEGACY_USERS_KEY} into {USERS_KEY}")
+
+    added, batch = 0, []
+
+    async def push():
+        nonlocal added
+        async with cache.pipeline(transaction=False) as pipe:
+            for user_id in batch:
+                pipe.sadd(USERS_KEY, user_id)
+            added += sum(await pipe.execute())
+        batch.clear()
+
+    async for user in users_collection.find({}, {"id": 1, "_id": 0}):
+        if user.get("id") is not None:
+            batch.append(str(user["id"]))
+        if len(batch) >= batch_size:
+            await push()
+    if batch:
+        await push()
+
+    pipeline = [{"$group": {"_id": None, "total": {"$sum": "$search_count"}}}]
+    agg = [a async for a in users_collection.aggregate(pipeline)]
+    mongo_searches = agg[0]["total"] if agg else 0
+    current = int(await cache.get(SEARCHES_KEY) or 0)
+    if mongo_searches > current:
+        await cache.set(SEARCHES_KEY, mongo_searches)
+
+    await cache.set(RECONCILED_KEY, datetime.now(timezone.utc).isoformat())
+    logger.info(f"📊 Stats reconciled: +{added} users, searches {max(current, mongo_searches)}")
+
+
+async def run_reconcile_loop(interval: int = STATS_RECONCILE_INTERVAL):
+    """Background reconciliation; a Redis lock keeps it to one replica at a time."""
+    while True:
+        try:
+            lock = cache.lock(RECONCILE_LOCK, timeout=interval, blocking=False)
+            if await lock.acquire():
+                # held until it expires, so other replicas skip this interval
+                await reconcile()
+        except Exception as e:
+            logger.warning(f"⚠️ Stats reconciliation failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import time
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from loguru import logger
+from redis.exceptions import ResponseError, WatchError
+from app.db.redis_db import cache
+from app.config.settings import (
+    UPDATE_SHARDS,
+    UPDATE_STREAM_MAXLEN,
+    WORKER_BATCH,
+    WORKER_CONCURRENCY,
+    SHARD_LEASE,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+)
+
+# ---------------------
+# ⚙️ UPDATE STREAMS
+# ---------------------
+# updates:<shard> — raw Update JSON; a chat always lands on the same shard,
+# and a shard is read by one worker at a time (its lease holder), so per-chat
+# order is kept.
+STREAM_PREFIX = "updates:"
+GROUP = "workers"
+LEASE_PREFIX = "lease:"
+WORKERS_KEY = "workers:alive"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def chat_key(update: dict) -> int:
+    """The chat (or user) an update belongs to; used for sharding."""
+    for field in ("message", "edited_message", "channel_post", "my_chat_member", "chat_member", "chat_join_request"):
+        if field in update:
+            return update[field]["chat"]["id"]
+    if "callback_query" in update:
+        cq = update["callback_query"]
+        message = cq.get("message")
+        return message["chat"]["id"] if message else cq["from"]["id"]
+    for field in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        if field in update:
+            return update[field]["from"]["id"]
+    return update.get("update_id", 0)
+
+
+def stream_for(update: dict) -> str:
+    return f"{STREAM_PREFIX}{chat_key(update) % UPDATE_SHARDS}"
+
+
+def all_streams() -> list[str]:
+    return [f"{STREAM_PREFIX}{shard}" for shard in range(UPDATE_SHARDS)]
+
+
+async def push_update(update: dict):
+    await cache.xadd(
+        stream_for(update),
+        {"u": json.dumps(update, ensure_ascii=False)},
+        maxlen=UPDATE_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+# ---------------------
+# 🔹 INGRESS
+# ---------------------
+def create_ingress_app() -> web.Application:
+    """Webhook endpoint that only enqueues updates; workers do the handling."""
+
+    async def receive(request: web.Request):
+        if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        await push_update(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    return app
+
+
+async def poll_ingress(bot: Bot, allowed_updates: list[str] = None):
+    """Long-polling ingress for setups without a public webhook URL."""
+    await bot.delete_webhook()
+    offset = None
+    logger.info("📥 Polling ingress started")
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.warning(f"⚠️ get_updates failed: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await push_update(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+# ---------------------
+# 🔹 WORKERS
+# ---------------------
+async def _ensure_groups(streams: list[str]):
+    """Create the consumer group where it is missing (BUSYGROUP only if two workers race)."""
+    async with cache.pipeline(transaction=False) as pipe:
+        for stream in streams:
+            pipe.exists(stream)
+        found = await pipe.execute()
+    for stream, exists in zip(streams, found):
+        if exists and any(g["name"] == GROUP for g in await cache.xinfo_groups(stream)):
+            continue
+        try:
+            await cache.xgroup_create(stream, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+class QueueWorker:
+    """
+    One worker process. Shards are balanced through leases: the worker holds
+    lease:updates:<shard> for each shard it reads and takes at most its fair
+    share, ceil(UPDATE_SHARDS / live workers). A stopped worker hands its
+    shards back; a dead one's leases expire. Whoever takes a shard next first
+    XAUTOCLAIMs the entries its previous reader never acked, so nothing is
+    lost and each chat stays in order.
+
+    Every chat is its own lane: its updates run one after another, while
+    other chats go ahead of a slow one. At most WORKER_CONCURRENCY updates
+    are in flight; past that the reader waits.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, name: str,
+                 concurrency: int = WORKER_CONCURRENCY, lease: float = SHARD_LEASE):
+        self.bot = bot
+        self.dp = dp
+        self.name = name
+        self.lease = lease
+        self._slots = asyncio.Semaphore(concurrency)
+        self._owned = set()      # streams this worker holds the lease of
+        self._inflight = {}      # stream -> tasks of its entries being handled
+        self._lanes = {}         # chat -> task of that chat's latest entry
+        self._draining = set()   # streams given away, lease kept until their updates finish
+        self._giving_back = set()
+
+    # ---- leases ----
+    async def _acquire(self, stream: str) -> bool:
+        return bool(await cache.set(f"{LEASE_PREFIX}{stream}", self.name, nx=True, px=int(self.lease * 1000)))
+
+    async def _renew(self) -> set:
+        """Extend every held lease in one transaction; returns the streams no longer held."""
+        streams = sorted(self._owned | self._draining)
+        keys = [f"{LEASE_PREFIX}{stream}" for stream in streams]
+        async with cache.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(*keys)
+                holders = await pipe.mget(keys)
+                pipe.multi()
+                for key, holder in zip(keys, holders):
+                    if holder == self.name:
+                        pipe.pexpire(key, int(self.lease * 1000))
+                await pipe.execute()
+            except WatchError:
+                # a lease changed hands meanwhile: recheck next tick, nothing was extended
+                return set()
+        return {stream for stream, holder in zip(streams, holders) if holder != self.name}
+
+    async def _release(self, stream: str):
+        """Delete a lease only if this worker still holds it."""
+        key = f"{LEASE_PREFIX}{stream}"
+        async with cache.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) == self.name:
+                    pipe.multi()
+                    pipe.delete(key)
+                    await pipe.execute()
+            except WatchError:
+                pass
+
+    async def _balance(self):
+        """Heartbeat, renew held leases, then give away or take shards towards the fair share."""
+        now = time.time()
+        async with cache.pipeline(transaction=False) as pipe:
+            pipe.zadd(WORKERS_KEY, {self.name: now + self.lease})
+            pipe.zremrangebyscore(WORKERS_KEY, "-inf", now)
+            pipe.zcard(WORKERS_KEY)
+            *_, alive = await pipe.execute()
+        share = -(-UPDATE_SHARDS // max(alive, 1))
+
+        if self._owned or self._draining:
+            for stream in await self._renew():
+                self._owned.discard(stream)
+                logger.warning(f"⚠️ {self.name} lost the lease of {stream}")
+        while len(self._owned) > share:
+            stream = max(self._owned)
+            self._owned.discard(stream)
+            task = asyncio.create_task(self._give_back(stream))
+            self._giving_back.add(task)
+            task.add_done_callback(self._giving_back.discard)
+
+        if len(self._owned) < share:
+            streams = all_streams()
+            start = sum(map(ord, self.name)) % len(streams)   # spread first picks between workers
+            for stream in streams[start:] + streams[:start]:
+                if len(self._owned) >= share:
+                    break
+                if stream not in self._owned and await self._acquire(stream):
+                    await self._take(stream)
+
+    async def _take(self, stream: str):
+        """Replay the entries nobody acked (a dead or restarted reader's), then read new ones."""
+        start, replayed = "0-0", 0
+        while True:
+            reply = await cache.xautoclaim(stream, GROUP, self.name, min_idle_time=0, start_id=start, count=WORKER_BATCH)
+            start, entries = reply[0], [e for e in reply[1] if e and e[1]]   # skip trimmed entries
+            for entry in entries:
+                await self._dispatch(stream, entry, claimed=True)
+            replayed += len(entries)
+            if start in ("0-0", b"0-0"):
+                break
+        self._owned.add(stream)
+        if replayed:
+            logger.info(f"♻️ {self.name} replaying {replayed} unacked updates of {stream}")
+
+    async def _give_back(self, stream: str):
+        """Let a shard's running updates finish (it is no longer read), then release its lease."""
+        self._draining.add(stream)
+        try:
+            while self._inflight.get(stream):
+                await asyncio.wait(list(self._inflight[stream]))
+            await self._release(stream)
+        finally:
+            self._draining.discard(stream)
+
+    # ---- handling ----
+    async def _dispatch(self, stream: str, entry, claimed: bool = False):
+        entry_id, fields = entry
+        update = json.loads(fields["u"])
+        chat = chat_key(update)
+        await self._slots.acquire()
+        if not claimed and stream not in self._owned:
+            # given away while waiting for a slot: its next reader claims the entry
+            self._slots.release()
+            return
+        task = asyncio.create_task(self._handle(stream, entry_id, update, self._lanes.get(chat)))
+        self._lanes[chat] = task
+        self._inflight.setdefault(stream, set()).add(task)
+        task.add_done_callback(lambda t: self._finished(stream, chat, t))
+
+    async def _handle(self, stream: str, entry_id: str, update: dict, previous: asyncio.Task = None):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])   # the chat's earlier update goes first
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"❌ Update {entry_id} on {stream} failed: {e}")
+            await cache.xack(stream, GROUP, entry_id)
+        finally:
+            self._slots.release()
+
+    def _finished(self, stream: str, chat: int, task: asyncio.Task):
+        self._inflight[stream].discard(task)
+        if self._lanes.get(chat) is task:
+            del self._lanes[chat]
+
+    async def _read(self):
+        while True:
+            if not self._owned:
+                await asyncio.sleep(min(1.0, self.lease / 3))
+                continue
+            streams = {stream: ">" for stream in sorted(self._owned)}
+            try:
+                response = await cache.xreadgroup(GROUP, self.name, streams, count=WORKER_BATCH, block=1000) or []
+            except Exception as e:
+                logger.warning(f"⚠️ {self.name} read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if isinstance(response, dict):  # RESP3 replies
+                response = response.items()
+            for stream, entries in response:
+                for entry in entries:
+                    await self._dispatch(stream, entry)
+
+    async def run(self):
+        await _ensure_groups(all_streams())
+        reader = asyncio.create_task(self._read())
+        logger.info(f"🛠 {self.name} started")
+        try:
+            while True:
+                try:
+                    await self._balance()
+                except Exception as e:
+                    logger.warning(f"⚠️ {self.name} shard balancing failed: {e}")
+                await asyncio.sleep(self.lease / 3)
+        finally:
+            reader.cancel()
+            streams, self._owned = sorted(self._owned), set()
+            await asyncio.gather(*self._giving_back, *(self._give_back(stream) for stream in streams))
+            await cache.zrem(WORKERS_KEY, self.name)
+            logger.info(f"🛠 {self.name} stopped")
+
+
+async def run_worker(bot: Bot, dp: Dispatcher, index: int):
+    """Consume update shards through the consumer group until cancelled."""
+    await QueueWorker(bot, dp, f"worker-{index}").run()
@@ -1,9 +1,22 @@
+import asyncio
 import datetime
 import os
-import requests
+import time
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from uuid import uuid4
+from loguru import logger
 from PIL import Image, ImageEnhance, ImageFilter, UnidentifiedImageError
+from app.config.settings import (
+    IMAGE_WORKERS,
+    IMAGE_MAX_CONCURRENCY,
+    IMAGE_MAX_PENDING,
+    IMAGE_DEADLINE,
+    IMAGE_FETCH_TIMEOUT,
+    IMAGE_HTTP_POOL,
+)
+from app.utils.metrics import image_seconds, timed
 
 # Armenian date formatting
 def format_armenian_datetime(dt_str: str) -> str:
@@ -19,45 +32,111 @@ def format_armenian_datetime(dt_str: str) -> str:
     return f"{dt.day} {months_hy[dt.month - 1]} {dt.year} թ․, {dt.hour:02d}:{dt.minute:02d}"
 
 
-# Image URLs
-ARMENIAN_FLAG_URL = "https://flagcdn.com/w640/am.png"
+# Static image assets
+FLAG_PATH = "data/flag.png"  # optional bundled background; drawn in code if missing
 LOGO_PATH = "data/logo.png"
 TEMP_PATH = "temp/"
-session = requests.Session()
+CANVAS_SIZE = (800, 800)
+FLAG_COLORS = ((217, 0, 18), (0, 51, 160), (242, 168, 0))  # red, blue, apricot
 
+# Hero-independent layers, built once and only ever read by render workers
+_background: Image.Image | None = None
+_logo: Image.Image | None = None
 
-def safe_download_image(url: str):
-    """Efficient downloader with persistent session."""
-    headers = {"User-Agent": "Mozilla/5.0"}
+# Image pipeline: pooled async HTTP, bounded render pool, backpressure
+IMAGE_POOL = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="compose")
+_compose_slots = asyncio.Semaphore(IMAGE_MAX_CONCURRENCY)
+_pending = 0
+_http_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session (connection pool) for image fetches."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            headers={"User-Agent": "Mozilla/5.0"},
+            timeout=aiohttp.ClientTimeout(total=IMAGE_FETCH_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=IMAGE_HTTP_POOL, ttl_dns_cache=300),
+        )
+    return _http_session
+
+
+def compose_pending() -> int:
+    """Compositions queued or running right now."""
+    return _pending
+
+
+async def close_image_pipeline():
+    """Close the HTTP pool and let running renders finish (call on shutdown)."""
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    await asyncio.to_thread(IMAGE_POOL.shutdown, wait=True)
+
+
+@timed(image_seconds, ("download",))
+async def safe_download_image(url: str):
+    """Non-blocking download; returns raw bytes or None."""
     try:
-        with session.get(url, headers=headers, timeout=10) as r:
+        async with get_http_session().get(url) as r:
             r.raise_for_status()
-            img = Image.open(BytesIO(r.content))
-            img.load()
-            return img
-    except (requests.RequestException, UnidentifiedImageError) as e:
-        print(f"⚠️ Failed to load image: {url} ({e})")
+            return await r.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"⚠️ Failed to load image: {url} ({e})")
         return None
 
 
-# Compose optimized
-async def compose_hero_image(hero_img_url: str) -> str:
-    os.makedirs(TEMP_PATH, exist_ok=True)
-    out_path = os.path.join(TEMP_PATH, f"hero_{uuid4().hex[:6]}.png")
-
+def _open_image(data: bytes):
+    if not data:
+        return None
     try:
-        # Load background
-        flag = safe_download_image(ARMENIAN_FLAG_URL)
-        if not flag:
-            raise RuntimeError("Flag image could not be loaded")
-        flag = flag.convert("RGB").resize((800, 800), Image.LANCZOS)
-        flag = ImageEnhance.Brightness(flag).enhance(0.85)
+        img = Image.open(BytesIO(data))
+        img.load()
+        return img
+    except UnidentifiedImageError as e:
+        logger.warning(f"⚠️ Failed to decode image ({e})")
+        return None
+
+
+def _build_flag() -> Image.Image:
+    if os.path.exists(FLAG_PATH):
+        return Image.open(FLAG_PATH).convert("RGB").resize(CANVAS_SIZE, Image.LANCZOS)
+    width, height = CANVAS_SIZE
+    stripe = height // len(FLAG_COLORS)
+    flag = Image.new("RGB", CANVAS_SIZE, FLAG_COLORS[-1])
+    for i, color in enumerate(FLAG_COLORS[:-1]):
+        flag.paste(color, (0, i * stripe, width, (i + 1) * stripe))
+    return flag
+
+
+def load_static_layers():
+    """Build the dimmed flag background and the scaled logo (no network needed)."""
+    global _background, _logo
+    _background = ImageEnhance.Brightness(_build_flag()).enhance(0.85).convert("RGBA")
+
+    if os.path.exists(LOGO_PATH):
+        logo = Image.open(LOGO_PATH).convert("RGBA")
+        size = int(CANVAS_SIZE[0] * 0.18)
+        _logo = logo.resize((size, int(size * logo.height / logo.width)), Image.LANCZOS)
 
+
+def _render_hero_image(hero_data: bytes, out_path: str) -> str:
+    """CPU-bound Pillow work; runs on IMAGE_POOL, never on the event loop."""
+    if _background is None:
+        load_static_layers()
+
+    # write next to the target and rename, so readers never see a half-written file
+    tmp_path = f"{out_path}.{uuid4().hex[:6]}.tmp"
+
+    try:
         # Load hero
-        hero = safe_download_image(hero_img_url)
+        hero = _open_image(hero_data)
         if not hero:
-            flag.save(out_path, "PNG")
-            return out_path
+            # flag-only fallback goes to a throwaway file so it never lands in the render cache
+            os.makedirs(TEMP_PATH, exist_ok=True)
+            fallback_path = os.path.join(TEMP_PATH, f"hero_{uuid4().hex[:6]}.png")
+            _background.convert("RGB").save(fallback_path, "PNG")
+            return fallback_path
         hero = hero.convert("RGBA")
 
         # Crop transparent edges if any
@@ -66,28 +145,79 @@ async def compose_hero_image(hero_img_url: str) -> str:
             hero = hero.crop(bbox)
 
         # Resize hero to full 100%
-        hero = hero.resize(flag.size, Image.LANCZOS)
+        hero = hero.resize(CANVAS_SIZE, Image.LANCZOS)
 
         # Add soft shadow for depth
-        shadow = hero.copy().convert("RGBA").filter(ImageFilter.GaussianBlur(8))
-        shadow_layer = Image.new("RGBA", flag.size, (0, 0, 0, 0))
+        shadow = hero.filter(ImageFilter.GaussianBlur(8))
+        shadow_layer = Image.new("RGBA", CANVAS_SIZE, (0, 0, 0, 0))
         shadow_layer.paste(shadow, (10, 10), shadow)
-        flag = Image.alpha_composite(flag.convert("RGBA"), shadow_layer)
+        flag = Image.alpha_composite(_background, shadow_layer)
 
         # Overlay hero (full)
         flag.paste(hero, (0, 0), hero)
 
         # Add logo top-right (z-index 999)
-        if os.path.exists(LOGO_PATH):
-            logo = Image.open(LOGO_PATH).convert("RGBA")
-            size = int(flag.width * 0.18)
-            logo = logo.resize((size, int(size * logo.height / logo.width)), Image.LANCZOS)
-            flag.paste(logo, (flag.width - logo.width - 20, flag.height - logo.height - 20), logo)
-
-        flag.save(out_path, "PNG", optimize=True)
-        print(f"✅ Optimized hero image saved: {out_path}")
+        if _logo is not None:
+            flag.paste(_logo, (flag.width - _logo.width - 20, flag.height - _logo.height - 20), _logo)
+
+        flag.save(tmp_path, "PNG", optimize=True)
+        os.replace(tmp_path, out_path)
+        logger.debug(f"✅ Optimized hero image saved: {out_path}")
         return out_path
 
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+async def _compose_limited(hero_img_url: str, out_path: str) -> str:
+    async with _compose_slots:
+        hero_data = await safe_download_image(hero_img_url)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(IMAGE_POOL, _render_hero_image, hero_data, out_path)
+        finally:
+            image_seconds.observe(("render",), time.perf_counter() - started)
+
+
+def _compose_done(job: asyncio.Future):
+    """Release the job's _pending count once its render has finished."""
+    global _pending
+    _pending -= 1
+    if not job.cancelled():
+        job.exception()  # mark it retrieved: a timed-out caller no longer waits for it
+
+
+# Compose optimized
+@timed(image_seconds, ("compose",))
+async def compose_hero_image(hero_img_url: str, out_path: str = None) -> str:
+    """
+    Render the hero over the flag and return the file path.
+    Falls back to the raw hero_img_url when the pipeline is saturated,
+    the IMAGE_DEADLINE passes, or rendering fails.
+    """
+    global _pending
+    if out_path is None:
+        out_path = os.path.join(TEMP_PATH, f"hero_{uuid4().hex[:6]}.png")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    if _pending >= IMAGE_MAX_PENDING:
+        logger.warning(f"⚠️ Compose queue full ({_pending}), sending raw image")
+        return hero_img_url
+
+    # the job owns its slot and its _pending count until the render really
+    # ends; the deadline only stops waiting for it, so a timed-out render
+    # still counts against IMAGE_MAX_PENDING and compose_pending()
+    _pending += 1
+    job = asyncio.ensure_future(_compose_limited(hero_img_url, out_path))
+    job.add_done_callback(_compose_done)
+    try:
+        return await asyncio.wait_for(asyncio.shield(job), IMAGE_DEADLINE)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ Compose deadline exceeded: {hero_img_url}")
+        return hero_img_url
     except Exception as e:
-        print(f"⚠️ Fast compose failed: {e}")
+        logger.warning(f"⚠️ Fast compose failed: {e}")
         return hero_img_url
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+from bson import ObjectId
+from loguru import logger
+from app.db.mongo import heroes_collection
+from app.db.redis_db import cache
+from app.utils.cache import get_heroes_version
+from app.utils.captions import build_caption
+from app.config.settings import SEARCH_INDEX_REFRESH
+
+CATALOGUE_KEY = "wars:catalogue"
+
+
+def war_id(name: str) -> str:
+    """Stable short id of a war, safe for callback_data and the same in every process."""
+    return hashlib.sha1(name.encode()).hexdigest()[:8]
+
+
+# ---------------------
+# 🔹 WAR CATALOGUE
+# ---------------------
+class WarCatalogue:
+    """
+    Every war with its hero count, ordered hero ids and first page, kept in
+    process memory and shared through Redis. Rebuilt from Mongo only when
+    heroes:version changes (i.e. after an ingest).
+    """
+
+    def __init__(self):
+        self._wars = {}       # id -> {"name", "ids", "first"}
+        self._order = []      # ids sorted by war name
+        self._version = None
+
+    def __len__(self):
+        return len(self._order)
+
+    @property
+    def version(self):
+        """heroes:version the catalogue was built from."""
+        return self._version
+
+    def wars(self) -> list[tuple[str, str, int]]:
+        """(id, name, hero count) for the menu."""
+        return [(wid, self._wars[wid]["name"], len(self._wars[wid]["ids"])) for wid in self._order]
+
+    def get(self, wid: str):
+        return self._wars.get(wid)
+
+    def _install(self, data: dict):
+        wars = {}
+        for war in data["wars"]:
+            ids = war["ids"]
+            wars[war["id"]] = {
+                "name": war["name"],
+                "ids": [ObjectId(ids[i:i + 24]) for i in range(0, len(ids), 24)],
+                "first": war["first"],
+            }
+        self._wars = wars
+        self._order = sorted(wars, key=lambda wid: wars[wid]["name"])
+        self._version = data["version"]
+
+    async def rebuild(self):
+        """One aggregation for every war's ids, one $in for the first heroes; saved to Redis."""
+        version = await get_heroes_version()
+        pipeline = [
+            {"$match": {"war": {"$nin": [None, ""]}}},
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$war", "ids": {"$push": "$_id"}}},
+        ]
+        groups = [g async for g in heroes_collection.aggregate(pipeline)]
+        first_ids = [g["ids"][0] for g in groups]
+        firsts = {h["_id"]: h async for h in heroes_collection.find({"_id": {"$in": first_ids}})}
+
+        wars = []
+        for group in groups:
+            first = firsts.get(group["ids"][0])
+            if first is None:
+                continue
+            wars.append({
+                "id": war_id(group["_id"]),
+                "name": group["_id"],
+                "ids": "".join(str(i) for i in group["ids"]),
+                "first": {
+                    "caption": build_caption(first, 0, len(group["ids"])),
+                    "img_url": first["img_url"],
+                },
+            })
+
+        data = {"version": version, "wars": wars}
+        await cache.set(CATALOGUE_KEY, json.dumps(data, ensure_ascii=False))
+        self._install(data)
+        logger.info(f"⚔️ War catalogue built: {len(wars)} wars")
+
+    async def load(self):
+        """Use the shared Redis copy if it is current, else rebuild it."""
+        version = await get_heroes_version()
+        raw = await cache.get(CATALOGUE_KEY)
+        if raw:
+            data = json.loads(raw)
+            if data.get("version") == version:
+                self._install(data)
+                logger.info(f"⚔️ War catalogue loaded: {len(self)} wars")
+                return
+        await self.rebuild()
+
+    async def refresh_if_changed(self):
+        if await get_heroes_version() != self._version:
+            await self.load()
+
+    async def run_refresh_loop(self, interval: int = SEARCH_INDEX_REFRESH):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.warning(f"⚠️ War catalogue refresh failed: {e}")
+
+
+war_catalogue = WarCatalogue()
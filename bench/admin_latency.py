@@ -0,0 +1,110 @@
+"""
+/admin data latency: full-collection Mongo queries vs Redis counters and leaderboards.
+
+    python bench/admin_latency.py [--users 1000000] [--runs 5] [--live]
+
+By default runs in-process on mongomock + fakeredis (needs both installed);
+--live uses MONGO_URI / REDIS_* from the environment and writes seeded
+documents/keys there, so point it at a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _patch_backends():
+    import fakeredis
+    import mongomock_motor
+    import app.db.mongo as mongo
+    import app.db.redis_db as redis_db
+
+    db = mongomock_motor.AsyncMongoMockClient()["bench"]
+    mongo.users_collection = db["users"]
+    redis_db.cache = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def seed(users_collection, cache, count: int):
+    from app.utils import leaderboard, stats
+
+    now = datetime.now(timezone.utc)
+    batch = []
+    for i in range(count):
+        batch.append({
+            "id": str(i),
+            "username": f"user{i}",
+            "search_count": random.randint(0, 500),
+            "updated_at": now - timedelta(seconds=i),
+        })
+        if len(batch) == 10000:
+            await users_collection.insert_many(batch)
+            batch = []
+    if batch:
+        await users_collection.insert_many(batch)
+
+    async with cache.pipeline(transaction=False) as pipe:
+        for i in range(0, count, 10000):
+            pipe.sadd(stats.USERS_KEY, *[str(j) for j in range(i, min(i + 10000, count))])
+            pipe.zadd(leaderboard.board_key("users"), {str(j): random.randint(0, 500) for j in range(i, min(i + 10000, count))})
+        pipe.set(stats.SEARCHES_KEY, count * 250)
+        await pipe.execute()
+
+
+async def admin_before(users_collection):
+    """What /admin used to run on every call."""
+    await users_collection.count_documents({})
+    pipeline = [{"$group": {"_id": None, "total_searches": {"$sum": "$search_count"}}}]
+    [a async for a in users_collection.aggregate(pipeline)]
+    await users_collection.find_one(sort=[("updated_at", -1)])
+    [u async for u in users_collection.find().sort("search_count", -1).limit(5)]
+
+
+async def admin_after():
+    from app.utils import leaderboard, stats
+
+    await stats.read_global_stats()
+    await stats.read_daily_series(7)
+    for board in leaderboard.BOARDS:
+        for window in leaderboard.WINDOWS:
+            await leaderboard.top(board, window, 5)
+
+
+async def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"median_ms": round(samples[len(samples) // 2], 2), "max_ms": round(samples[-1], 2)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    if not args.live:
+        _patch_backends()
+    from app.db.mongo import users_collection
+    from app.db.redis_db import cache
+
+    started = time.perf_counter()
+    await seed(users_collection, cache, args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    before = await timed(lambda: admin_before(users_collection), args.runs)
+    after = await timed(admin_after, args.runs)
+    print(json.dumps({"users": args.users, "backend": "live" if args.live else "mock", "before": before, "after": after}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
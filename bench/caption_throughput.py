@@ -0,0 +1,106 @@
+"""
+Captions per second on the read path (app/utils/captions.py).
+
+    python bench/caption_throughput.py [--heroes 20000] [--views 100000] [--min-speedup 20]
+
+Builds --heroes synthetic heroes with ~2 KB HTML bios, stores captions on
+them the way app.ingest does, then times --views build_caption() calls
+(random heroes, random index/total) three ways:
+
+  before     the regexes run on every view (what the handlers did before
+             captions were stored: render_caption + footer);
+  stored     build_caption on ingested heroes, the stored caption plus the
+             footer;
+  memoized   build_caption on documents without a stored caption (never
+             re-ingested), rendered once per _id and then memoized.
+
+Runs inside an event loop, so background tasks a render schedules get to
+run; every heroes collection call they make is counted, and the read path
+must make none. Exits 1 if stored is not --min-speedup times faster than
+before, or if rendering touched the collection.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class CountingHeroes:
+    """Stands in for heroes_collection and counts every method called on it."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            self.calls += 1
+        return call
+
+
+def make_hero(i: int, rng: random.Random) -> dict:
+    sentences = [f"Նա ծնվել է {1960 + i % 40} թվականին Երևանում" for _ in range(3)]
+    sentences += [f"Կռվել է {rng.randint(1, 99)} օր, պարգևատրվել է մեդալով" for _ in range(rng.randint(8, 14))]
+    return {
+        "_id": f"{i:024x}",
+        "name": {"first": f"Անուն{i}", "last": f"Ազգանուն{i}յան"},
+        "date": {"birth": "1990 թ․", "dead": "2020 թ․"},
+        "region": "Երևան",
+        "war": "Արցախյան պատերազմ",
+        "bio": "".join(f"<p>{s}։</p>" for s in sentences),
+    }
+
+
+def rate(fn, heroes: list, views: int, rng: random.Random) -> float:
+    picks = [(rng.choice(heroes), rng.randrange(50), 50) for _ in range(views)]
+    started = time.perf_counter()
+    for hero, index, total in picks:
+        fn(hero, index, total)
+    return round(views / (time.perf_counter() - started))
+
+
+async def main(args) -> bool:
+    import app.db.mongo as mongo
+
+    heroes_collection = mongo.heroes_collection = CountingHeroes()
+    from app.utils import captions
+
+    captions.heroes_collection = heroes_collection
+    rng = random.Random(5)
+    raw = [make_hero(i, rng) for i in range(args.heroes)]
+    started = time.perf_counter()
+    ingested = [{**hero, "caption": captions.prepare_caption(hero)} for hero in raw]
+    ingest_s = time.perf_counter() - started
+
+    def before(hero, index, total):
+        return f"{captions.render_caption(hero)['body']}\n\n<i>{index + 1}/{total}</i>"
+
+    # the per-view regex path is slow, so it gets a tenth of the views
+    report = {
+        "heroes": args.heroes,
+        "ingest_captions_per_s": round(args.heroes / ingest_s),
+        "before_per_s": rate(before, raw, max(1, args.views // 10), rng),
+        "stored_per_s": rate(captions.build_caption, ingested, args.views, rng),
+        "memoized_per_s": rate(captions.build_caption, raw[:captions.MEMO_SIZE], args.views, rng),
+    }
+    await asyncio.sleep(0.1)   # let any write-behind tasks run
+    report["speedup"] = round(report["stored_per_s"] / report["before_per_s"], 1)
+    report["collection_calls"] = heroes_collection.calls
+    report["same_text"] = all(
+        captions.build_caption(h, 0, 1) == before(r, 0, 1) for h, r in zip(ingested[:200], raw[:200])
+    )
+    report["min_speedup"] = args.min_speedup
+    print(json.dumps(report, indent=2))
+    return report["speedup"] >= args.min_speedup and not report["collection_calls"] and report["same_text"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=20000)
+    parser.add_argument("--views", type=int, default=100000)
+    parser.add_argument("--min-speedup", type=float, default=20)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
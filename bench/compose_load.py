@@ -0,0 +1,159 @@
+"""
+Handler latency while hero images are being composed (app/utils/util.py).
+
+    python bench/compose_load.py [--compositions 50] [--seconds 5] [--rate 200]
+                                 [--host-delay-ms 200] [--deadline 8] [--budget-ms 25]
+
+Serves a generated hero photo from a local aiohttp server (each response
+held back by --host-delay-ms, like a slow image host) and times a probe
+"handler" started at a fixed rate (open loop, so a blocked event loop shows
+up as lateness). The probe runs once with the pipeline idle and once while
+--compositions callers keep compose_hero_image busy. Reports probe
+p50/p99 for both phases, compositions done / fallen back to the raw URL,
+and the most compositions pending and jobs queued on the render pool at
+once. Exits 1 if the loaded p99 is more than --budget-ms above the idle
+p99, or if pending work ever exceeded IMAGE_MAX_PENDING.
+
+Render threads share the GIL with the loop for the Python parts of a
+render, so on a single core the loaded p99 sits a few GIL switch intervals
+(5 ms each) above idle; with more cores it stays within a few ms.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def hero_png() -> bytes:
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGBA", (600, 800), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 300, 12):
+        draw.ellipse((i, i, 600 - i, 800 - i), outline=(i % 255, 80, 200 - i % 200, 255), width=5)
+    buf = BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+async def start_image_host(delay_s: float):
+    from aiohttp import web
+
+    body = hero_png()
+
+    async def photo(request):
+        await asyncio.sleep(delay_s)
+        return web.Response(body=body, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/hero/{n}.png", photo)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def probe():
+    """A light handler: a few awaits and a little Python work, no I/O."""
+    for _ in range(3):
+        await asyncio.sleep(0)
+    json.dumps({"chat": 1, "text": "Արամ Պետրոսյան", "ids": list(range(20))})
+
+
+async def run_probes(seconds: float, rate: float) -> list:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    timings, tasks = [], []
+
+    async def one(due: float):
+        await probe()
+        timings.append((loop.time() - due) * 1000)
+
+    for i in range(int(seconds * rate)):
+        due = start + i / rate
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        tasks.append(asyncio.create_task(one(due)))
+    await asyncio.gather(*tasks)
+    return sorted(timings)
+
+
+def percentile(sorted_ms: list, q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+
+def summary(rows: list) -> dict:
+    return {"probes": len(rows), "p50_ms": round(percentile(rows, 0.5), 2), "p99_ms": round(percentile(rows, 0.99), 2)}
+
+
+async def main(args):
+    from app.utils import util
+
+    util.IMAGE_DEADLINE = args.deadline
+    runner, base = await start_image_host(args.host_delay_ms / 1000)
+    out_dir = tempfile.mkdtemp(prefix="compose_load_")
+    util.load_static_layers()
+
+    idle = await run_probes(args.seconds, args.rate)
+
+    done = {"rendered": 0, "fallback": 0}
+    peaks = {"pending": 0, "pool_queue": 0}
+    stop = asyncio.Event()
+
+    async def composer(n: int):
+        i = 0
+        while not stop.is_set():
+            url = f"{base}/hero/{n}-{i}.png"
+            path = await util.compose_hero_image(url, os.path.join(out_dir, f"{n}-{i}.png"))
+            done["fallback" if path == url else "rendered"] += 1
+            i += 1
+            if path == url:
+                await asyncio.sleep(0.05)   # a fallback can return without awaiting anything
+
+    async def watch():
+        while not stop.is_set():
+            peaks["pending"] = max(peaks["pending"], util.compose_pending())
+            peaks["pool_queue"] = max(peaks["pool_queue"], util.IMAGE_POOL._work_queue.qsize())
+            await asyncio.sleep(0.01)
+
+    workers = [asyncio.create_task(composer(n)) for n in range(args.compositions)] + [asyncio.create_task(watch())]
+    await asyncio.sleep(0.5)   # let the pipeline fill up
+    loaded = await run_probes(args.seconds, args.rate)
+    stop.set()
+    await asyncio.gather(*workers)
+    while util.compose_pending():
+        await asyncio.sleep(0.05)
+
+    await util.close_image_pipeline()
+    await runner.cleanup()
+
+    report = {
+        "compositions": args.compositions,
+        "idle": summary(idle),
+        "loaded": summary(loaded),
+        "composed": done,
+        "peak_pending": peaks["pending"],
+        "peak_pool_queue": peaks["pool_queue"],
+        "max_pending": util.IMAGE_MAX_PENDING,
+        "budget_ms": args.budget_ms,
+    }
+    print(json.dumps(report, indent=2))
+    flat = report["loaded"]["p99_ms"] - report["idle"]["p99_ms"] <= args.budget_ms
+    return flat and peaks["pending"] <= util.IMAGE_MAX_PENDING
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compositions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--host-delay-ms", type=float, default=200)
+    parser.add_argument("--deadline", type=float, default=8)
+    parser.add_argument("--budget-ms", type=float, default=25)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,197 @@
+"""
+Offline checks of the crawler (scarper.py) against a local stub of the site.
+
+    python bench/crawl_offline.py [--pages 6] [--per-page 12] [--compact-every 4]
+
+Serves generated list and bio pages shaped like zinapah.am's from a local
+aiohttp server (bios carry ETags and answer If-None-Match with 304; page 2
+first answers 429 with an HTTP-date Retry-After, page 3 a 503, one bio a
+404) and runs the Crawler against it with SCRAPER_BASE_URL-style base_url:
+
+  * a crawl cut off after page 2, then resumed from the checkpoint: every
+    hero is written exactly once and no bio is fetched twice, and the hero
+    whose bio failed is retried at the end of the run, not written bio-less;
+  * a --recrawl after one bio and one portrait changed: every hero is
+    written again, only the changed bio is downloaded, and 304'd records
+    keep their bio while picking up the new list-page fields;
+  * the state journal reloads to the same state and is folded into the
+    snapshot every --compact-every pages.
+
+Prints a JSON report and exits 1 if a check fails.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scarper import Crawler, CrawlState, NdjsonSink, retry_delay  # noqa: E402
+
+
+class StubSite:
+    """List pages at /heroes?page=N and bios at /heroes/bio/<i>, with request counters."""
+
+    def __init__(self, pages: int, per_page: int):
+        self.pages = pages
+        self.per_page = per_page
+        self.last_page = pages   # pages past this answer 404, as if the site went away
+        self.bio_version = {}
+        self.img_version = {}
+        self.counts = {"list": 0, "bio_200": 0, "bio_304": 0, "bio_404": 0, "429": 0, "503": 0}
+        self.flaky_bios = set()   # bios that answer 404 once
+        self._throttled = set()
+
+    def list_page(self, page: int) -> str:
+        items = []
+        if page <= self.pages:
+            for i in range((page - 1) * self.per_page, page * self.per_page):
+                items.append(
+                    f'<div class="soldier-item">'
+                    f'<img class="soldier-item__img" src="/img/{i}-{self.img_version.get(i, 0)}.jpg">'
+                    f'<div class="soldier-item__name">Անուն{i} Ազգանուն{i}</div>'
+                    f'<div class="soldier-item__date">1990 - 2020</div>'
+                    f'<div class="soldier-item__region">Մարզ {i % 11}</div>'
+                    f'<div class="soldier-item__war">Պատերազմ {i % 3}</div>'
+                    f'<a class="soldier-item__bio-link" href="/heroes/bio/{i}">Կենսագրություն</a>'
+                    f'</div>'
+                )
+        return f"<html><body>{''.join(items)}</body></html>"
+
+    def bio_page(self, i: int) -> str:
+        return (
+            '<div class="soldiers-inner__right"><div class="d-flex flex-column gap-8">'
+            f"<p>Ծնվել է 1990 թ․ Կենսագրություն {i} v{self.bio_version.get(i, 0)}</p>"
+            "</div></div>"
+        )
+
+    async def start(self):
+        from aiohttp import web
+
+        async def heroes(request):
+            page = int(request.query.get("page", 1))
+            if page > self.last_page:
+                return web.Response(status=404)
+            for status, retry_after in ((429, format_datetime(datetime.now(timezone.utc) + timedelta(seconds=1), usegmt=True)),
+                                        (503, "0")):
+                if page == {429: 2, 503: 3}[status] and status not in self._throttled:
+                    self._throttled.add(status)
+                    self.counts[str(status)] += 1
+                    return web.Response(status=status, headers={"Retry-After": retry_after})
+            self.counts["list"] += 1
+            return web.Response(text=self.list_page(page), content_type="text/html")
+
+        async def bio(request):
+            i = int(request.match_info["i"])
+            if i in self.flaky_bios:
+                self.flaky_bios.discard(i)
+                self.counts["bio_404"] += 1
+                return web.Response(status=404)
+            etag = f'"{i}-{self.bio_version.get(i, 0)}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.counts["bio_304"] += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            self.counts["bio_200"] += 1
+            return web.Response(text=self.bio_page(i), content_type="text/html", headers={"ETag": etag})
+
+        app = web.Application()
+        app.router.add_get("/heroes", heroes)
+        app.router.add_get("/heroes/bio/{i}", bio)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/heroes"
+
+
+def read_records(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def crawl(state_path: str, out_path: str, base_url: str, compact_every: int, recrawl=False) -> CrawlState:
+    state = CrawlState(state_path, compact_every=compact_every)
+    if recrawl:
+        state.restart()
+    sink = NdjsonSink(out_path, rotate_bytes=0)
+    try:
+        await Crawler(state, sink, base_url=base_url, rate=1000).run()
+    finally:
+        await sink.close()
+    return state
+
+
+async def main(args) -> bool:
+    logging.getLogger().setLevel(logging.ERROR)
+    heroes = args.pages * args.per_page
+    work = tempfile.mkdtemp(prefix="crawl_offline_")
+    state_path = os.path.join(work, "state.json")
+    site = StubSite(args.pages, args.per_page)
+    base_url = await site.start()
+    report = {"heroes": heroes}
+
+    # first crawl stops after page 2, the resumed one picks up from page 3
+    first_out = os.path.join(work, "first.ndjson")
+    site.last_page = 2
+    site.flaky_bios = {args.per_page + 1}
+    started = time.perf_counter()
+    state = await crawl(state_path, first_out, base_url, args.compact_every)
+    report["interrupted_at_page"] = state.page
+    site.last_page = args.pages
+    state = await crawl(state_path, first_out, base_url, args.compact_every)
+    report["first_crawl_s"] = round(time.perf_counter() - started, 2)
+    records = read_records(first_out)
+    links = [r["bio_link"] for r in records]
+    report["resume_once_each"] = len(links) == heroes and len(set(links)) == heroes
+    report["resume_no_refetch"] = site.counts["bio_200"] == heroes
+    report["failed_bio_retried"] = site.counts["bio_404"] == 1 and all(r["bio"] for r in records)
+    report["retry_after_honoured"] = site.counts["429"] == 1 and site.counts["503"] == 1 and state.page == args.pages
+    first_bios = {r["bio_link"]: r["bio"] for r in records}
+
+    # the journal replays to the same state and is folded away at the end of a run
+    reloaded = CrawlState(state_path)
+    report["state_reloads"] = (reloaded.page, reloaded.seen, reloaded.validators) == (state.page, state.seen, state.validators)
+    report["journal_compacted"] = not os.path.exists(state.journal_path)
+
+    # re-crawl after hero 0's portrait and hero 1's bio changed
+    site.img_version[0] = 1
+    site.bio_version[1] = 1
+    site.counts.update(bio_200=0, bio_304=0)
+    second_out = os.path.join(work, "second.ndjson")
+    await crawl(state_path, second_out, base_url, args.compact_every, recrawl=True)
+    records = {r["bio_link"]: r for r in read_records(second_out)}
+    changed_link = f"{base_url}/bio/1"
+    report["recrawl_all_written"] = len(records) == heroes
+    report["recrawl_bio_downloads"] = site.counts["bio_200"]
+    report["recrawl_only_changed"] = site.counts["bio_200"] == 1 and site.counts["bio_304"] == heroes - 1
+    report["recrawl_keeps_bios"] = all(
+        r["bio"] == first_bios[link] for link, r in records.items() if link != changed_link
+    ) and "v1" in records[changed_link]["bio"]
+    report["recrawl_list_fields"] = records[f"{base_url}/bio/0"]["img_url"].endswith("/img/0-1.jpg")
+    report["recrawl_dates"] = all(r["date"]["birth"] == "1990 թ․" for r in records.values())
+
+    report["retry_delay_parses"] = (
+        retry_delay("Wed, 21 Oct 2015 07:28:00 GMT", 0) == 0
+        and 25 <= retry_delay(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True), 0) <= 30
+        and retry_delay("7", 0) == 7
+        and retry_delay("soon", 2) == 4
+        and retry_delay(None, 1) == 2
+    )
+
+    await site.runner.cleanup()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return all(v for k, v in report.items() if isinstance(v, bool))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--per-page", type=int, default=12)
+    parser.add_argument("--compact-every", type=int, default=4)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,115 @@
+"""
+Per-update cost of the metrics middlewares (app/utils/metrics.py).
+
+    python bench/metrics_overhead.py [--updates 20000] [--runs 5] [--budget-us 50]
+
+Feeds the same message updates through a bare Dispatcher and through one
+with instrument_dispatcher() (runs interleaved, best of --runs each), and
+times the two middlewares alone around a no-op handler, which is the
+stable number. Exits 1 if either exceeds the budget. No network, Mongo or Redis.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.filters import Command
+
+
+def build(instrumented: bool) -> Dispatcher:
+    from app.utils.metrics import instrument_dispatcher
+
+    router = Router()
+
+    @router.message(Command("start"))
+    async def start(message: types.Message):
+        return None
+
+    @router.message()
+    async def echo(message: types.Message):
+        return None
+
+    dp = Dispatcher()
+    if instrumented:
+        instrument_dispatcher(dp)
+    dp.include_router(router)
+    return dp
+
+
+def make_update(i: int) -> types.Update:
+    return types.Update(update_id=i, message=types.Message(
+        message_id=i,
+        date=datetime.now(),
+        chat=types.Chat(id=1, type="private"),
+        from_user=types.User(id=1, is_bot=False, first_name="Bench"),
+        text="Արամ Պետրոսյան",
+    ))
+
+
+async def timed(dp: Dispatcher, bot: Bot, updates: list) -> float:
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+async def middleware_cost(count: int) -> float:
+    """Outer + inner middleware around a no-op handler, minus the bare call."""
+    from types import SimpleNamespace
+    from app.utils.metrics import update_metrics, label_handler
+
+    async def noop(event, data):
+        return None
+
+    async def labelled(event, data):
+        return await label_handler(noop, event, data)
+
+    handler = SimpleNamespace(callback=noop)
+    started = time.perf_counter()
+    for _ in range(count):
+        await noop(None, {"handler": handler})
+    bare = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(count):
+        await update_metrics(labelled, None, {"handler": handler})
+    return (time.perf_counter() - started - bare) / count * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-us", type=float, default=50)
+    args = parser.parse_args()
+
+    bot = Bot(token="42:BENCH")
+    updates = [make_update(i) for i in range(args.updates)]
+    bare, instrumented = build(False), build(True)
+    await timed(bare, bot, updates[:1000])            # warm up both paths
+    await timed(instrumented, bot, updates[:1000])
+
+    bare_us = instrumented_us = middleware_us = float("inf")
+    for _ in range(args.runs):
+        bare_us = min(bare_us, await timed(bare, bot, updates))
+        instrumented_us = min(instrumented_us, await timed(instrumented, bot, updates))
+        middleware_us = min(middleware_us, await middleware_cost(args.updates))
+    overhead = max(instrumented_us - bare_us, middleware_us)
+    print(json.dumps({
+        "updates": args.updates,
+        "bare_us": round(bare_us, 2),
+        "instrumented_us": round(instrumented_us, 2),
+        "middleware_us": round(middleware_us, 2),
+        "budget_us": args.budget_us,
+    }))
+    await bot.session.close()
+    sys.exit(0 if overhead <= args.budget_us else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,403 @@
+"""
+End-to-end replay of synthetic updates through the real Dispatcher.
+
+    python bench/replay.py [--heroes 2000] [--updates 200] [--rate 200] [--scenario NAME ...]
+                           [--mongo mongodb://localhost:27017] [--save]
+
+Builds main.create_dispatcher() with every router on mongomock-motor (or a
+local mongod with --mongo; its erablur_bench database is dropped first) and
+fakeredis, gives the Bot a fake session that records
+API calls instead of sending them, and feeds each scenario at a fixed rate
+(open loop: update i starts at i / rate seconds). Per scenario it reports
+throughput, p50/p95/p99 latency, Mongo calls, Redis round trips and Bot API
+calls per update (background prefetch included) and the prefetch hit rate. --save writes bench/baselines/replay.json; without it the
+run is compared against that file.
+
+Hero photos are served from pre-seeded Telegram file_ids (the steady state),
+so nothing is downloaded or rendered. mongomock scans and copies documents
+in Python, so its latencies overstate anything that touches many heroes;
+the per-update round trip counts are exact either way.
+
+The stand-ins come from requirements-bench.txt (fakeredis, mongomock-motor).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "replay.json")
+BENCH_USERS = 200
+WARS = [f"Պատերազմ {i}" for i in range(1, 13)]
+SYLLABLES = ["ար", "ամ", "վա", "րդ", "գե", "որ", "գի", "սա", "մվե", "լի", "տի", "գր", "նա", "րե", "կո"]
+
+
+# ---------------------
+# 🔹 LOCAL STAND-INS
+# ---------------------
+class CountingCollection:
+    """Counts every Motor call on a collection (a find() counts once, however it is iterated)."""
+
+    def __init__(self, collection, counter: dict):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._counter["mongo"] += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+async def patch_backends(counter: dict, mongo_uri: str = None):
+    """Point app.db at mongomock (or a local mongod) + fakeredis before any handler imports them."""
+    import fakeredis
+    import app.db.mongo as mongo
+    import app.db.redis_db as redis_db
+    from app.utils.metrics import instrument_redis
+
+    if mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_uri)
+        await client.drop_database("erablur_bench")
+        db = client["erablur_bench"]
+    else:
+        import mongomock_motor
+        db = mongomock_motor.AsyncMongoMockClient()["bench"]
+    mongo.db = db
+    for name in ("heroes", "history", "users"):
+        setattr(mongo, f"{name}_collection", CountingCollection(db[name], counter))
+    mongo.channels_collection = CountingCollection(db["connected_channels"], counter)
+    redis_db.cache = instrument_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    return db
+
+
+def make_fake_session(counter: dict):
+    from aiogram import types
+    from aiogram.client.session.base import BaseSession
+
+    message_methods = {"SendMessage", "SendPhoto", "EditMessageMedia", "EditMessageCaption", "EditMessageText"}
+    photo_methods = {"SendPhoto", "EditMessageMedia"}
+
+    class FakeSession(BaseSession):
+        """Answers every Bot API method locally and counts the calls."""
+
+        def __init__(self):
+            super().__init__()
+            self.calls = {}
+            self._message_id = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            name = type(method).__name__
+            self.calls[name] = self.calls.get(name, 0) + 1
+            counter["bot"] += 1
+            if name not in message_methods:
+                return True
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", None) or 1
+            photo = None
+            if name in photo_methods:
+                photo = [types.PhotoSize(file_id=f"f{self._message_id}", file_unique_id=f"u{self._message_id}", width=800, height=800)]
+            return types.Message(
+                message_id=self._message_id,
+                date=datetime.now(timezone.utc),
+                chat=types.Chat(id=chat_id, type="private"),
+                photo=photo,
+            ).as_(bot)   # mounted like a real API reply, so handlers can edit it
+
+        async def stream_content(self, *args, **kwargs):
+            if False:
+                yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+# ---------------------
+# 🔹 SEED DATA
+# ---------------------
+def _word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+async def seed(db, heroes: int):
+    from app.utils.captions import prepare_caption
+    from app.utils.search_index import search_keys
+    from app.utils.image_cache import FILE_ID_KEY, render_key
+    from app.utils.browse import META_KEY
+    from app.utils.cache import get_heroes_version
+    from app.db.redis_db import cache
+
+    rng = random.Random(42)
+    docs = []
+    for i in range(heroes):
+        name = {"first": _word(rng, 2), "last": _word(rng, 3) + "յան"}
+        hero = {
+            "name": name,
+            "war": rng.choice(WARS),
+            "region": "Երևան",
+            "date": {"birth": f"{rng.randint(1960, 2004)}", "dead": f"{rng.choice([1992, 2016, 2020, 2023])}"},
+            "bio": " ".join(_word(rng, 3) for _ in range(60)) + "։",
+            "img_url": f"https://bench.invalid/hero/{i}.jpg",
+            "bio_link": f"https://bench.invalid/bio/{i}",
+            "ord": i,   # as numbered by app.utils.browse
+        }
+        hero["search"] = search_keys(name)
+        hero["caption"] = prepare_caption(hero)
+        docs.append(hero)
+    await db["heroes"].insert_many(docs)
+    await db["users"].insert_many([
+        {"id": str(1000 + u), "username": f"user{u}", "first_name": "Bench", "search_count": rng.randint(0, 50)}
+        for u in range(BENCH_USERS)
+    ])
+    await cache.hset(FILE_ID_KEY, mapping={render_key(h["img_url"]): f"file-{i}" for i, h in enumerate(docs)})
+    # ordinals are already on the documents, so publish the browse total directly
+    await cache.set(META_KEY, json.dumps({"version": await get_heroes_version(), "total": heroes}))
+    return docs
+
+
+# ---------------------
+# 🔹 WORKLOADS
+# ---------------------
+class Workloads:
+    """Generators of update n for every scenario."""
+
+    def __init__(self, heroes: list, admin_id: int, session_token: str):
+        from app.utils.war_catalogue import war_catalogue
+
+        self.rng = random.Random(7)
+        self.heroes = heroes
+        self.admin_id = admin_id
+        self.session_token = session_token
+        self.war_ids = [wid for wid, _, _ in war_catalogue.wars()]
+        self.cursors = {}   # user -> page they are on in the paginate session
+        self.update_id = 0
+
+    def _user(self, user_id: int = None):
+        from aiogram import types
+        user_id = user_id or 1000 + self.rng.randrange(BENCH_USERS)
+        return types.User(id=user_id, is_bot=False, first_name="Bench", username=f"user{user_id - 1000}")
+
+    def _message(self, text: str, user=None):
+        from aiogram import types
+        user = user or self._user()
+        self.update_id += 1
+        return types.Update(update_id=self.update_id, message=types.Message(
+            message_id=self.update_id,
+            date=datetime.now(timezone.utc),
+            chat=types.Chat(id=user.id, type="private"),
+            from_user=user,
+            text=text,
+        ))
+
+    def _callback(self, data: str, user=None):
+        from aiogram import types
+        user = user or self._user()
+        self.update_id += 1
+        return types.Update(update_id=self.update_id, callback_query=types.CallbackQuery(
+            id=str(self.update_id),
+            from_user=user,
+            chat_instance="bench",
+            data=data,
+            message=types.Message(
+                message_id=self.update_id,
+                date=datetime.now(timezone.utc),
+                chat=types.Chat(id=user.id, type="private"),
+                photo=[types.PhotoSize(file_id="f", file_unique_id="u", width=800, height=800)],
+            ),
+        ))
+
+    def _query(self) -> str:
+        name = self.rng.choice(self.heroes)["name"]
+        return self.rng.choice([name["first"][:3], name["last"][:4], f"{name['first']} {name['last'][:2]}"])
+
+    def search(self):
+        return self._message(self._query())
+
+    def inline(self):
+        from aiogram import types
+        self.update_id += 1
+        text = self._query()
+        return types.Update(update_id=self.update_id, inline_query=types.InlineQuery(
+            id=str(self.update_id), from_user=self._user(), query=text, offset="",
+        ))
+
+    def paginate(self):
+        # users step through the session with ➡️, as the keyboard allows
+        user = self._user()
+        index = self.cursors[user.id] = (self.cursors.get(user.id, 0) + 1) % len(self.heroes)
+        return self._callback(f"museum_page|search|{self.session_token}|{index}", user)
+
+    def museum_all(self):
+        return self._callback("museum_all")
+
+    def war_filter(self):
+        return self._callback(f"museum_war|{self.rng.choice(self.war_ids)}")
+
+    def deep_link(self):
+        return self._message(f"/start {self.rng.choice(self.heroes)['_id']}")
+
+    def profile(self):
+        return self._callback("profile")
+
+    def admin(self):
+        return self._message("/admin", self._user(self.admin_id))
+
+
+SCENARIOS = ("search", "inline", "paginate", "museum_all", "war_filter", "deep_link", "profile", "admin")
+
+
+def percentile(samples: list, q: float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def round_trips(counter: dict) -> dict:
+    """Mongo and Bot API calls from the stand-ins, Redis round trips from the metrics registry."""
+    from app.utils.metrics import redis_seconds
+    redis = sum(redis_seconds.count(labels) for labels in list(redis_seconds.values))
+    return {"mongo": counter["mongo"], "redis": redis, "bot": counter["bot"]}
+
+
+async def run_scenario(name, dp, bot, workloads, counter, updates: int, rate: float) -> dict:
+    from aiogram.fsm.storage.base import StorageKey
+    from app.handlers.museum_search import MuseumState
+
+    batch = [getattr(workloads, name)() for _ in range(updates)]
+    latencies = []
+
+    async def feed(update):
+        started = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    from app.utils.prefetch import prefetcher, prefetch_stats
+
+    before = round_trips(counter)
+    lookups_before = prefetch_stats["hit"], prefetch_stats["miss"]
+    started = time.perf_counter()
+    tasks = []
+    for i, update in enumerate(batch):
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if name == "search":
+            # museum text search only answers users at the search prompt (the handler clears it)
+            message = update.message
+            await dp.storage.set_state(
+                StorageKey(bot_id=bot.id, chat_id=message.chat.id, user_id=message.from_user.id),
+                MuseumState.searching,
+            )
+        tasks.append(asyncio.create_task(feed(update)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    # background work (neighbour prefetch) is counted with the scenario that started it
+    await prefetcher.wait()
+
+    latencies.sort()
+    after = round_trips(counter)
+    per_update = {k: round((after[k] - before[k]) / updates, 2) for k in after}
+    hits, misses = prefetch_stats["hit"] - lookups_before[0], prefetch_stats["miss"] - lookups_before[1]
+    return {
+        "updates": updates,
+        "rate": rate,
+        "throughput": round(updates / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mongo_per_update": per_update["mongo"],
+        "redis_per_update": per_update["redis"],
+        "bot_calls_per_update": per_update["bot"],
+        "prefetch_hit": round(hits / (hits + misses), 2) if hits + misses else None,
+    }
+
+
+def compare(results: dict):
+    """Print the change against the saved baseline for every numeric field."""
+    if not os.path.exists(BASELINE):
+        print(f"no baseline at {BASELINE} (run with --save)", file=sys.stderr)
+        return
+    with open(BASELINE) as f:
+        baseline = json.load(f)["scenarios"]
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        changes = [
+            f"{k} {old[k]} → {v}"
+            for k, v in result.items()
+            if k in old and v != old[k] and k not in ("updates", "rate")
+        ]
+        print(f"{name:11s} " + ("; ".join(changes) or "unchanged"), file=sys.stderr)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=200, help="updates per second per scenario")
+    parser.add_argument("--scenario", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--mongo", help="local mongod URI instead of mongomock")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    counter = {"mongo": 0, "bot": 0}
+    db = await patch_backends(counter, args.mongo)
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from app.utils.search_index import search_index
+    from app.utils.war_catalogue import war_catalogue
+    from app.utils.browse import hero_browser
+    from app.handlers.museum_search import session_page
+    from app.utils.sessions import create_session, prefetch_pages
+    import main as bot_main
+
+    started = time.perf_counter()
+    heroes = await seed(db, args.heroes)
+    await search_index.load()
+    await war_catalogue.load()
+    await hero_browser.load()
+    ids = [h["_id"] for h in heroes]
+    token = await create_session(ids, await prefetch_pages(ids, 0, len(ids), session_page))
+    print(f"seeded {args.heroes} heroes in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    session = make_fake_session(counter)
+    bot = Bot(token="42:BENCH", session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    dp = bot_main.create_dispatcher()
+    workloads = Workloads(heroes, bot_main.admin.ADMIN_ID, token)
+
+    results = {}
+    for name in args.scenario:
+        result = results[name] = await run_scenario(name, dp, bot, workloads, counter, args.updates, args.rate)
+        print(f"{name:11s} {json.dumps(result)}", file=sys.stderr)
+
+    report = {
+        "heroes": args.heroes,
+        "backend": ("mongod" if args.mongo else "mongomock") + "+fakeredis",
+        "scenarios": results,
+        "bot_api_calls": dict(sorted(session.calls.items())),
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"baseline written to {BASELINE}", file=sys.stderr)
+    else:
+        compare(results)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""
+Query latency of the in-memory hero search index (app/utils/search_index.py).
+
+    python bench/search_latency.py [--heroes 10000 100000] [--queries 5000]
+                                   [--regex-queries 300] [--budget-ms 5]
+
+For each --heroes size, builds the index from synthetic Armenian names (no
+Mongo or Redis), gives a tenth of the heroes a leaderboard boost and times
+search() over a mix of first-name prefixes, full names, reversed names,
+one-letter typos and Latin / Cyrillic spellings. Reports p50/p99/max per
+kind and overall.
+
+Then times the search the handler did before the index on --regex-queries of
+the same queries: case-insensitive, unanchored regexes on name.first /
+name.last, which no index can serve, so MongoDB scans every hero. The scan
+runs here in Python over the same in-memory heroes, without the network
+and BSON decoding a real collection scan adds, so its numbers are a lower
+bound. Exits 1 if the index's overall p99 exceeds the budget at any size.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST = ["Արամ", "Արթուր", "Դավիթ", "Գևորգ", "Հայկ", "Նարեկ", "Տիգրան", "Վարդան", "Սամվել", "Արմեն",
+         "Էդգար", "Ռոբերտ", "Մհեր", "Գոռ", "Վահե", "Սարգիս", "Հովհաննես", "Արսեն", "Կարեն", "Ավետիք"]
+ROOTS = ["Պետրոս", "Գրիգոր", "Մարտիրոս", "Սարգս", "Հակոբ", "Ավետիս", "Մկրտչ", "Ղազար", "Բաղդասար",
+         "Խաչատր", "Ներսիս", "Օհանջան", "Թովմաս", "Ռուբեն", "Եղիազար", "Վարդան", "Զաքար", "Ստեփան"]
+LATIN = {"Արամ": "aram", "Դավիթ": "davit", "Գևորգ": "gevorg", "Տիգրան": "tigran", "Նարեկ": "narek",
+         "Պետրոս": "petros", "Գրիգոր": "grigor", "Հակոբ": "hakob", "Խաչատր": "khachatr", "Ստեփան": "stepan"}
+CYRILLIC = {"Արամ": "арам", "Դավիթ": "давит", "Տիգրան": "тигран", "Նարեկ": "нарек",
+            "Պետրոս": "петрос", "Գրիգոր": "григор", "Հակոբ": "акоб", "Ստեփան": "степан"}
+
+
+def make_heroes(count: int, rng: random.Random) -> list:
+    heroes = []
+    for i in range(count):
+        root = rng.choice(ROOTS)
+        # a suffix on the root keeps surnames varied, as in the real catalogue
+        last = root + rng.choice(["", "", "ի", "ունց", "ել"]) + "յան"
+        heroes.append({"_id": i, "name": {"first": rng.choice(FIRST), "last": last}, "root": root})
+    return heroes
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word))
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice("աեիոու") + word[i + 1:]
+
+
+def make_queries(heroes: list, count: int, rng: random.Random) -> list:
+    kinds = ["prefix", "full", "reversed", "typo", "latin", "cyrillic"]
+    queries = []
+    for i in range(count):
+        hero = rng.choice(heroes)
+        first, last, root = hero["name"]["first"], hero["name"]["last"], hero["root"]
+        kind = kinds[i % len(kinds)]
+        if kind == "prefix":
+            text = first[:rng.randint(1, len(first))]
+        elif kind == "full":
+            text = f"{first} {last}"
+        elif kind == "reversed":
+            text = f"{last} {first}"
+        elif kind == "typo":
+            text = f"{first} {typo(last, rng)}"
+        elif kind == "latin":
+            text = f"{LATIN.get(first, 'aram')} {LATIN.get(root, 'petros')}yan"
+        else:
+            text = f"{CYRILLIC.get(first, 'арам')} {CYRILLIC.get(root, 'петрос')}ян"
+        queries.append((kind, text))
+    return queries
+
+
+def percentile(sorted_ms: list, q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+
+def regex_filter(query: str):
+    """The pre-index search filter (Regex(word, "i") on the name fields) as a predicate."""
+    parts = query.split()
+    if len(parts) >= 2:
+        first, last = re.compile(parts[0], re.I), re.compile(parts[1], re.I)
+        return lambda name: (
+            (first.search(name["first"]) and last.search(name["last"]))
+            or (last.search(name["first"]) and first.search(name["last"]))
+        )
+    word = re.compile(query, re.I)
+    return lambda name: word.search(name["first"]) or word.search(name["last"])
+
+
+def regex_scan(heroes: list, query: str) -> list:
+    match = regex_filter(query)
+    return [hero["_id"] for hero in heroes if match(hero["name"])]
+
+
+def latency(rows: list) -> dict:
+    rows = sorted(rows)
+    return {
+        "p50_ms": round(percentile(rows, 0.5), 3),
+        "p99_ms": round(percentile(rows, 0.99), 3),
+        "max_ms": round(rows[-1], 3),
+    }
+
+
+def run_size(count: int, args) -> dict:
+    from app.utils.search_index import HeroSearchIndex
+
+    rng = random.Random(42)
+    heroes = make_heroes(count, rng)
+    index = HeroSearchIndex()
+    started = time.perf_counter()
+    index.build(heroes)
+    build_s = time.perf_counter() - started
+    index.set_popularity([(str(i), rng.randint(1, 500)) for i in rng.sample(range(len(heroes)), len(heroes) // 10)])
+
+    queries = make_queries(heroes, args.queries, rng)
+    for _, text in queries[:200]:   # warm up
+        index.search(text)
+
+    timings, empty = {}, 0
+    for kind, text in queries:
+        started = time.perf_counter()
+        ids = index.search(text)
+        timings.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        empty += not ids
+
+    report = {"heroes": count, "queries": args.queries, "build_s": round(build_s, 2), "empty": empty}
+    overall = [ms for rows in timings.values() for ms in rows]
+    for kind, rows in list(timings.items()) + [("all", overall)]:
+        report[kind] = latency(rows)
+
+    regex_ms, regex_empty = [], 0
+    for _, text in queries[:args.regex_queries]:
+        started = time.perf_counter()
+        ids = regex_scan(heroes, text)
+        regex_ms.append((time.perf_counter() - started) * 1000)
+        regex_empty += not ids
+    report["regex_scan"] = {**latency(regex_ms), "queries": len(regex_ms), "empty": regex_empty}
+    report["p50_speedup"] = round(report["regex_scan"]["p50_ms"] / max(report["all"]["p50_ms"], 1e-3), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--regex-queries", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    reports = [run_size(count, args) for count in args.heroes]
+    print(json.dumps({"sizes": reports, "budget_ms": args.budget_ms}, ensure_ascii=False, indent=2))
+    sys.exit(0 if all(r["all"]["p99_ms"] <= args.budget_ms for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Redis round trips of one search (app/handlers/search.py, museum_search.py).
+
+    python bench/search_round_trips.py [--heroes 300] [--searches 50] [--max-round-trips 1]
+
+Builds the real Dispatcher on the same stand-ins as bench/replay.py
+(mongomock-motor, fakeredis, a Bot session that records API calls) and
+sends --searches plain-text searches and --searches museum searches, one
+at a time. Round trips are counted the way replay.py counts them: every
+client execute_command and every pipeline execute, from the metrics
+registry. Reports, per search, the round trips made before the handler
+returned (by command) and those made by the background neighbour prefetch
+it started. Exits 1 if a handler averages more than --max-round-trips.
+
+Photos are pre-seeded file_ids (the steady state), as in replay.py.
+app/handlers/search.py's router is not part of main.create_dispatcher(), so
+its plain-text search runs on a Dispatcher of its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import Workloads, make_fake_session, patch_backends, seed  # noqa: E402
+
+
+def redis_calls() -> dict:
+    from app.utils.metrics import redis_seconds
+    return {labels[0]: redis_seconds.count(labels) for labels in list(redis_seconds.values)}
+
+
+def diff(after: dict, before: dict) -> dict:
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+
+async def measure(dp, bot, workloads, searches: int, museum: bool) -> dict:
+    from aiogram.fsm.storage.base import StorageKey
+    from app.handlers.museum_search import MuseumState
+    from app.utils.prefetch import prefetcher
+
+    handler, background = {}, {}
+    for _ in range(searches):
+        update = workloads.search()
+        if museum:
+            message = update.message
+            await dp.storage.set_state(
+                StorageKey(bot_id=bot.id, chat_id=message.chat.id, user_id=message.from_user.id),
+                MuseumState.searching,
+            )
+        before = redis_calls()
+        await dp.feed_update(bot, update)
+        returned = redis_calls()
+        await prefetcher.wait()
+        for total, counts in ((handler, diff(returned, before)), (background, diff(redis_calls(), returned))):
+            for command, n in counts.items():
+                total[command] = total.get(command, 0) + n
+
+    per_search = lambda counts: {k: round(v / searches, 2) for k, v in sorted(counts.items())}
+    return {
+        "round_trips": round(sum(handler.values()) / searches, 2),
+        "by_command": per_search(handler),
+        "background": per_search(background),
+    }
+
+
+async def main(args) -> bool:
+    counter = {"mongo": 0, "bot": 0}
+    db = await patch_backends(counter)
+
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from app.utils.search_index import search_index
+    from app.utils.war_catalogue import war_catalogue
+    from app.utils.browse import hero_browser
+    from app.handlers import search
+    import main as bot_main
+
+    heroes = await seed(db, args.heroes)
+    await search_index.load()
+    await war_catalogue.load()
+    await hero_browser.load()
+
+    bot = Bot(token="42:BENCH", session=make_fake_session(counter), default=DefaultBotProperties(parse_mode="HTML"))
+    dp = bot_main.create_dispatcher()
+    search_dp = Dispatcher()
+    search_dp.include_router(search.router)
+    workloads = Workloads(heroes, bot_main.admin.ADMIN_ID, session_token=None)
+
+    report = {
+        "searches": args.searches,
+        "search": await measure(search_dp, bot, workloads, args.searches, museum=False),
+        "museum_search": await measure(dp, bot, workloads, args.searches, museum=True),
+        "max_round_trips": args.max_round_trips,
+    }
+    print(json.dumps(report, indent=2))
+    return all(report[k]["round_trips"] <= args.max_round_trips for k in ("search", "museum_search"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=300)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--max-round-trips", type=float, default=1)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,139 @@
+"""
+Memory and no-repeat checks of the hero rotation (app/utils/selection.py).
+
+    python bench/selection_memory.py [--heroes 100000] [--picks 200] [--cycle 3000] [--budget-kb 512]
+
+Seeds --heroes synthetic heroes (with ~2 KB bios and browse ordinals) into
+an indexed in-memory heroes collection + fakeredis and measures, with tracemalloc, the peak memory
+allocated while making --picks rotation picks, next to the old approach
+of loading every hero to random.choice one. Then, on a --cycle sized
+collection, runs a full rotation and checks that no hero repeats, and
+that heroes added mid-cycle start a new cycle that includes them.
+Exits 1 if the peak exceeds --budget-kb or a check fails.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class IndexedHeroes:
+    """
+    Stand-in for heroes_collection with its unique "ord" index: lookups by
+    ord are dict hits and documents are copied out, as the driver decodes
+    them. (mongomock sorts and scans in Python, which would swamp both the
+    timings and the allocations being measured.)
+    """
+
+    def __init__(self):
+        self._by_ord = {}
+
+    async def insert_many(self, docs):
+        for doc in docs:
+            self._by_ord[doc["ord"]] = copy.deepcopy(doc)
+
+    async def delete_many(self, query):
+        self._by_ord.clear()
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        if sort:   # the highest ordinal (HeroBrowser.last_ordinal)
+            return {"ord": max(self._by_ord)} if self._by_ord else None
+        doc = self._by_ord.get(query["ord"])
+        return copy.deepcopy(doc) if doc else None
+
+    async def find(self):
+        for doc in self._by_ord.values():
+            yield copy.deepcopy(doc)
+
+
+def _patch_backends():
+    import fakeredis
+    import app.db.mongo as mongo
+    import app.db.redis_db as redis_db
+
+    mongo.heroes_collection = IndexedHeroes()
+    redis_db.cache = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return mongo.heroes_collection
+
+
+def make_hero(i: int, rng: random.Random) -> dict:
+    return {
+        "name": {"first": f"Անուն{i}", "last": f"Ազգանուն{i}"},
+        "bio": "<p>" + "կենսագրություն " * rng.randint(100, 160) + "</p>",
+        "war": f"Պատերազմ {i % 12}",
+        "ord": i,
+    }
+
+
+async def seed(collection, start: int, count: int, rng: random.Random):
+    batch = []
+    for i in range(start, start + count):
+        batch.append(make_hero(i, rng))
+        if len(batch) >= 5000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+
+
+async def peak_kb(fn) -> tuple:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round((peak - base) / 1024, 1), round(elapsed, 2)
+
+
+async def main(args) -> bool:
+    heroes = _patch_backends()
+    from app.utils import selection
+
+    rng = random.Random(7)
+    await seed(heroes, 0, args.heroes, rng)
+
+    async def rotation():
+        for _ in range(args.picks):
+            assert await selection.next_in_rotation("bench") is not None
+
+    async def load_all():
+        random.choice([h async for h in heroes.find()])   # what send_daily_hero used to do
+
+    await selection.next_in_rotation("warmup")   # first-use imports and connection setup
+    report = {"heroes": args.heroes, "picks": args.picks}
+    report["rotation_peak_kb"], report["rotation_s"] = await peak_kb(rotation)
+    report["load_all_peak_kb"], report["load_all_s"] = await peak_kb(load_all)
+
+    # no repeats within a cycle; new heroes start a new cycle that includes them
+    await heroes.delete_many({})
+    await seed(heroes, 0, args.cycle, rng)
+    seen = [(await selection.next_in_rotation("cycle"))["ord"] for _ in range(args.cycle)]
+    report["cycle_unique"] = len(set(seen)) == args.cycle
+
+    half = [(await selection.next_in_rotation("grow"))["ord"] for _ in range(args.cycle // 2)]
+    await seed(heroes, args.cycle, 10, rng)
+    rest = [(await selection.next_in_rotation("grow"))["ord"] for _ in range(args.cycle + 10)]
+    report["growth_covers_new"] = set(rest) == set(range(args.cycle + 10)) and len(set(half)) == len(half)
+
+    report["budget_kb"] = args.budget_kb
+    print(json.dumps(report, indent=2))
+    return report["rotation_peak_kb"] <= args.budget_kb and report["cycle_unique"] and report["growth_covers_new"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=100000)
+    parser.add_argument("--picks", type=int, default=200)
+    parser.add_argument("--cycle", type=int, default=3000)
+    parser.add_argument("--budget-kb", type=float, default=512)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,87 @@
+"""
+Write throughput of the scraper output sinks.
+
+    python bench/sink_throughput.py [--counts 10000 50000] [--legacy-max 2000]
+
+The legacy sink (load the whole JSON array, append, dump it back) is
+quadratic, so it is only run up to --legacy-max heroes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scarper import NdjsonSink  # noqa: E402
+
+BIO = "<p>Ծնվել է 2000 թ․ Երևանում։ Զոհվել է հայրենիքի պաշտպանության ժամանակ։</p>" * 6
+
+
+def make_hero(i):
+    return {
+        "name": {"first": "Արամ", "last": f"Հերոսյան{i}"},
+        "date": {"birth": "2000 թ․", "dead": "2020 թ․"},
+        "region": "Երևան",
+        "war": "44-օրյա պատերազմ",
+        "img_url": f"https://example.com/img/{i}.jpg",
+        "bio_link": f"https://example.com/bio/{i}",
+        "bio": BIO,
+    }
+
+
+def legacy_save(path, hero):
+    with open(path, "r+", encoding="utf-8") as f:
+        data = json.load(f)
+        data.append(hero)
+        f.seek(0)
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+def bench_legacy(count, workdir):
+    path = os.path.join(workdir, "heroes.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([], f)
+    started = time.perf_counter()
+    for i in range(count):
+        legacy_save(path, make_hero(i))
+    return time.perf_counter() - started
+
+
+async def bench_ndjson(count, workdir, flush_every=20):
+    sink = NdjsonSink(os.path.join(workdir, "heroes.ndjson"))
+    started = time.perf_counter()
+    for i in range(count):
+        await sink.write(make_hero(i))
+        if (i + 1) % flush_every == 0:  # the crawler flushes once per list page
+            await sink.flush()
+    await sink.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--legacy-max", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.counts:
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed = asyncio.run(bench_ndjson(count, workdir))
+        results.append({"sink": "ndjson", "heroes": count, "seconds": round(elapsed, 3), "per_sec": round(count / elapsed)})
+
+        legacy_count = min(count, args.legacy_max)
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed = bench_legacy(legacy_count, workdir)
+        results.append({"sink": "legacy-json", "heroes": legacy_count, "seconds": round(elapsed, 3), "per_sec": round(legacy_count / elapsed)})
+
+    for row in results:
+        print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Updates per second through the production webhook app (main.create_webhook_app).
+
+    python bench/webhook_throughput.py [--heroes 2000] [--updates 1000] [--concurrency 40]
+                                       [--scenario search paginate ...] [--fixtures updates.ndjson]
+                                       [--save-fixtures updates.ndjson] [--min-rate 0]
+
+Serves main.create_webhook_app() on a local port, with the backends and Bot
+session of bench/replay.py (mongomock-motor + fakeredis, Bot API calls
+answered locally), and POSTs Update JSON to WEBHOOK_PATH with the
+X-Telegram-Bot-Api-Secret-Token header, --concurrency requests at a time
+(Telegram's max_connections). The updates come from --fixtures (NDJSON, one
+Update per line, e.g. recorded from a real webhook) or are generated with
+replay.py's workloads, cycling through --scenario; --save-fixtures writes
+them out for reuse. Reports updates/s, p50/p99 request latency and the HTTP
+statuses; exits 1 on a non-200 answer or if updates/s is below --min-rate.
+
+mongomock runs queries in Python, so absolute rates are well below a real
+deployment; compare runs against each other.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["BOT_MODE"] = "webhook"
+os.environ["DAILY_BROADCAST"] = "0"   # no daily post from the bench app
+
+from replay import SCENARIOS, Workloads, make_fake_session, patch_backends, percentile, seed  # noqa: E402
+
+
+def load_fixtures(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def generate(db, args) -> list:
+    from app.handlers.museum_search import session_page
+    from app.utils.sessions import create_session, prefetch_pages
+    from app.utils.war_catalogue import war_catalogue
+    import main as bot_main
+
+    heroes = await seed(db, args.heroes)
+    await war_catalogue.load()   # the war filter workload picks from it
+    ids = [h["_id"] for h in heroes]
+    token = await create_session(ids, await prefetch_pages(ids, 0, len(ids), session_page))
+    workloads = Workloads(heroes, bot_main.admin.ADMIN_ID, token)
+    scenarios = [getattr(workloads, name) for name in args.scenario]
+    return [
+        scenarios[i % len(scenarios)]().model_dump_json(exclude_none=True, by_alias=True)
+        for i in range(args.updates)
+    ]
+
+
+async def post_all(url: str, secret: str, bodies: list, concurrency: int) -> tuple:
+    import aiohttp
+
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+    latencies, statuses = [], {}
+    queue = iter(bodies)
+
+    async def connection(session):
+        for body in queue:
+            started = time.perf_counter()
+            async with session.post(url, data=body, headers=headers) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(connection(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, sorted(latencies), statuses
+
+
+async def main(args) -> bool:
+    counter = {"mongo": 0, "bot": 0}
+    db = await patch_backends(counter)
+
+    from aiohttp import web
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from app.config.settings import WEBHOOK_PATH, WEBHOOK_SECRET
+    import main as bot_main
+
+    bodies = load_fixtures(args.fixtures) if args.fixtures else await generate(db, args)
+    if args.fixtures:
+        await seed(db, args.heroes)
+    if args.save_fixtures:
+        with open(args.save_fixtures, "w", encoding="utf-8") as f:
+            f.writelines(body + "\n" for body in bodies)
+
+    bot = Bot(token="42:BENCH", session=make_fake_session(counter), default=DefaultBotProperties(parse_mode="HTML"))
+    dp = bot_main.create_dispatcher()
+    runner = web.AppRunner(bot_main.create_webhook_app(bot, dp))
+    await runner.setup()   # runs the dispatcher startup: indexes, search index, catalogues
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{WEBHOOK_PATH}"
+
+    await post_all(url, WEBHOOK_SECRET, bodies[:min(50, len(bodies))], args.concurrency)   # warm up
+    elapsed, latencies, statuses = await post_all(url, WEBHOOK_SECRET, bodies, args.concurrency)
+    await runner.cleanup()   # dispatcher shutdown: drains handlers, closes sessions
+
+    report = {
+        "updates": len(bodies),
+        "source": args.fixtures or "generated:" + ",".join(args.scenario),
+        "concurrency": args.concurrency,
+        "updates_per_s": round(len(bodies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "bot_calls_per_update": round(counter["bot"] / (len(bodies) + min(50, len(bodies))), 2),
+        "min_rate": args.min_rate,
+    }
+    print(json.dumps(report, indent=2))
+    return set(statuses) == {200} and report["updates_per_s"] >= args.min_rate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS,
+                        default=["search", "paginate", "museum_all", "war_filter", "deep_link", "inline"])
+    parser.add_argument("--fixtures", help="NDJSON file of recorded Update objects")
+    parser.add_argument("--save-fixtures", help="write the updates posted to this NDJSON file")
+    parser.add_argument("--min-rate", type=float, default=0)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
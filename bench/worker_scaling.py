@@ -0,0 +1,173 @@
+"""
+Throughput of BOT_MODE=worker against the number of worker processes.
+
+    python bench/worker_scaling.py [--workers 1 2 4] [--updates 4000] [--chats 400]
+                                   [--cpu-ms 2] [--io-ms 5] [--redis HOST:PORT] [--min-efficiency 0]
+
+Each worker is a separate process running app.utils.update_queue.QueueWorker
+with a Dispatcher whose only handler burns --cpu-ms of CPU, awaits --io-ms
+(a Bot API call) and records (chat, message_id) in Redis. For each worker
+count the streams are emptied, the workers are started and left to split
+the shards between them, then --updates messages from --chats chats are
+pushed at once and timed until all are handled. Reports updates/s, the
+speedup over one worker and whether every chat's updates ran in order.
+Exits 1 on an ordering error, or if speedup / workers falls below
+--min-efficiency (set it, e.g. 0.8, on a machine with a core per worker).
+
+Without --redis an in-process fakeredis TCP server is started; it handles
+every connection on a Python thread of this process, so it caps throughput
+well below a real Redis and the speedup it shows is only indicative.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DONE_KEY = "bench:done"
+
+
+def _configure(host: str, port: int, lease: float):
+    """Point the app at the bench Redis; must run before anything imports app.config."""
+    os.environ.update({"REDIS_HOST": host, "REDIS_PORT": str(port), "REDIS_PASS": "", "SHARD_LEASE": str(lease)})
+    os.environ.setdefault("OWNER_ID", "0")
+
+
+def _burn(ms: float):
+    until = time.perf_counter() + ms / 1000
+    while time.perf_counter() < until:
+        pass
+
+
+def _worker(index: int, host: str, port: int, lease: float, cpu_ms: float, io_ms: float):
+    _configure(host, port, lease)
+    from aiogram import Bot, Dispatcher, Router, types
+    from loguru import logger
+    from app.db.redis_db import cache
+    from app.utils.update_queue import QueueWorker
+
+    logger.remove()
+    router = Router()
+
+    @router.message()
+    async def handle(message: types.Message):
+        _burn(cpu_ms)
+        await asyncio.sleep(io_ms / 1000)
+        await cache.rpush(DONE_KEY, f"{message.chat.id}:{message.message_id}")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("123456:bench-token-not-used")
+    asyncio.run(QueueWorker(bot, dp, f"worker-{index}").run())
+
+
+def make_update(seq: int, chat: int) -> dict:
+    return {
+        "update_id": seq,
+        "message": {
+            "message_id": seq,
+            "date": int(time.time()),
+            "chat": {"id": chat, "type": "private"},
+            "from": {"id": chat, "is_bot": False, "first_name": "Bench"},
+            "text": "Արամ",
+        },
+    }
+
+
+async def _balanced(cache, workers: int, shards: int) -> bool:
+    holders = await cache.mget([f"lease:updates:{s}" for s in range(shards)])
+    if None in holders:
+        return False
+    counts = [holders.count(f"worker-{i}") for i in range(workers)]
+    return min(counts) >= shards // workers and max(counts) <= -(-shards // workers)
+
+
+async def run_level(args, workers: int, host: str, port: int) -> dict:
+    from app.db.redis_db import cache
+    from app.utils.update_queue import stream_for
+    from app.config.settings import UPDATE_SHARDS, UPDATE_STREAM_MAXLEN
+
+    await cache.flushall()
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_worker, args=(i, host, port, args.lease, args.cpu_ms, args.io_ms), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        deadline = time.monotonic() + 30 + 3 * args.lease * workers
+        while not await _balanced(cache, workers, UPDATE_SHARDS):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{workers} workers did not split the shards")
+            await asyncio.sleep(0.2)
+
+        updates = [make_update(seq, seq % args.chats + 1) for seq in range(args.updates)]
+        started = time.perf_counter()
+        async with cache.pipeline(transaction=False) as pipe:
+            for update in updates:
+                pipe.xadd(stream_for(update), {"u": json.dumps(update, ensure_ascii=False)},
+                          maxlen=UPDATE_STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+        while await cache.llen(DONE_KEY) < args.updates:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+    last, ordered = {}, True
+    for item in await cache.lrange(DONE_KEY, 0, -1):
+        chat, seq = map(int, item.split(":"))
+        ordered &= seq > last.get(chat, -1)
+        last[chat] = seq
+    return {"workers": workers, "throughput": round(args.updates / elapsed, 1), "ordered": ordered}
+
+
+async def main(args) -> bool:
+    server = None
+    if args.redis:
+        host, port = args.redis.rsplit(":", 1)
+        port = int(port)
+    else:
+        from fakeredis import TcpFakeServer
+
+        server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+    _configure(host, port, args.lease)
+
+    results = []
+    for workers in args.workers:
+        row = await run_level(args, workers, host, port)
+        row["speedup"] = round(row["throughput"] / results[0]["throughput"], 2) if results else 1.0
+        row["efficiency"] = round(row["speedup"] / (workers / args.workers[0]), 2)
+        results.append(row)
+        print(json.dumps(row))
+    if server is not None:
+        server.shutdown()
+
+    ok = all(r["ordered"] for r in results) and all(r["efficiency"] >= args.min_efficiency for r in results)
+    print(json.dumps({"redis": "fakeredis" if server else args.redis, "cpu_ms": args.cpu_ms,
+                      "io_ms": args.io_ms, "updates": args.updates, "ok": ok}))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--chats", type=int, default=400)
+    parser.add_argument("--cpu-ms", type=float, default=2)
+    parser.add_argument("--io-ms", type=float, default=5)
+    parser.add_argument("--lease", type=float, default=2)
+    parser.add_argument("--redis", help="HOST:PORT of a scratch Redis (it is FLUSHALLed)")
+    parser.add_argument("--min-efficiency", type=float, default=0.0)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
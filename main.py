@@ -1,20 +1,68 @@
 import asyncio
+import multiprocessing
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
-from app.config.settings import BOT_TOKEN, TEST_BOT_TOKEN
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from app.config.settings import (
+    BOT_TOKEN,
+    TEST_BOT_TOKEN,
+    BOT_ENV,
+    BOT_MODE,
+    DAILY_BROADCAST,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_DROP_PENDING,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    SHUTDOWN_DRAIN_TIMEOUT,
+    FSM_STORAGE,
+    WORKER_COUNT,
+    WORKER_INDEX,
+    METRICS_HOST,
+    METRICS_PORT,
+)
+from app.db.redis_db import cache
+from app.db.indexes import ensure_indexes
+from app.db.mongo_stats import search_counters
 from app.handlers import start, inline_search, profile, about, museum_search, channel_manage, admin
+from app.utils.search_index import search_index
+from app.utils.war_catalogue import war_catalogue
+from app.utils.browse import hero_browser
+from app.utils.prefetch import prefetcher
+from app.utils.inline_cache import inline_cache
+from app.utils.util import load_static_layers
+from app.utils.lifecycle import in_flight, close_resources
+from app.utils.stats import run_reconcile_loop
+from app.utils.metrics import TelegramApiTimer, instrument_dispatcher, add_metrics_route, start_metrics_server
+from app.utils.update_queue import create_ingress_app, poll_ingress, run_worker
+from app.scheduler import setup_daily_scheduler, stop_daily_scheduler
 from loguru import logger
 
+background_tasks = set()
 
-async def main():
-    logger.info("Starting Armenian Heroes Museum Bot 🇦🇲")
 
+def create_bot() -> Bot:
+    token = TEST_BOT_TOKEN if BOT_ENV == "test" else BOT_TOKEN
     bot = Bot(
-        token=BOT_TOKEN,
+        token=token,
         default=DefaultBotProperties(parse_mode="HTML")
     )
+    bot.session.middleware(TelegramApiTimer())
+    return bot
 
-    dp = Dispatcher()
+
+def create_dispatcher() -> Dispatcher:
+    # FSM state must be shared once updates of one user can reach several processes
+    if FSM_STORAGE == "redis" or BOT_MODE == "worker":
+        dp = Dispatcher(storage=RedisStorage(redis=cache))
+    else:
+        dp = Dispatcher()
+    dp.update.outer_middleware(in_flight)
+    instrument_dispatcher(dp)
     dp.include_router(start.router)
     dp.include_router(profile.router)
     dp.include_router(about.router)
@@ -22,9 +70,173 @@ async def main():
     dp.include_router(channel_manage.router)
     dp.include_router(inline_search.router)
     dp.include_router(admin.router)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+# ---------------------
+# 🔹 LIFECYCLE
+# ---------------------
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    logger.info(f"Starting Armenian Heroes Museum Bot 🇦🇲 ({BOT_MODE}, {BOT_ENV})")
+
+    await ensure_indexes()
+    load_static_layers()
+    await search_index.load()
+    task = asyncio.create_task(search_index.run_refresh_loop())
+    background_tasks.add(task)
+    await war_catalogue.load()
+    task = asyncio.create_task(war_catalogue.run_refresh_loop())
+    background_tasks.add(task)
+    await hero_browser.load()
+    task = asyncio.create_task(hero_browser.run_refresh_loop())
+    background_tasks.add(task)
+    search_counters.start()
+    task = asyncio.create_task(prefetcher.run_flush_loop())
+    background_tasks.add(task)
+    task = asyncio.create_task(run_reconcile_loop())
+    background_tasks.add(task)
+
+    if BOT_MODE == "webhook":
+        await bot.set_webhook(
+            url=f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=WEBHOOK_DROP_PENDING,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info(f"🌐 Webhook set: {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+
+    if DAILY_BROADCAST:
+        # every bot process schedules; a Redis lock lets only one of them broadcast
+        setup_daily_scheduler(bot)
+
+
+async def on_shutdown():
+    # let handlers that are already running finish before their connections go away
+    await in_flight.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    stop_daily_scheduler()
+    for task in background_tasks:
+        task.cancel()
+    prefetcher.cancel_all()
+    await prefetcher.save_counts()
+    await inline_cache.save_counts()
+    await close_resources()
+
+
+# ---------------------
+# 🔹 RUNTIMES
+# ---------------------
+async def serve_metrics(port: int):
+    """Local /metrics listener for modes without a webhook app."""
+    if not METRICS_PORT:
+        return None
+    runner = await start_metrics_server(METRICS_HOST, port)
+    logger.info(f"📈 Metrics on {METRICS_HOST}:{port}/metrics")
+    return runner
+
+
+async def run_polling():
+    bot = create_bot()
+    dp = create_dispatcher()
+    metrics = await serve_metrics(METRICS_PORT)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if metrics:
+            await metrics.cleanup()
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    app = web.Application()
+    # dispatcher shutdown (drain) must run before the handler closes the bot session
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=False,
+    ).register(app, path=WEBHOOK_PATH)
+    add_metrics_route(app)
+    return app
+
+
+def run_webhook():
+    bot = create_bot()
+    dp = create_dispatcher()
+    app = create_webhook_app(bot, dp)
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT, shutdown_timeout=SHUTDOWN_DRAIN_TIMEOUT)
+
+
+async def run_ingress():
+    """Receive updates (webhook or long polling) and only enqueue them for workers."""
+    bot = create_bot()
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    if not WEBHOOK_BASE_URL:
+        try:
+            await poll_ingress(bot, allowed_updates)
+        finally:
+            await bot.session.close()
+        return
+
+    await bot.set_webhook(
+        url=f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=WEBHOOK_DROP_PENDING,
+        allowed_updates=allowed_updates,
+    )
+    await bot.session.close()
+    runner = web.AppRunner(create_ingress_app())
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT).start()
+    logger.info(f"📥 Webhook ingress on {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_queue_worker(index: int):
+    bot = create_bot()
+    dp = create_dispatcher()
+    metrics = await serve_metrics(METRICS_PORT + index)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await run_worker(bot, dp, index)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        if metrics:
+            await metrics.cleanup()
+
+
+def _worker_process(index: int):
+    asyncio.run(run_queue_worker(index))
+
 
-    await dp.start_polling(bot)
+def run_workers():
+    """Run one worker (WORKER_INDEX set) or spawn WORKER_COUNT of them."""
+    if WORKER_INDEX is not None:
+        asyncio.run(run_queue_worker(WORKER_INDEX))
+        return
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(i,), name=f"worker-{i}")
+        for i in range(WORKER_COUNT)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if BOT_MODE == "webhook":
+        run_webhook()
+    elif BOT_MODE == "ingress":
+        asyncio.run(run_ingress())
+    elif BOT_MODE == "worker":
+        run_workers()
+    else:
+        asyncio.run(run_polling())
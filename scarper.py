@@ -1,40 +1,47 @@
-import requests
+import aiohttp
+import asyncio
 from bs4 import BeautifulSoup
+import argparse
 import json
 import logging
 import re
-from time import sleep
+import time
 import os
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlparse
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-BASE_URL = "https://www.zinapah.am/hy/fallen-heroes"
-OUTPUT_FILE = "data/heroes.json"
+# Point SCRAPER_BASE_URL at a local stub serving saved pages to crawl offline
+BASE_URL = os.getenv("SCRAPER_BASE_URL", "https://www.zinapah.am/hy/fallen-heroes")
+OUTPUT_FILE = os.getenv("SCRAPER_OUTPUT", "data/heroes.ndjson")
+STATE_FILE = os.getenv("SCRAPER_STATE_FILE", "data/crawl_state.json")
+
+CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", 8))      # bio pages in flight
+HOST_RATE = float(os.getenv("SCRAPER_HOST_RATE", 4))         # requests per second per host
+TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", 20))
+MAX_RETRIES = 3
+USER_AGENT = "erablur-bot/1.0 (+https://t.me/armenian_heroes_bot)"
+ROTATE_BYTES = int(os.getenv("SCRAPER_ROTATE_MB", 64)) * 1024 * 1024
+MONGO_BATCH = int(os.getenv("SCRAPER_MONGO_BATCH", 500))
+STATE_COMPACT_PAGES = int(os.getenv("SCRAPER_STATE_COMPACT", 50))   # journal pages folded into the snapshot
 
-# Ensure file exists as an empty list
 if not os.path.exists("data"):
     os.makedirs("data")
-if not os.path.exists(OUTPUT_FILE):
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump([], f, ensure_ascii=False, indent=4)
 
-def fetch_bio(bio_link):
-    """Fetch hero bio as Telegram-style HTML."""
-    try:
-        response = requests.get(bio_link)
-        if response.status_code != 200:
-            logging.warning(f"Failed to fetch bio page: {bio_link}")
-            return ""
-        soup = BeautifulSoup(response.text, "html.parser")
-        bio_div = soup.select_one(".soldiers-inner__right .d-flex.flex-column.gap-8")
-        if not bio_div:
-            return ""
-        # Keep HTML intact for Telegram
-        bio_html = "".join(str(p) for p in bio_div.find_all("p"))
-        return bio_html
-    except Exception as e:
-        logging.error(f"Error fetching bio: {e}")
+
+# ---------------------
+# 🔹 PARSING
+# ---------------------
+def parse_bio(html):
+    """Hero bio as Telegram-style HTML."""
+    soup = BeautifulSoup(html, "html.parser")
+    bio_div = soup.select_one(".soldiers-inner__right .d-flex.flex-column.gap-8")
+    if not bio_div:
         return ""
+    # Keep HTML intact for Telegram
+    return "".join(str(p) for p in bio_div.find_all("p"))
 
 
 def parse_dates(date_str, bio_text=""):
@@ -51,68 +58,398 @@ def parse_dates(date_str, bio_text=""):
             birth = bio_match.group(1).strip()
     return {"birth": birth, "dead": dead}
 
-def save_hero(hero):
-    """Append hero to JSON file."""
-    try:
-        with open(OUTPUT_FILE, "r+", encoding="utf-8") as f:
-            data = json.load(f)
-            data.append(hero)
-            f.seek(0)
-            json.dump(data, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        logging.error(f"Error saving hero: {e}")
-
-def fetch_heroes():
-    page = 1
-    i = 1
-    while True:
-        url = f"{BASE_URL}?page={page}"
+
+def parse_list_page(html, page_url):
+    """Hero cards of one list page (everything except the bio)."""
+    soup = BeautifulSoup(html, "html.parser")
+    items = []
+    for item in soup.find_all("div", class_="soldier-item"):
+        full_name = item.select_one(".soldier-item__name").get_text(strip=True)
+        name_parts = full_name.split()
+        first_name = name_parts[0]
+        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+
+        date_str = item.select_one(".soldier-item__date").get_text(strip=True)
+        region = item.select_one(".soldier-item__region").get_text(strip=True) if item.select_one(".soldier-item__region") else ""
+        war = item.select_one(".soldier-item__war").get_text(strip=True) if item.select_one(".soldier-item__war") else ""
+        img_url = item.select_one(".soldier-item__img")['src'].strip() if item.select_one(".soldier-item__img") else ""
+        bio_link = item.select_one(".soldier-item__bio-link")['href'] if item.select_one(".soldier-item__bio-link") else ""
+
+        items.append({
+            "full_name": full_name,
+            "name": {"first": first_name, "last": last_name},
+            "date_str": date_str,
+            "region": region,
+            "war": war,
+            "img_url": img_url,
+            "bio_link": urljoin(page_url, bio_link) if bio_link else "",
+        })
+    return items
+
+
+# ---------------------
+# 🔹 OUTPUT SINKS
+# ---------------------
+class NdjsonSink:
+    """
+    Append-only NDJSON: one hero per line, so a write costs O(1) and a crash
+    can at most leave a partial last line (readers skip it).
+    Past `rotate_bytes` the file is renamed to <name>.<timestamp>.ndjson in
+    one atomic os.replace and a fresh file is started.
+    """
+
+    def __init__(self, path=OUTPUT_FILE, rotate_bytes=ROTATE_BYTES):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self._file = self._open()
+
+    def _open(self):
+        f = open(self.path, "a", encoding="utf-8")
+        if f.tell():
+            with open(self.path, "rb") as tail:
+                tail.seek(-1, os.SEEK_END)
+                if tail.read(1) != b"\n":
+                    # terminate a line cut short by a crash so the next record starts clean
+                    f.write("\n")
+        return f
+
+    async def write(self, hero):
+        self._file.write(json.dumps(hero, ensure_ascii=False) + "\n")
+        if self.rotate_bytes and self._file.tell() >= self.rotate_bytes:
+            self.rotate()
+
+    async def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def rotate(self):
+        self._file.close()
+        root, ext = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{time.strftime('%Y%m%d-%H%M%S')}.{time.time_ns() % 10**6:06d}{ext}")
+        self._file = self._open()
+
+    async def close(self):
+        await self.flush()
+        self._file.close()
+
+
+class MongoSink:
+    """
+    Writes heroes through app.ingest, `batch_size` at a time: the same derived
+    fields and change detection as `python -m app.ingest`, and on close the
+    heroes:version bump that makes running bots reload.
+    """
+
+    def __init__(self, batch_size=MONGO_BATCH):
+        from app.ingest import Ingester
+
+        self.ingester = Ingester(batch_size=batch_size)
+
+    async def write(self, hero):
+        await self.ingester.add(hero)
+
+    async def flush(self):
+        await self.ingester.flush()
+
+    async def close(self):
+        summary = await self.ingester.finish()
+        logging.info(f"MongoDB: {summary['new']} new, {summary['changed']} changed, {summary['unchanged']} unchanged")
+
+
+class MultiSink:
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    async def write(self, hero):
+        for sink in self.sinks:
+            await sink.write(hero)
+
+    async def flush(self):
+        for sink in self.sinks:
+            await sink.flush()
+
+    async def close(self):
+        for sink in self.sinks:
+            await sink.close()
+
+
+# ---------------------
+# 🔹 CRAWL STATE
+# ---------------------
+class CrawlState:
+    """
+    Checkpoint of a crawl: last finished page, bio_links already saved in
+    this run, and ETag/Last-Modified of every bio (with the bio itself, to
+    reuse on a 304) for conditional re-crawls.
+    Each finished page appends only what it added to <path>.journal; every
+    `compact_every` pages the journal is folded into the <path> snapshot.
+    """
+
+    def __init__(self, path=STATE_FILE, compact_every=STATE_COMPACT_PAGES):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.compact_every = compact_every
+        self.page = 0
+        self.seen = set()
+        self.validators = {}
+        self._new_seen = []
+        self._new_validators = {}
+        self._journaled = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._apply(json.load(f))
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue   # a line cut short by a crash
+                    self._journaled += 1
+
+    def _apply(self, data):
+        self.page = data.get("page", self.page)
+        self.seen.update(data.get("seen", []))
+        self.validators.update(data.get("validators", {}))
+
+    def mark_seen(self, bio_link):
+        if bio_link not in self.seen:
+            self.seen.add(bio_link)
+            self._new_seen.append(bio_link)
+
+    def set_validators(self, bio_link, entry):
+        self.validators[bio_link] = self._new_validators[bio_link] = entry
+
+    def restart(self):
+        """New crawl from page 1; validators are kept so unchanged bios are skipped."""
+        self.page = 0
+        self.seen = set()
+        self._new_seen = []
+        self.compact()
+
+    def save(self, page):
+        """Record `page` as finished, appending this page's additions to the journal."""
+        self.page = page
+        entry = {"page": page, "seen": self._new_seen, "validators": self._new_validators}
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._new_seen, self._new_validators = [], {}
+        self._journaled += 1
+        if self._journaled >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the snapshot with everything so far and drop the journal."""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"page": self.page, "seen": sorted(self.seen), "validators": self.validators},
+                f, ensure_ascii=False,
+            )
+        os.replace(tmp, self.path)
+        # a crash right here only replays the journal onto a snapshot that already holds it
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._new_seen, self._new_validators = [], {}
+        self._journaled = 0
+
+
+# ---------------------
+# 🔹 HTTP
+# ---------------------
+def retry_delay(retry_after, attempt):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP-date), else the backoff."""
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            when = None
+        if when is not None:
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    return 2 ** attempt
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1/rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = {}
+        self._locks = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._next.get(host, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = time.monotonic() + self.interval
+
+
+class Crawler:
+    def __init__(self, state: CrawlState, sink, base_url=BASE_URL, concurrency=CONCURRENCY, rate=HOST_RATE):
+        self.state = state
+        self.sink = sink
+        self.base_url = base_url
+        self.limiter = HostRateLimiter(rate)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.session = None
+        self.stats = {"saved": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+        self._retry = []   # heroes whose bio failed, tried once more at the end of the run
+
+    async def fetch(self, url, headers=None):
+        """GET with retries on 429/5xx; returns (status, text, response headers)."""
+        for attempt in range(MAX_RETRIES):
+            await self.limiter.wait(url)
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = retry_delay(response.headers.get("Retry-After"), attempt)
+                        logging.warning(f"{response.status} from {url}, retrying in {retry_after:.1f}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    text = await response.text() if response.status == 200 else ""
+                    return response.status, text, response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Request to {url} failed ({e}), attempt {attempt + 1}")
+                await asyncio.sleep(2 ** attempt)
+        return None, "", {}
+
+    async def fetch_bio(self, bio_link):
+        """Bio HTML; a 304 reuses the bio stored with the validators. Raises if it can't be had."""
+        known = self.state.validators.get(bio_link, {})
+        headers = {}
+        # validators saved before bios were kept alongside them can't answer a 304
+        if "bio" in known:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        async with self.slots:
+            status, text, response_headers = await self.fetch(bio_link, headers)
+        if status == 304:
+            self.stats["unchanged"] += 1
+            return known["bio"]
+        if status != 200:
+            raise RuntimeError(f"bio page {bio_link} answered {status}")
+
+        try:
+            bio = parse_bio(text)
+        except Exception as e:
+            raise RuntimeError(f"bio page {bio_link} did not parse: {e}") from e
+        validators = {
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+        }
+        if any(validators.values()):
+            self.state.set_validators(bio_link, {**validators, "bio": bio})
+        return bio
+
+    async def build_hero(self, item):
+        """Full hero record: list-page fields plus the (possibly unchanged) bio."""
+        bio_text = await self.fetch_bio(item["bio_link"]) if item["bio_link"] else ""
+        return {
+            "name": item["name"],
+            "date": parse_dates(item["date_str"], bio_text),
+            "region": item["region"],
+            "war": item["war"],
+            "img_url": item["img_url"],
+            "bio_link": item["bio_link"],
+            "bio": bio_text,
+        }
+
+    async def crawl_page(self, page):
+        """Crawl one list page; returns False when there are no more pages."""
+        url = f"{self.base_url}?page={page}"
         logging.info(f"Fetching page {page}: {url}")
-        response = requests.get(url)
-        if response.status_code != 200:
+        status, text, _ = await self.fetch(url)
+        if status != 200:
             logging.warning(f"Failed to fetch page {page}")
-            break
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        soldier_items = soup.find_all("div", class_="soldier-item")
+            return False
 
-        if not soldier_items:
+        items = parse_list_page(text, url)
+        if not items:
             logging.info(f"No hero items found on page {page}. Stopping.")
-            break
+            return False
+
+        todo = [item for item in items if not item["bio_link"] or item["bio_link"] not in self.state.seen]
+        self.stats["skipped"] += len(items) - len(todo)
+        heroes = await asyncio.gather(*(self.build_hero(item) for item in todo), return_exceptions=True)
+        await self._save(todo, heroes, last_try=False)
 
-        for item in soldier_items:
-            full_name = item.select_one(".soldier-item__name").get_text(strip=True)
-            name_parts = full_name.split()
-            first_name = name_parts[0]
-            last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+        # records must be on disk before the checkpoint says they are
+        await self.sink.flush()
+        self.state.save(page)
+        return True
 
-            date_str = item.select_one(".soldier-item__date").get_text(strip=True)
-            region = item.select_one(".soldier-item__region").get_text(strip=True) if item.select_one(".soldier-item__region") else ""
-            war = item.select_one(".soldier-item__war").get_text(strip=True) if item.select_one(".soldier-item__war") else ""
-            img_url = item.select_one(".soldier-item__img")['src'].strip() if item.select_one(".soldier-item__img") else ""
-            bio_link = item.select_one(".soldier-item__bio-link")['href'] if item.select_one(".soldier-item__bio-link") else ""
+    async def _save(self, items, heroes, last_try):
+        """Write built heroes in page order, from one coroutine; failed ones are not marked seen."""
+        for item, hero in zip(items, heroes):
+            if isinstance(hero, Exception):
+                if last_try:
+                    self.stats["failed"] += 1
+                    logging.error(f"Error crawling {item['full_name']}: {hero}")
+                else:
+                    self._retry.append(item)
+                    logging.warning(f"Error crawling {item['full_name']} ({hero}), retrying at the end")
+                continue
+            await self.sink.write(hero)
+            self.stats["saved"] += 1
+            logging.info(f"{self.stats['saved']} Saved hero: {item['full_name']}")
+            if item["bio_link"]:
+                self.state.mark_seen(item["bio_link"])
 
-            bio_text = fetch_bio(bio_link) if bio_link else ""
-            dates = parse_dates(date_str, bio_text)
+    async def retry_failed(self):
+        """One more try for heroes that failed; those still failing are left for the next --recrawl."""
+        items, self._retry = self._retry, []
+        if items:
+            heroes = await asyncio.gather(*(self.build_hero(item) for item in items), return_exceptions=True)
+            await self._save(items, heroes, last_try=True)
+            await self.sink.flush()
 
-            hero = {
-                "name": {"first": first_name, "last": last_name},
-                "date": dates,
-                "region": region,
-                "war": war,
-                "img_url": img_url,
-                "bio_link": bio_link,
-                "bio": bio_text
-            }
+    async def run(self):
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=CONCURRENCY + 1, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers={"User-Agent": USER_AGENT}) as session:
+            self.session = session
+            page = self.state.page + 1
+            while await self.crawl_page(page):
+                page += 1
+            await self.retry_failed()
+        self.state.compact()
+        return self.stats
 
-            save_hero(hero)
-            logging.info(f"{i} Saved hero: {full_name}")
-            i = i + 1
 
-            sleep(0.5)  # polite delay
+async def fetch_heroes(recrawl=False, to_mongo=False):
+    state = CrawlState()
+    if recrawl:
+        state.restart()
+    elif state.page:
+        logging.info(f"Resuming after page {state.page} ({len(state.seen)} heroes already saved)")
+
+    sink = MultiSink(NdjsonSink(), MongoSink()) if to_mongo else NdjsonSink()
+    started = time.perf_counter()
+    try:
+        stats = await Crawler(state, sink).run()
+    finally:
+        await sink.close()
+    logging.info(f"Crawl finished in {time.perf_counter() - started:.1f}s: {stats}")
+    return stats
 
-        page += 1
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl zinapah.am fallen heroes")
+    parser.add_argument("--recrawl", action="store_true", help="start from page 1, fetching only changed bios")
+    parser.add_argument("--mongo", action="store_true", help="also upsert heroes straight into MongoDB")
+    args = parser.parse_args()
+
     logging.info("Starting scraping heroes...")
-    fetch_heroes()
+    asyncio.run(fetch_heroes(recrawl=args.recrawl, to_mongo=args.mongo))